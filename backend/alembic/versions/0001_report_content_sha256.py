@@ -0,0 +1,29 @@
+"""report content sha256
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('report')}
+    if 'content_sha256' not in columns:  # databases built by init_db() already have it
+        op.add_column('report', sa.Column('content_sha256', sa.String(64), nullable=True))
+        op.create_index('ix_report_content_sha256', 'report', ['content_sha256'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_report_content_sha256', table_name='report')
+    with op.batch_alter_table('report') as batch_op:
+        batch_op.drop_column('content_sha256')
@@ -0,0 +1,33 @@
+"""report processing status and raw upload path
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('report')}
+    if 'processing_status' not in columns:  # databases built by init_db() already have them
+        op.add_column('report', sa.Column('raw_uri', sa.Text(), nullable=True))
+        op.add_column('report', sa.Column('processing_status', sa.String(), nullable=True))
+        op.add_column('report', sa.Column('processing_error', sa.Text(), nullable=True))
+    # Reports stored before the queue were processed synchronously
+    op.execute("UPDATE report SET processing_status = 'done' WHERE processing_status IS NULL")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('report') as batch_op:
+        batch_op.drop_column('processing_error')
+        batch_op.drop_column('processing_status')
+        batch_op.drop_column('raw_uri')
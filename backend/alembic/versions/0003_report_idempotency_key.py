@@ -0,0 +1,29 @@
+"""report idempotency key
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('report')}
+    if 'idempotency_key' not in columns:  # databases built by init_db() already have it
+        op.add_column('report', sa.Column('idempotency_key', sa.String(), nullable=True))
+        op.create_index('ix_report_idempotency_key', 'report', ['idempotency_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_report_idempotency_key', table_name='report')
+    with op.batch_alter_table('report') as batch_op:
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,43 @@
+"""heatmap cell counters
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.aggregates import rebuild_heatmap
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if 'heatmap_cell' not in sa.inspect(bind).get_table_names():  # init_db() may have created it
+        op.create_table(
+            'heatmap_cell',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('vtype', sa.String(), nullable=False),
+            sa.Column('cell_x', sa.Integer(), nullable=False),
+            sa.Column('cell_y', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.UniqueConstraint('vtype', 'cell_x', 'cell_y', 'day', name='uq_heatmap_cell'),
+        )
+    # Count the existing reports once; ingestion keeps the cells current from here on
+    if bind.execute(sa.text("SELECT 1 FROM heatmap_cell LIMIT 1")).first() is None:
+        db = Session(bind=bind)
+        rebuild_heatmap(db)
+        db.flush()
+
+
+def downgrade() -> None:
+    op.drop_table('heatmap_cell')
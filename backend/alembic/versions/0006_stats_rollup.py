@@ -0,0 +1,65 @@
+"""stats rollup counters and report zone
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.aggregates import rebuild_stats, zones_for_points, STATS_REBUILD_CHUNK
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+report = sa.table('report', sa.column('id', sa.String), sa.column('lat', sa.Float),
+                  sa.column('lon', sa.Float), sa.column('zone_id', sa.String))
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'zone_id' not in {c['name'] for c in inspector.get_columns('report')}:
+        op.add_column('report', sa.Column('zone_id', sa.String(), nullable=True))
+        # Zone the existing reports as ingestion would have, keyset-paged by id
+        last = ''
+        while True:
+            chunk = bind.execute(sa.select(report.c.id, report.c.lat, report.c.lon).where(report.c.id > last)
+                                 .order_by(report.c.id).limit(STATS_REBUILD_CHUNK)).all()
+            if not chunk:
+                break
+            zones = zones_for_points([r.lat for r in chunk], [r.lon for r in chunk])
+            updates = [{'rid': r.id, 'zone': zone} for r, zone in zip(chunk, zones) if zone]
+            if updates:
+                bind.execute(report.update().where(report.c.id == sa.bindparam('rid'))
+                             .values(zone_id=sa.bindparam('zone')), updates)
+            last = chunk[-1].id
+    if 'stats_rollup' not in inspector.get_table_names():  # init_db() may have created it
+        op.create_table(
+            'stats_rollup',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('metric', sa.String(), nullable=False),
+            sa.Column('vtype', sa.String(), nullable=False),
+            sa.Column('severity', sa.Integer(), nullable=False),
+            sa.Column('zone', sa.String(), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.UniqueConstraint('metric', 'day', 'vtype', 'severity', 'zone', name='uq_stats_rollup'),
+        )
+    # Count the existing reports once; ingestion and review keep the rollup current from here on
+    if bind.execute(sa.text("SELECT 1 FROM stats_rollup LIMIT 1")).first() is None:
+        db = Session(bind=bind)
+        rebuild_stats(db)
+        db.flush()
+
+
+def downgrade() -> None:
+    op.drop_table('stats_rollup')
+    with op.batch_alter_table('report') as batch_op:
+        batch_op.drop_column('zone_id')
@@ -0,0 +1,39 @@
+"""report perceptual hash and duplicate link
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    columns = {c['name'] for c in sa.inspect(bind).get_columns('report')}
+    if 'phash' not in columns:  # databases built by init_db() already have them
+        op.add_column('report', sa.Column('phash', sa.String(16), nullable=True))
+        op.add_column('report', sa.Column('duplicate_of', sa.String(), nullable=True))
+        op.create_index('ix_report_phash', 'report', ['phash'])
+        op.create_index('ix_report_duplicate_of', 'report', ['duplicate_of'])
+        # SQLite cannot ALTER in a constraint (and does not enforce it by default)
+        if bind.dialect.name != 'sqlite':
+            op.create_foreign_key('fk_report_duplicate_of', 'report', 'report', ['duplicate_of'], ['id'])
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        op.drop_constraint('fk_report_duplicate_of', 'report', type_='foreignkey')
+    op.drop_index('ix_report_duplicate_of', table_name='report')
+    op.drop_index('ix_report_phash', table_name='report')
+    with op.batch_alter_table('report') as batch_op:
+        batch_op.drop_column('duplicate_of')
+        batch_op.drop_column('phash')
@@ -0,0 +1,27 @@
+"""report image renditions
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('report')}
+    if 'renditions' not in columns:  # databases built by init_db() already have it
+        op.add_column('report', sa.Column('renditions', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('report') as batch_op:
+        batch_op.drop_column('renditions')
@@ -0,0 +1,295 @@
+"""
+Incremental Aggregates
+Counter tables updated in the ingestion and review transactions, and the heatmap tile cache
+"""
+
+import os
+import math
+import time
+import threading
+from collections import Counter, OrderedDict
+from itertools import islice
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from . import models
+from .geofence import get_geofence
+
+HEATMAP_BASE_ZOOM = int(os.getenv("HEATMAP_BASE_ZOOM", "18"))  # ~150 m cells at the equator
+HEATMAP_TILE_BINS = 16  # bins per tile side (tile zoom + 4)
+HEATMAP_TILE_CACHE = int(os.getenv("HEATMAP_TILE_CACHE", "2048"))
+HEATMAP_TILE_TTL = float(os.getenv("HEATMAP_TILE_TTL", "60"))  # bounds staleness across worker processes
+ALL_REPORTS = "*"
+METRICS = ("report", "detection", "violation")
+STATS_REBUILD_CHUNK = int(os.getenv("STATS_REBUILD_CHUNK", "10000"))  # reports zoned per geofence query
+
+def increment_counters(db, model, counts: Counter):
+    """
+    Add counts to a counter table inside the caller's transaction
+
+    Keys of `counts` are dicts frozen as tuples of (column, value) pairs matching the
+    table's unique constraint. PostgreSQL and SQLite use INSERT ... ON CONFLICT DO
+    UPDATE so concurrent writers never race on the first insert of a key.
+    """
+    dialect = db.get_bind().dialect.name
+    for key, n in counts.items():
+        values = dict(key)
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = insert(model).values(**values, count=n)
+            stmt = stmt.on_conflict_do_update(index_elements=list(values),
+                                              set_={"count": model.__table__.c.count + stmt.excluded.count})
+            db.execute(stmt)
+        else:
+            row = db.query(model).filter_by(**values).with_for_update().first()
+            if row:
+                row.count += n
+            else:
+                db.add(model(**values, count=n))
+                db.flush()
+
+def lonlat_to_tile(lat: float, lon: float, z: int) -> Tuple[int, int]:
+    """Web Mercator (slippy map) tile containing a point"""
+    n = 1 << z
+    lat = max(-85.05112878, min(85.05112878, lat))
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tile_to_lonlat(x: float, y: float, z: int) -> Tuple[float, float]:
+    """Longitude/latitude of a (possibly fractional) tile coordinate"""
+    n = 1 << z
+    lon = x / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return lon, lat
+
+def record_report_heatmap(db, lat: float, lon: float, captured_at: datetime, violation_types: Iterable[str]):
+    """Count a new report and its violations into its base-zoom heatmap cell"""
+    if lat is None or lon is None:
+        return
+    cx, cy = lonlat_to_tile(lat, lon, HEATMAP_BASE_ZOOM)
+    day = (captured_at or datetime.utcnow()).date()
+    counts = Counter()
+    for vtype in [ALL_REPORTS, *violation_types]:
+        counts[(("vtype", vtype), ("cell_x", cx), ("cell_y", cy), ("day", day))] += 1
+    increment_counters(db, models.HeatmapCell, counts)
+
+def zone_for_point(lat: float, lon: float) -> Optional[str]:
+    """Geofence zone id used to bucket statistics, or None when unzoned"""
+    if lat is None or lon is None:
+        return None
+    zone = get_geofence().zone_for_point(lat, lon)
+    return zone.zone_id if zone else None
+
+def zones_for_points(lats: List[Optional[float]], lons: List[Optional[float]]) -> List[Optional[str]]:
+    """zone_for_point over many locations with one geofence query"""
+    known = [i for i, (lat, lon) in enumerate(zip(lats, lons)) if lat is not None and lon is not None]
+    zones = get_geofence().zones_for_points([lats[i] for i in known], [lons[i] for i in known])
+    ids = [None] * len(lats)
+    for i, zone in zip(known, zones):
+        ids[i] = zone.zone_id if zone else None
+    return ids
+
+def _stats_key(metric: str, day: date, zone: Optional[str], vtype: str = "", severity: int = 0):
+    return (("metric", metric), ("day", day), ("vtype", vtype), ("severity", severity), ("zone", zone or ""))
+
+def record_report_stats(db, captured_at: datetime, zone: Optional[str], detections: Iterable[Dict]):
+    """
+    Count a new report, its detections and violations into StatsRollup
+
+    detections uses the create_report payload shape: [{'violations': [{'type', 'severity'}, ...]}, ...]
+    """
+    day = (captured_at or datetime.utcnow()).date()
+    counts = Counter({_stats_key("report", day, zone): 1})
+    for det in detections:
+        counts[_stats_key("detection", day, zone)] += 1
+        for v in det['violations']:
+            counts[_stats_key("violation", day, zone, v['type'], v['severity'])] += 1
+    increment_counters(db, models.StatsRollup, counts)
+
+def record_violation_stats(db, vtype: str, severity: int, zone: Optional[str], day: Optional[date] = None):
+    """Count a single violation added outside ingestion (e.g. a review)"""
+    day = day or datetime.utcnow().date()
+    increment_counters(db, models.StatsRollup, Counter({_stats_key("violation", day, zone, vtype, severity): 1}))
+
+def stats_summary(db) -> Dict:
+    """Totals and violation breakdowns summed from StatsRollup"""
+    S = models.StatsRollup
+    totals = dict.fromkeys(METRICS, 0)
+    by_type, by_severity, by_zone = Counter(), Counter(), Counter()
+    rows = db.query(S.metric, S.vtype, S.severity, S.zone, func.sum(S.count)).group_by(S.metric, S.vtype, S.severity, S.zone)
+    for metric, vtype, severity, zone, n in rows:
+        n = int(n)
+        totals[metric] = totals.get(metric, 0) + n
+        if metric == "violation":
+            by_type[vtype] += n
+            by_severity[str(severity)] += n
+            by_zone[zone or "unzoned"] += n
+    return {"reports": totals["report"], "detections": totals["detection"], "violations": totals["violation"],
+            "violations_by_type": dict(by_type), "violations_by_severity": dict(by_severity),
+            "violations_by_zone": dict(by_zone)}
+
+def stats_timeseries(db, metric: str = "violation", bucket: str = "day", vtype: Optional[str] = None,
+                     zone: Optional[str] = None, severity: Optional[int] = None,
+                     since: Optional[date] = None, until: Optional[date] = None) -> List[Dict]:
+    """
+    Counts per day or ISO week (starting Monday), oldest first
+
+    The database sums one row per day; weekly buckets are folded from those in Python,
+    so the cost is proportional to the number of days in range.
+    """
+    S = models.StatsRollup
+    q = db.query(S.day, func.sum(S.count)).filter(S.metric == metric)
+    if vtype:
+        q = q.filter(S.vtype == vtype)
+    if zone:
+        q = q.filter(S.zone == ("" if zone == "unzoned" else zone))
+    if severity is not None:
+        q = q.filter(S.severity == severity)
+    if since:
+        q = q.filter(S.day >= since)
+    if until:
+        q = q.filter(S.day <= until)
+    buckets = Counter()
+    for day, n in q.group_by(S.day):
+        if bucket == "week":
+            day = day - timedelta(days=day.weekday())
+        buckets[day] += int(n)
+    return [{"bucket": day.isoformat(), "count": n} for day, n in sorted(buckets.items())]
+
+def count_stats(db, chunk_size: int = STATS_REBUILD_CHUNK) -> Counter:
+    """
+    StatsRollup counters keyed like _stats_key, computed from the report tables
+
+    Reports are streamed and zoned chunk_size at a time, so memory holds one chunk
+    of rows plus a (day, zone) pair per report.
+    """
+    R, D, V = models.Report, models.Detection, models.Violation
+    counts = Counter()
+    zones = {}
+    reports = iter(db.query(R.id, R.lat, R.lon, R.captured_at).yield_per(chunk_size))
+    while True:
+        chunk = list(islice(reports, chunk_size))
+        if not chunk:
+            break
+        zone_ids = zones_for_points([r.lat for r in chunk], [r.lon for r in chunk])
+        for (rid, _, _, captured_at), zone in zip(chunk, zone_ids):
+            zones[rid] = (captured_at.date(), zone)
+            counts[_stats_key("report", *zones[rid])] += 1
+    for (rid,) in db.query(D.report_id).yield_per(1000):
+        if rid in zones:
+            counts[_stats_key("detection", *zones[rid])] += 1
+    for rid, vtype, severity in db.query(D.report_id, V.type, V.severity).join(V, V.detection_id == D.id).yield_per(1000):
+        if rid in zones:
+            counts[_stats_key("violation", *zones[rid], vtype, severity or 0)] += 1
+    return counts
+
+def rebuild_stats(db) -> int:
+    """Recompute StatsRollup from the report tables (run once by the stats_rollup migration)"""
+    db.query(models.StatsRollup).delete()
+    counts = count_stats(db)
+    increment_counters(db, models.StatsRollup, counts)
+    return len(counts)
+
+class TileCache:
+    """LRU of rendered tiles, invalidated per point when reports land"""
+
+    def __init__(self, max_tiles: int = HEATMAP_TILE_CACHE, ttl: float = HEATMAP_TILE_TTL):
+        self.max_tiles = max_tiles
+        self.ttl = ttl
+        self._tiles: "OrderedDict[Tuple[int, int, int], Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tile: Tuple[int, int, int], key: Tuple):
+        with self._lock:
+            entries = self._tiles.get(tile)
+            if not entries or key not in entries:
+                return None
+            stored_at, payload = entries[key]
+            if time.monotonic() - stored_at > self.ttl:
+                del entries[key]
+                return None
+            self._tiles.move_to_end(tile)
+            return payload
+
+    def put(self, tile: Tuple[int, int, int], key: Tuple, payload: Dict):
+        with self._lock:
+            self._tiles.setdefault(tile, {})[key] = (time.monotonic(), payload)
+            self._tiles.move_to_end(tile)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+    def invalidate_point(self, lat: float, lon: float):
+        """Drop every cached tile, at any zoom, that contains the point"""
+        if lat is None or lon is None:
+            return
+        with self._lock:
+            for z in range(HEATMAP_BASE_ZOOM + 1):
+                x, y = lonlat_to_tile(lat, lon, z)
+                self._tiles.pop((z, x, y), None)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+
+tile_cache = TileCache()
+
+def heatmap_tile(db, z: int, x: int, y: int, vtype: Optional[str] = None,
+                 since: Optional[date] = None, until: Optional[date] = None) -> Dict:
+    """
+    Aggregated counts for one tile as a GeoJSON FeatureCollection of bin centres
+
+    Counts come from HeatmapCell rows inside the tile, summed into a
+    HEATMAP_TILE_BINS x HEATMAP_TILE_BINS grid by the database. Results are cached
+    until a report lands in the tile or HEATMAP_TILE_TTL expires.
+    """
+    vtype = vtype or ALL_REPORTS
+    key = (vtype, since, until)
+    cached = tile_cache.get((z, x, y), key)
+    if cached is not None:
+        return cached
+
+    C = models.HeatmapCell
+    shift = HEATMAP_BASE_ZOOM - z
+    bin_zoom = min(z + int(math.log2(HEATMAP_TILE_BINS)), HEATMAP_BASE_ZOOM)
+    bin_div = 1 << (HEATMAP_BASE_ZOOM - bin_zoom)
+    bx = C.cell_x // bin_div if bin_div > 1 else C.cell_x
+    by = C.cell_y // bin_div if bin_div > 1 else C.cell_y
+    q = db.query(bx.label("bx"), by.label("by"), func.sum(C.count)).filter(
+        C.vtype == vtype,
+        C.cell_x.between(x << shift, ((x + 1) << shift) - 1),
+        C.cell_y.between(y << shift, ((y + 1) << shift) - 1))
+    if since:
+        q = q.filter(C.day >= since)
+    if until:
+        q = q.filter(C.day <= until)
+
+    features = []
+    for bin_x, bin_y, count in q.group_by("bx", "by"):
+        lon, lat = tile_to_lonlat(bin_x + 0.5, bin_y + 0.5, bin_zoom)
+        features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                         'properties': {'count': int(count), 'bin': [bin_zoom, bin_x, bin_y]}})
+    payload = {'type': 'FeatureCollection', 'tile': [z, x, y], 'features': features}
+    tile_cache.put((z, x, y), key, payload)
+    return payload
+
+def rebuild_heatmap(db):
+    """Recompute HeatmapCell from the report tables (backfill after enabling tiles)"""
+    db.query(models.HeatmapCell).delete()
+    counts = Counter()
+    R, D, V = models.Report, models.Detection, models.Violation
+    for lat, lon, captured_at in db.query(R.lat, R.lon, R.captured_at).yield_per(1000):
+        if lat is None or lon is None:
+            continue
+        cx, cy = lonlat_to_tile(lat, lon, HEATMAP_BASE_ZOOM)
+        counts[(("vtype", ALL_REPORTS), ("cell_x", cx), ("cell_y", cy), ("day", captured_at.date()))] += 1
+    rows = db.query(R.lat, R.lon, R.captured_at, V.type).join(D, D.report_id == R.id).join(V, V.detection_id == D.id)
+    for lat, lon, captured_at, vtype in rows.yield_per(1000):
+        if lat is None or lon is None or vtype.startswith("review:"):
+            continue
+        cx, cy = lonlat_to_tile(lat, lon, HEATMAP_BASE_ZOOM)
+        counts[(("vtype", vtype), ("cell_x", cx), ("cell_y", cy), ("day", captured_at.date()))] += 1
+    increment_counters(db, models.HeatmapCell, counts)
+    tile_cache.clear()
+    return len(counts)
@@ -23,6 +23,7 @@ REFRESH_TOKEN_EXPIRE_DAYS = 7
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 class AuthManager:
     """Handles JWT token generation and validation"""
@@ -114,6 +115,15 @@ async def get_current_user(
     
     return user
 
+async def get_optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+) -> Optional[models.User]:
+    """Get the authenticated user if a bearer token was sent, otherwise None"""
+    if credentials is None:
+        return None
+    return await get_current_user(credentials, db)
+
 def require_role(required_role: str):
     """Decorator to require specific user role"""
     def role_checker(current_user: models.User = Depends(get_current_user)):
@@ -0,0 +1,134 @@
+"""
+Near-Duplicate Report Detection
+Perceptual (difference) hashing with a BK-tree index over Hamming distance
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from PIL import Image
+from . import models
+from .util import distance_m
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DUPLICATE_MAX_HAMMING = int(os.getenv("DUPLICATE_MAX_HAMMING", "6"))  # of 64 bits
+DUPLICATE_RADIUS_M = float(os.getenv("DUPLICATE_RADIUS_M", "75"))
+DEDUP_REFRESH_S = float(os.getenv("DEDUP_REFRESH_S", "300"))  # pick up reports stored by other workers
+DEDUP_SYNC_LOOKBACK = timedelta(hours=1)  # reports are hashed after capture, so re-read a margin
+DHASH_SOURCE_EDGE = 128  # hashing only needs a small decode
+
+def dhash(img: Image.Image, hash_size: int = 8) -> int:
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail"""
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    px = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (px[offset + col] < px[offset + col + 1])
+    return value
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes; each node stores all items sharing its hash"""
+
+    def __init__(self):
+        self._root = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, h: int, item):
+        self.size += 1
+        if self._root is None:
+            self._root = [h, [item], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [item], {}]
+                return
+            node = child
+
+    def search(self, h: int, max_distance: int) -> List[Tuple[int, object]]:
+        """All (distance, item) pairs with Hamming distance <= max_distance"""
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= max_distance:
+                found.extend((d, item) for item in node[1])
+            # Triangle inequality: only children keyed within [d - r, d + r] can match
+            for cd, child in node[2].items():
+                if d - max_distance <= cd <= d + max_distance:
+                    stack.append(child)
+        return found
+
+class NearDuplicateIndex:
+    """
+    In-process index of original (non-duplicate) reports by perceptual hash and location
+
+    Loaded lazily from the report table and topped up every DEDUP_REFRESH_S with
+    reports written by other worker processes.
+    """
+
+    def __init__(self, max_hamming: int = DUPLICATE_MAX_HAMMING, radius_m: float = DUPLICATE_RADIUS_M):
+        self.max_hamming = max_hamming
+        self.radius_m = radius_m
+        self._tree = BKTree()
+        self._ids = set()
+        self._lock = threading.Lock()
+        self._synced_at = None  # captured_at watermark of the last DB sync
+        self._synced_clock = 0.0
+
+    def _sync(self, db):
+        R = models.Report
+        q = db.query(R.id, R.phash, R.lat, R.lon, R.captured_at).filter(R.phash.isnot(None), R.duplicate_of.is_(None))
+        if self._synced_at is not None:
+            q = q.filter(R.captured_at >= self._synced_at - DEDUP_SYNC_LOOKBACK)
+        watermark = self._synced_at
+        for rid, phash, lat, lon, captured_at in q.yield_per(1000):
+            self._add_locked(rid, int(phash, 16), lat, lon)
+            if captured_at and (watermark is None or captured_at > watermark):
+                watermark = captured_at
+        self._synced_at = watermark or datetime(1970, 1, 1)
+        self._synced_clock = time.monotonic()
+
+    def _add_locked(self, report_id: str, phash: int, lat: float, lon: float):
+        if report_id in self._ids:
+            return
+        self._ids.add(report_id)
+        self._tree.add(phash, (report_id, lat, lon))
+
+    def add(self, report_id: str, phash: int, lat: float, lon: float):
+        with self._lock:
+            self._add_locked(report_id, phash, lat, lon)
+
+    def find(self, db, phash: int, lat: float, lon: float) -> Optional[str]:
+        """Closest original report within max_hamming bits and radius_m metres, if any"""
+        with self._lock:
+            if self._synced_at is None or time.monotonic() - self._synced_clock > DEDUP_REFRESH_S:
+                self._sync(db)
+            candidates = self._tree.search(phash, self.max_hamming)
+        best = None
+        for d, (rid, clat, clon) in candidates:
+            if clat is None or lat is None:
+                continue
+            dist = distance_m(lat, lon, clat, clon)
+            if dist <= self.radius_m and (best is None or (d, dist) < best[0]):
+                best = ((d, dist), rid)
+        return best[1] if best else None
+
+    @property
+    def size(self) -> int:
+        return self._tree.size
+
+duplicate_index = NearDuplicateIndex()
@@ -3,34 +3,71 @@ Computer Vision Detection Pipeline for Billboard Analysis
 Mock implementation with realistic outputs for hackathon demo
 """
 
+import os
 import json
 import random
-from typing import List, Dict, Tuple
-from PIL import Image
+import threading
+from typing import List, Dict, Tuple, Union, Sequence
 import numpy as np
-from .size_estimation import estimate_billboard_size
-from .ocr import extract_billboard_text
+from .imaging import ImageContext
+from .size_estimation import estimate_billboard_sizes
+from .ocr import extract_region_text
+
+DETECTOR_BACKEND = os.getenv("DETECTOR_BACKEND", "mock")  # "mock" or "onnx"
+MOCK_MODEL_VERSION = "billboard-yolo-v1.2"
+
+def describe_detections(ctx: ImageContext, found: Sequence[Tuple]) -> List[Dict]:
+    """
+    Detection dicts for (bbox, confidence[, corners]) tuples with normalized bboxes
+
+    Adds size estimates, and OCR text, QR and license from one batched OCR pass over
+    crops of the detected regions.
+    """
+    width, height = ctx.size
+    # Enhanced OCR text extraction with license detection, on the billboard crops only
+    ocr_results = extract_region_text(ctx, [f[0] for f in found])
+    # Estimate real-world dimensions using camera-based size estimation, all boxes at once; the
+    # estimator works in pixels of this image
+    pixel_boxes = np.asarray([f[0] for f in found], dtype=np.float64).reshape(-1, 4) * [width, height, width, height]
+    size_estimates = estimate_billboard_sizes(pixel_boxes, width, height) if found else []
+    detections = []
+    for (bbox, confidence, *rest), ocr_result, size_estimate in zip(found, ocr_results, size_estimates):
+        corners = rest[0] if rest else None
+        x1, y1, x2, y2 = bbox
+        detections.append({
+            'bbox': bbox,
+            'corners': corners or [[x1, y1], [x2, y1], [x2, y2], [x1, y2]],
+            'est_width_m': size_estimate["width_m"],
+            'est_height_m': size_estimate["height_m"],
+            'confidence': confidence,
+            'qr_text': ocr_result["qr_codes"][0]["content"] if ocr_result["qr_codes"] else "",
+            'ocr_text': ocr_result["full_text"],
+            'license_id': ocr_result["license_numbers"][0] if ocr_result["license_numbers"] else ""
+        })
+    return detections
 
 class BillboardDetector:
     """Mock computer vision detector that simulates YOLO/Faster R-CNN detection"""
     
     def __init__(self):
-        self.model_version = "billboard-yolo-v1.2"
+        self.model_version = MOCK_MODEL_VERSION
         self.confidence_threshold = 0.5
         
-    def detect_billboards(self, image_path: str) -> List[Dict]:
+    def detect_billboards(self, image: Union[str, ImageContext]) -> List[Dict]:
         """
         Simulate billboard detection with realistic bounding boxes and metadata
+
+        Accepts a path or a shared ImageContext; OCR and size estimation reuse the context.
         """
+        ctx = ImageContext.of(image)
         try:
-            # Load image to get dimensions
-            with Image.open(image_path) as img:
-                width, height = img.size
+            # Image dimensions (header only unless the context is already decoded)
+            width, height = ctx.size
         except:
             # Fallback dimensions
             width, height = 1920, 1080
             
-        detections = []
+        found = []
         
         # Simulate 1-3 billboard detections per image
         num_detections = random.randint(1, 3)
@@ -39,36 +76,15 @@ class BillboardDetector:
             # Generate realistic bounding box
             bbox = self._generate_realistic_bbox(width, height)
             
-            # Estimate real-world dimensions using camera-based size estimation
-            size_estimate = estimate_billboard_size(bbox, width, height)
-            est_width, est_height = size_estimate["width_m"], size_estimate["height_m"]
-            
             # Generate corner points for perspective analysis
             corners = self._generate_corners(bbox)
             
-            # Enhanced OCR text extraction with license detection
-            ocr_result = extract_billboard_text(image_path)
-            ocr_text = ocr_result["full_text"]
-            qr_text = ocr_result["qr_codes"][0]["content"] if ocr_result["qr_codes"] else ""
-            license_id = ocr_result["license_numbers"][0] if ocr_result["license_numbers"] else ""
-            
             # Confidence score
             confidence = random.uniform(0.6, 0.95)
             
-            detection = {
-                'bbox': bbox,
-                'corners': corners,
-                'est_width_m': est_width,
-                'est_height_m': est_height,
-                'confidence': confidence,
-                'qr_text': qr_text,
-                'ocr_text': ocr_text,
-                'license_id': license_id
-            }
-            
-            detections.append(detection)
+            found.append((bbox, confidence, corners))
             
-        return detections
+        return describe_detections(ctx, found)
     
     def _generate_realistic_bbox(self, img_width: int, img_height: int) -> List[float]:
         """Generate realistic bounding box coordinates (normalized 0-1)"""
@@ -164,12 +180,66 @@ class BillboardDetector:
         number = random.randint(1000, 9999)
         return f"{random.choice(cities)}-{year}-{number}"
 
+class ModelBillboardDetector:
+    """Runs a real model backend and describes its boxes like the mock detector"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.model_version = backend.model_version
+
+    def detect_billboards(self, image: Union[str, ImageContext]) -> List[Dict]:
+        ctx = ImageContext.of(image)
+        return describe_detections(ctx, self.backend.detect_boxes(ctx))
+
+    def detect_billboards_batch(self, images: Sequence[Union[str, ImageContext]]) -> List[List[Dict]]:
+        ctxs = [ImageContext.of(i) for i in images]
+        boxes = self.backend.detect_boxes_batch(ctxs)
+        return [describe_detections(ctx, found) for ctx, found in zip(ctxs, boxes)]
+
+    def warmup(self):
+        self.backend.warmup()
+
 # Singleton detector instance
 detector = BillboardDetector()
+_active = None
+_active_lock = threading.Lock()
 
-def analyze_billboard_image(image_path: str) -> List[Dict]:
+def get_detector():
+    """Detector selected by DETECTOR_BACKEND, created once per process"""
+    global _active
+    if _active is None:
+        with _active_lock:
+            if _active is None:
+                if DETECTOR_BACKEND == "onnx":
+                    from .onnx_detector import OnnxBillboardDetector
+                    _active = ModelBillboardDetector(OnnxBillboardDetector())
+                else:
+                    _active = detector
+    return _active
+
+def detector_model_version() -> str:
+    """Version recorded on reports, without loading the model"""
+    if DETECTOR_BACKEND == "onnx":
+        from .onnx_detector import onnx_model_version
+        return onnx_model_version()
+    return MOCK_MODEL_VERSION
+
+def warmup_detector():
+    """Load the configured detector and run one dummy inference"""
+    d = get_detector()
+    if hasattr(d, "warmup"):
+        d.warmup()
+
+def analyze_billboard_image(image: Union[str, ImageContext]) -> List[Dict]:
     """
     Main function to analyze uploaded billboard image
     Returns list of detections with violations
     """
-    return detector.detect_billboards(image_path)
+    return get_detector().detect_billboards(image)
+
+def analyze_billboard_images(images: Sequence[Union[str, ImageContext]]) -> List[List[Dict]]:
+    """Analyze several images, with batched inference when the backend supports it"""
+    d = get_detector()
+    if hasattr(d, "detect_billboards_batch"):
+        return d.detect_billboards_batch(images)
+    return [d.detect_billboards(i) for i in images]
@@ -0,0 +1,115 @@
+"""
+Detection Result Cache
+Detector output keyed by image content hash and model version, in a memory LRU backed by disk
+"""
+
+import os
+import re
+import json
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DETECTION_CACHE_ENABLED = os.getenv("DETECTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+DETECTION_CACHE_ENTRIES = int(os.getenv("DETECTION_CACHE_ENTRIES", "4096"))  # in-memory results per process
+DETECTION_CACHE_DIR = os.getenv("DETECTION_CACHE_DIR", "./data/detections")  # empty disables the disk tier
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9._-]")
+
+class DetectionCache:
+    """
+    Detections for (content sha256, model_version)
+
+    Results are kept as JSON text, so callers always get a fresh copy and memory use
+    follows the size of the output. Misses in memory fall through to one JSON file per
+    key under directory/<model_version>/ab/<sha256>.json, written atomically and shared
+    by every process; changing the model version naturally starts a new namespace.
+    """
+
+    def __init__(self, max_entries: int = DETECTION_CACHE_ENTRIES, directory: Optional[str] = DETECTION_CACHE_DIR,
+                 enabled: bool = DETECTION_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.directory = directory or None
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _path(self, digest: str, model_version: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, _UNSAFE.sub("_", model_version), digest[:2], f"{digest}.json")
+
+    def _remember(self, key: Tuple[str, str], payload: str):
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, digest: str, model_version: str) -> Optional[List[Dict]]:
+        """Cached detections, or None on a miss"""
+        key = (digest, model_version)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self._counts['memory_hits'] += 1
+                return json.loads(payload)
+        path = self._path(digest, model_version)
+        try:
+            with open(path) as f:
+                payload = f.read()
+            detections = json.loads(payload)
+        except (TypeError, OSError, ValueError):
+            self._count('misses')
+            return None
+        self._remember(key, payload)
+        self._count('disk_hits')
+        return detections
+
+    def put(self, digest: str, model_version: str, detections: List[Dict]):
+        """Store detections in memory and on disk; disk errors are logged, not raised"""
+        payload = json.dumps(detections)
+        self._remember((digest, model_version), payload)
+        self._count('stores')
+        path = self._path(digest, model_version)
+        if path is None:
+            return
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "w") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("Could not write detection cache entry %s", path, exc_info=True)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def stats(self) -> Dict:
+        """Hit counters for this process since start (or the last clear)"""
+        with self._lock:
+            counts = dict(self._counts)
+            entries = len(self._entries)
+        hits = counts['memory_hits'] + counts['disk_hits']
+        lookups = hits + counts['misses']
+        return {'enabled': self.enabled, 'entries': entries, 'max_entries': self.max_entries, **counts,
+                'lookups': lookups, 'hit_rate': round(hits / lookups, 4) if lookups else 0.0}
+
+    def clear(self):
+        """Forget in-memory entries and counters; the disk tier is kept"""
+        with self._lock:
+            self._entries.clear()
+            self._counts = dict.fromkeys(self._counts, 0)
+
+# Process-wide cache; lookups happen in the process that owns the request
+detection_cache = DetectionCache()
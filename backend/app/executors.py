@@ -0,0 +1,132 @@
+"""
+Ingest Executors
+Thread and process pools that keep CPU-bound pipeline stages off the event loop, with admission control
+"""
+
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_THREADS = int(os.getenv("EXECUTOR_THREADS", "8"))  # database commits, file moves, orchestration
+EXECUTOR_PROCESSES = int(os.getenv("EXECUTOR_PROCESSES", str(os.cpu_count() or 1)))  # pixel work; 0 runs it on the threads
+EXECUTOR_START_METHOD = os.getenv("EXECUTOR_START_METHOD", "spawn")  # the server process is multi-threaded, so avoid fork
+MAX_INFLIGHT_INGEST = int(os.getenv("MAX_INFLIGHT_INGEST", str(2 * max(1, EXECUTOR_PROCESSES))))
+MAX_INFLIGHT_PER_CLIENT = int(os.getenv("MAX_INFLIGHT_PER_CLIENT", "2"))
+INGEST_RETRY_AFTER = int(os.getenv("INGEST_RETRY_AFTER", "5"))  # seconds
+
+def _warm_worker():
+    """Process pool initializer: import the pipeline and load the detector before the first job"""
+    from . import pipeline  # noqa: F401
+    from .detection import warmup_detector
+    try:
+        warmup_detector()
+    except Exception:
+        logger.exception("Detector warm-up failed")
+
+def _noop():
+    return None
+
+class IngestExecutors:
+    """
+    Bounded execution for report ingestion
+
+    Async endpoints hand blocking work to run_io(), which runs it on a thread pool;
+    those threads push pixel work (decode, redaction, detection) to a process pool via
+    `pixels`. admit() caps the number of ingest requests in flight overall (503) and
+    per client (429), so cheap GET endpoints keep their latency during upload bursts.
+    """
+
+    def __init__(self, threads: int = EXECUTOR_THREADS, processes: int = EXECUTOR_PROCESSES,
+                 max_inflight: int = MAX_INFLIGHT_INGEST, max_per_client: int = MAX_INFLIGHT_PER_CLIENT,
+                 retry_after: int = INGEST_RETRY_AFTER):
+        self.threads = max(1, threads)
+        self.processes = processes
+        self.max_inflight = max_inflight
+        self.max_per_client = max_per_client
+        self.retry_after = retry_after
+        self._io: Optional[ThreadPoolExecutor] = None
+        self._pixels: Optional[Executor] = None
+        self._inflight = 0
+        self._per_client: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def io(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._io is None:
+                self._io = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="ingest-io")
+            return self._io
+
+    @property
+    def pixels(self) -> Optional[Executor]:
+        """Process pool for pixel work; None when processes is 0 and callers run it inline"""
+        if self.processes <= 0:
+            return None
+        with self._lock:
+            if self._pixels is None:
+                self._pixels = ProcessPoolExecutor(max_workers=self.processes, initializer=_warm_worker,
+                                                   mp_context=multiprocessing.get_context(EXECUTOR_START_METHOD))
+            return self._pixels
+
+    def warmup(self):
+        """Start the pixel workers (each warms its detector), or warm the detector in this process"""
+        if self.pixels is None:
+            _warm_worker()
+            return
+        for f in [self.pixels.submit(_noop) for _ in range(self.processes)]:
+            f.result()
+
+    async def run_io(self, func: Callable, *args, **kwargs):
+        """Run a blocking call on the thread pool and await its result"""
+        return await asyncio.get_running_loop().run_in_executor(self.io, partial(func, *args, **kwargs))
+
+    @contextmanager
+    def admit(self, client: str):
+        """
+        Hold an ingest slot for the duration of the block
+
+        Raises:
+            HTTPException 503 when max_inflight requests are already running,
+            HTTPException 429 when this client already has max_per_client running
+        """
+        headers = {"Retry-After": str(self.retry_after)}
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                raise HTTPException(status_code=503, detail="Ingestion is at capacity, retry later", headers=headers)
+            if self._per_client.get(client, 0) >= self.max_per_client:
+                raise HTTPException(status_code=429, detail="Too many uploads in progress for this client", headers=headers)
+            self._inflight += 1
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                remaining = self._per_client[client] - 1
+                if remaining:
+                    self._per_client[client] = remaining
+                else:
+                    del self._per_client[client]
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pools, self._io, self._pixels = [self._pixels, self._io], None, None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=wait)
+
+# Process-wide executors used by the reports router and the local job queue
+ingest_executors = IngestExecutors()
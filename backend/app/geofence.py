@@ -3,69 +3,121 @@ Geofence and Permitted Database Check Module
 Implements location-based validation against municipal billboard registry
 """
 
+import os
 import json
 import math
-from typing import List, Dict, Optional, Tuple
+import logging
+import threading
+from typing import Any, List, Dict, Optional, Tuple
 from dataclasses import dataclass
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from .spatial import load_point_index, lonlat_to_metres, DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Polygon features with zone_id, name, limits and special_rules properties
+GEOFENCE_ZONES_PATH = os.getenv("GEOFENCE_ZONES_PATH", os.path.join(DATA_DIR, "zones.geojson"))
+# Point features with a "name" and the required "buffer_m" around each
+SENSITIVE_LOCATIONS_PATH = os.getenv("SENSITIVE_LOCATIONS_PATH", os.path.join(DATA_DIR, "sensitive_locations.geojson"))
 
 @dataclass
 class GeofenceZone:
     """Represents a geofenced area with specific billboard regulations"""
     zone_id: str
     name: str
-    coordinates: List[Tuple[float, float]]  # Polygon boundary points
+    coordinates: List[Tuple[float, float]]  # Exterior boundary as (lon, lat), GeoJSON order
     max_billboards: int
     size_limit_m2: float
     prohibited: bool = False
     special_rules: Dict = None
+    geometry: Any = None  # shapely (Multi)Polygon in lon/lat
+
+    @property
+    def buffer_distance_m(self) -> float:
+        """Keep-out distance around the zone, 0 when it has none"""
+        return float((self.special_rules or {}).get("buffer_distance_m", 0) or 0)
+
+def load_zones(path: str = GEOFENCE_ZONES_PATH) -> List[GeofenceZone]:
+    """Zones from a GeoJSON FeatureCollection of polygons, in file order"""
+    with open(path) as f:
+        collection = json.load(f)
+    zones = []
+    for feature in collection.get("features", []):
+        props = feature.get("properties") or {}
+        try:
+            geometry = shape(feature["geometry"])
+            if geometry.geom_type not in ("Polygon", "MultiPolygon") or geometry.is_empty:
+                raise ValueError(f"expected a polygon, got {geometry.geom_type}")
+            outline = geometry if geometry.geom_type == "Polygon" else max(geometry.geoms, key=lambda g: g.area)
+            zones.append(GeofenceZone(
+                zone_id=str(props["zone_id"]),
+                name=props.get("name", props["zone_id"]),
+                coordinates=[tuple(c) for c in outline.exterior.coords],
+                max_billboards=int(props.get("max_billboards", 0)),
+                size_limit_m2=float(props.get("size_limit_m2", 0)),
+                prohibited=bool(props.get("prohibited", False)),
+                special_rules=props.get("special_rules") or {},
+                geometry=geometry
+            ))
+        except (KeyError, TypeError, ValueError, AttributeError, shapely.errors.GEOSException):
+            logger.warning("Skipping malformed geofence zone %s in %s", props.get("zone_id"), path, exc_info=True)
+    return zones
 
 class BillboardGeofence:
-    """Geofence validation system for billboard placement compliance"""
+    """
+    Geofence validation system for billboard placement compliance
+
+    Zones are projected once to local metres, each is grown by its buffer_distance_m,
+    and the buffered shapes go into an STRtree. A point query walks the tree to the few
+    buffers around it, then prepared zone geometries tell "inside the zone" from
+    "inside its buffer only". Nothing changes after construction, so one instance
+    can serve every thread (see get_geofence).
+    """
     
-    def __init__(self):
-        self.restricted_zones = self._load_restricted_zones()
+    def __init__(self, zones_path: str = GEOFENCE_ZONES_PATH):
+        self.restricted_zones = self._load_restricted_zones(zones_path)
         self.permitted_locations = []
+        self.sensitive_locations = load_point_index(SENSITIVE_LOCATIONS_PATH, radius_property="buffer_m")
+        self._build_zone_index()
     
-    def _load_restricted_zones(self) -> List[GeofenceZone]:
-        """Load predefined restricted zones (schools, hospitals, religious sites)"""
-        return [
-            GeofenceZone(
-                zone_id="school_buffer_001",
-                name="Government Model Senior Secondary School Buffer",
-                coordinates=[(30.3545, 76.3625), (30.3555, 76.3625), (30.3555, 76.3635), (30.3545, 76.3635)],
-                max_billboards=0,
-                size_limit_m2=0,
-                prohibited=True,
-                special_rules={"buffer_distance_m": 100, "reason": "Educational institution protection"}
-            ),
-            GeofenceZone(
-                zone_id="hospital_buffer_001", 
-                name="PGI Chandigarh Buffer Zone",
-                coordinates=[(30.3520, 76.3580), (30.3530, 76.3580), (30.3530, 76.3590), (30.3520, 76.3590)],
-                max_billboards=0,
-                size_limit_m2=0,
-                prohibited=True,
-                special_rules={"buffer_distance_m": 200, "reason": "Healthcare facility protection"}
-            ),
-            GeofenceZone(
-                zone_id="heritage_buffer_001",
-                name="Rock Garden Heritage Site Buffer",
-                coordinates=[(30.3575, 76.3665), (30.3585, 76.3665), (30.3585, 76.3675), (30.3575, 76.3675)],
-                max_billboards=2,
-                size_limit_m2=20.0,
-                prohibited=False,
-                special_rules={"aesthetic_approval_required": True, "reason": "Heritage site preservation"}
-            ),
-            GeofenceZone(
-                zone_id="commercial_zone_001",
-                name="Sector 17 Commercial Plaza",
-                coordinates=[(30.3640, 76.3720), (30.3660, 76.3720), (30.3660, 76.3740), (30.3640, 76.3740)],
-                max_billboards=10,
-                size_limit_m2=48.0,
-                prohibited=False,
-                special_rules={"premium_zone": True, "higher_fees": True}
-            )
-        ]
+    def _load_restricted_zones(self, path: str = GEOFENCE_ZONES_PATH) -> List[GeofenceZone]:
+        """Load restricted zones (schools, hospitals, heritage and commercial areas)"""
+        return load_zones(path)
+    
+    def _build_zone_index(self):
+        """Metric zone shapes, their precomputed buffers and the STRtree over the buffers"""
+        zones = self.restricted_zones
+        self._lat0 = float(np.mean([z.geometry.centroid.y for z in zones])) if zones else 0.0
+        to_metres = lambda c: np.column_stack(lonlat_to_metres(c[:, 0], c[:, 1], self._lat0))
+        self._zone_shapes = shapely.transform(np.array([z.geometry for z in zones], dtype=object), to_metres)
+        self._buffer_m = np.array([z.buffer_distance_m for z in zones])
+        self._zone_buffers = np.array([g.buffer(d) if d > 0 else g for g, d in zip(self._zone_shapes, self._buffer_m)],
+                                      dtype=object)
+        shapely.prepare(self._zone_shapes)
+        shapely.prepare(self._zone_buffers)
+        self._zone_tree = shapely.STRtree(self._zone_buffers)
+        # GEOS fills prepared-geometry indexes on first use; do that now, before threads share the instance
+        inner = [z.geometry.representative_point() for z in zones]
+        self._locate([p.y for p in inner], [p.x for p in inner])
+    
+    def _locate(self, lats, lons) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Every (point, zone) pair where a point falls inside a zone or its buffer
+
+        Returns:
+            (point index, zone index, inside the zone itself, metres to the zone) sorted
+            by point then zone order; the distance is 0 inside the zone
+        """
+        x, y = lonlat_to_metres(np.atleast_1d(lons), np.atleast_1d(lats), self._lat0)
+        points = shapely.points(x, y)
+        point_idx, zone_idx = self._zone_tree.query(points, predicate="intersects")
+        order = np.lexsort((zone_idx, point_idx))
+        point_idx, zone_idx = point_idx[order], zone_idx[order]
+        inside = shapely.intersects_xy(self._zone_shapes[zone_idx], x[point_idx], y[point_idx])
+        distance = np.where(inside, 0.0, shapely.distance(self._zone_shapes[zone_idx], points[point_idx]))
+        return point_idx, zone_idx, inside, distance
     
     def check_location_compliance(self, lat: float, lon: float, 
                                 billboard_area_m2: float = 0) -> Dict:
@@ -79,40 +131,72 @@ class BillboardGeofence:
         Returns:
             Compliance result with violations and recommendations
         """
+        return self.validate_locations([(lat, lon, billboard_area_m2)])[0]
+    
+    def validate_locations(self, points) -> List[Dict]:
+        """
+        check_location_compliance for many locations in one pass
+        
+        Zones, zone buffers and sensitive-location buffers are each queried once for
+        the whole batch; only assembling the per-point result dictionaries loops in Python.
+        
+        Args:
+            points: Sequence or (N, 2|3) array of (lat, lon[, area_m2]); area defaults to 0
+            
+        Returns:
+            One compliance result per point, in input order
+        """
+        arr = np.asarray(points, dtype=float)
+        if not arr.size:
+            return []
+        arr = arr.reshape(len(arr), -1)
+        lats, lons = arr[:, 0], arr[:, 1]
+        areas = arr[:, 2].tolist() if arr.shape[1] > 2 else [0] * len(arr)
+        steps = np.arange(len(arr) + 1)
+        point_idx, zone_idx, inside, distance = self._locate(lats, lons)
+        zone_bounds = np.searchsorted(point_idx, steps).tolist()
+        query_idx, location_idx, location_distance = self.sensitive_locations.buffer_hits(lats, lons)
+        location_bounds = np.searchsorted(query_idx, steps).tolist()
+        results = []
+        for i, area in enumerate(areas):
+            z = slice(zone_bounds[i], zone_bounds[i + 1])
+            s = slice(location_bounds[i], location_bounds[i + 1])
+            results.append(self._compliance_result(area, zone_idx[z], inside[z], distance[z],
+                                                   location_idx[s], location_distance[s]))
+        return results
+    
+    def _compliance_result(self, billboard_area_m2: float, zone_idx: np.ndarray, inside: np.ndarray,
+                           distance: np.ndarray, location_idx: np.ndarray, location_distance: np.ndarray) -> Dict:
+        """Compliance result for one point from its zone and buffer hits"""
         violations = []
-        zone_info = None
         compliance_status = "compliant"
         
-        # Check against all restricted zones
-        for zone in self.restricted_zones:
-            if self._point_in_polygon(lat, lon, zone.coordinates):
-                zone_info = zone
-                
-                if zone.prohibited:
-                    violations.append({
-                        "type": "prohibited_zone",
-                        "severity": 5,
-                        "reason": f"Billboard prohibited in {zone.name}",
-                        "details": zone.special_rules.get("reason", "Zone restriction")
-                    })
-                    compliance_status = "prohibited"
-                
-                elif billboard_area_m2 > zone.size_limit_m2:
-                    violations.append({
-                        "type": "size_exceeds_zone_limit",
-                        "severity": 4,
-                        "reason": f"Area {billboard_area_m2}m² exceeds zone limit of {zone.size_limit_m2}m²",
-                        "zone": zone.name
-                    })
-                    compliance_status = "non_compliant"
-                
-                break
+        zone_info = self.restricted_zones[int(zone_idx[inside][0])] if inside.any() else None
+        if zone_info:
+            if zone_info.prohibited:
+                violations.append({
+                    "type": "prohibited_zone",
+                    "severity": 5,
+                    "reason": f"Billboard prohibited in {zone_info.name}",
+                    "details": zone_info.special_rules.get("reason", "Zone restriction")
+                })
+                compliance_status = "prohibited"
+            
+            elif billboard_area_m2 > zone_info.size_limit_m2:
+                violations.append({
+                    "type": "size_exceeds_zone_limit",
+                    "severity": 4,
+                    "reason": f"Area {billboard_area_m2}m² exceeds zone limit of {zone_info.size_limit_m2}m²",
+                    "zone": zone_info.name
+                })
+                compliance_status = "non_compliant"
         
-        # Check buffer distances for sensitive areas
-        buffer_violations = self._check_buffer_distances(lat, lon)
+        # Check buffer distances around zones and sensitive locations
+        buffer_violations = self._zone_buffer_violations(zone_idx, inside, distance)
+        buffer_violations.extend(self._sensitive_violations(location_idx, location_distance))
         violations.extend(buffer_violations)
         
-        if buffer_violations:
+        if buffer_violations and compliance_status == "compliant":
             compliance_status = "non_compliant"
         
         return {
@@ -127,6 +211,23 @@ class BillboardGeofence:
             "recommendations": self._generate_recommendations(violations, zone_info)
         }
     
+    def zone_for_point(self, lat: float, lon: float) -> Optional[GeofenceZone]:
+        """Return the first restricted zone containing the point, if any"""
+        return self.zones_for_points([lat], [lon])[0]
+    
+    def zones_for_points(self, lats, lons) -> List[Optional[GeofenceZone]]:
+        """zone_for_point for arrays of coordinates, with one index query"""
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+        zones = [None] * len(lats)
+        if not len(lats):
+            return zones
+        point_idx, zone_idx, inside, _ = self._locate(lats, lons)
+        # pairs are ordered by point then zone, so the first inside hit is the first zone in file order
+        points, first = np.unique(point_idx[inside], return_index=True)
+        for p, z in zip(points.tolist(), zone_idx[inside][first].tolist()):
+            zones[p] = self.restricted_zones[z]
+        return zones
+    
     def check_permitted_database(self, license_id: str, lat: float, lon: float) -> Dict:
         """
         Check if billboard license exists in permitted database and location matches
@@ -178,49 +279,40 @@ class BillboardGeofence:
             "reason": self._get_database_reason(license_valid, location_match, distance_m)
         }
     
-    def _point_in_polygon(self, lat: float, lon: float, polygon: List[Tuple[float, float]]) -> bool:
-        """Check if point is inside polygon using ray casting algorithm"""
-        x, y = lon, lat
-        n = len(polygon)
-        inside = False
-        
-        p1x, p1y = polygon[0]
-        for i in range(1, n + 1):
-            p2x, p2y = polygon[i % n]
-            if y > min(p1y, p2y):
-                if y <= max(p1y, p2y):
-                    if x <= max(p1x, p2x):
-                        if p1y != p2y:
-                            xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                        if p1x == p2x or x <= xinters:
-                            inside = not inside
-            p1x, p1y = p2x, p2y
-        
-        return inside
+    def _zone_buffer_violations(self, zone_idx: np.ndarray, inside: np.ndarray, distance: np.ndarray) -> List[Dict]:
+        """Violations for zone buffers a point reaches without being inside the zone"""
+        violations = []
+        for z, d in zip(zone_idx[~inside].tolist(), distance[~inside].tolist()):
+            zone = self.restricted_zones[z]
+            violations.append({
+                "type": "buffer_violation",
+                "severity": 4,
+                "reason": f"Only {d:.0f}m from {zone.name} (min: {zone.buffer_distance_m:g}m)",
+                "location": zone.name,
+                "required_distance": zone.buffer_distance_m,
+                "actual_distance": round(d, 1)
+            })
+        return violations
     
     def _check_buffer_distances(self, lat: float, lon: float) -> List[Dict]:
         """Check minimum buffer distances from sensitive locations"""
+        _, location_idx, distance = self.sensitive_locations.buffer_hits(lat, lon)
+        return self._sensitive_violations(location_idx, distance)
+    
+    def _sensitive_violations(self, location_idx: np.ndarray, distance: np.ndarray) -> List[Dict]:
+        """Violations for sensitive-location buffers that reach a point, nearest first"""
         violations = []
-        
-        # Sensitive locations with required buffer distances
-        sensitive_locations = [
-            {"name": "DAV Public School", "lat": 30.3548, "lon": 76.3628, "buffer_m": 100},
-            {"name": "Gurudwara Singh Sabha", "lat": 30.3562, "lon": 76.3645, "buffer_m": 75},
-            {"name": "Children's Park", "lat": 30.3535, "lon": 76.3605, "buffer_m": 50}
-        ]
-        
-        for location in sensitive_locations:
-            distance = self._haversine_distance(lat, lon, location["lat"], location["lon"])
-            if distance < location["buffer_m"]:
-                violations.append({
-                    "type": "buffer_violation",
-                    "severity": 4,
-                    "reason": f"Only {distance:.0f}m from {location['name']} (min: {location['buffer_m']}m)",
-                    "location": location["name"],
-                    "required_distance": location["buffer_m"],
-                    "actual_distance": round(distance, 1)
-                })
-        
+        for i, d in zip(location_idx.tolist(), distance.tolist()):
+            props = self.sensitive_locations.features[i].get("properties") or {}
+            name, buffer_m = props.get("name", "Sensitive location"), props["buffer_m"]
+            violations.append({
+                "type": "buffer_violation",
+                "severity": 4,
+                "reason": f"Only {d:.0f}m from {name} (min: {buffer_m}m)",
+                "location": name,
+                "required_distance": buffer_m,
+                "actual_distance": round(d, 1)
+            })
         return violations
     
     def _haversine_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -272,6 +364,18 @@ class BillboardGeofence:
         else:
             return "License valid and location matches registered coordinates"
 
+_geofence = None
+_geofence_lock = threading.Lock()
+
+def get_geofence() -> BillboardGeofence:
+    """Geofence built once per process from the zone and sensitive-location files and shared"""
+    global _geofence
+    if _geofence is None:
+        with _geofence_lock:
+            if _geofence is None:
+                _geofence = BillboardGeofence()
+    return _geofence
+
 # Utility function for integration
 def validate_billboard_location(lat: float, lon: float, license_id: str = None, 
                               area_m2: float = 0) -> Dict:
@@ -281,7 +385,7 @@ def validate_billboard_location(lat: float, lon: float, license_id: str = None,
     Returns:
         Combined geofence and database validation results
     """
-    geofence = BillboardGeofence()
+    geofence = get_geofence()
     
     # Geofence compliance check
     location_result = geofence.check_location_compliance(lat, lon, area_m2)
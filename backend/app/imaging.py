@@ -0,0 +1,156 @@
+"""
+Shared Image Context
+Decodes an upload once, at bounded resolution, and hands the same pixels to every pipeline stage
+"""
+
+import os
+import logging
+import resource
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple, Union
+from PIL import Image
+from .uploads import MAX_UPLOAD_PIXELS
+
+logger = logging.getLogger(__name__)
+
+# Working resolution for redaction and everything derived from it; larger photos are
+# reduced while decoding (JPEG DCT scaling, then Image.reduce) instead of after
+DECODE_MAX_EDGE = int(os.getenv("DECODE_MAX_EDGE", "4096"))
+MAX_DECODE_PIXELS = int(os.getenv("MAX_DECODE_PIXELS", str(MAX_UPLOAD_PIXELS)))
+MB = 1024 * 1024
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def fit_size(size: Tuple[int, int], max_edge: int) -> Tuple[int, int]:
+    """(width, height) scaled so the longest side is at most max_edge; never upscales"""
+    w, h = size
+    scale = min(1.0, max_edge / max(w, h))
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+def _decode(img: Image.Image, max_edge: Optional[int]) -> Image.Image:
+    """Decode an opened image to RGB with its longest side at most max_edge"""
+    if max_edge and max(img.size) > max_edge:
+        # draft() makes libjpeg emit 1/2..1/8 scale; thumbnail() then applies Image.reduce
+        # before the final resample, so full-resolution pixels are never materialised
+        img.thumbnail(fit_size(img.size, max_edge), Image.BILINEAR, reducing_gap=2.0)
+    return img.convert("RGB")
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return peak_rss_bytes()
+
+def peak_rss_bytes() -> int:
+    """High-water resident set size of this process"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+
+class ImageContext:
+    """
+    Lazily decoded view of one image file
+
+    The header is read for the size and checked against MAX_DECODE_PIXELS, RGB pixels
+    are decoded at most DECODE_MAX_EDGE on the first image() call, and downsampled
+    copies are cached per size, so redaction, detection, OCR and size estimation share
+    a single decode. Not thread-safe; a context belongs to the worker processing that
+    upload.
+    """
+
+    def __init__(self, path: str, max_edge: Optional[int] = DECODE_MAX_EDGE):
+        self.path = path
+        self.max_edge = max_edge
+        self.memory: Dict[str, Dict[str, float]] = {}  # per-stage figures from track_stage()
+        self._size: Optional[Tuple[int, int]] = None
+        self._full: Optional[Image.Image] = None
+        self._scaled: Dict[int, Image.Image] = {}
+
+    @classmethod
+    def of(cls, image: Union[str, "ImageContext"]) -> "ImageContext":
+        """Wrap a path, or return an existing context unchanged"""
+        return image if isinstance(image, cls) else cls(image)
+
+    def _open(self) -> Image.Image:
+        """Open the file and refuse decompression bombs before any pixels are decoded"""
+        img = Image.open(self.path)
+        w, h = img.size
+        if w * h > MAX_DECODE_PIXELS:
+            img.close()
+            raise Image.DecompressionBombError(f"Image has {w * h} pixels, limit is {MAX_DECODE_PIXELS}")
+        self._size = img.size
+        return img
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Native (encoded) dimensions of the image"""
+        if self._size is None:
+            self._open().close()
+        return self._size
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    def image(self) -> Image.Image:
+        """RGB pixels at working resolution (longest side at most max_edge), decoded on first use"""
+        if self._full is None:
+            with self._open() as img:
+                self._full = _decode(img, self.max_edge)
+        return self._full
+
+    def scaled(self, max_edge: int) -> Image.Image:
+        """
+        RGB copy whose longest side is at most max_edge, cached per max_edge
+
+        Resized from the working-resolution pixels once image() has decoded them; before
+        that it is a separate reduced decode, which suits callers that never need the
+        full image. Stages that will call image() anyway should call it first.
+        """
+        if max_edge not in self._scaled:
+            if self._full is not None:
+                src = self._full
+                self._scaled[max_edge] = src.resize(fit_size(src.size, max_edge), Image.BILINEAR, reducing_gap=2.0)
+            else:
+                with self._open() as img:
+                    self._scaled[max_edge] = _decode(img, max_edge)
+        return self._scaled[max_edge]
+
+    def pixel_bytes(self) -> int:
+        """Bytes of decoded pixels currently held by this context"""
+        images = ([self._full] if self._full is not None else []) + list(self._scaled.values())
+        return sum(img.width * img.height * len(img.getbands()) for img in images)
+
+    def close(self):
+        """Release decoded pixels; the context can still be reused and will decode again"""
+        self._full = None
+        self._scaled.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+@contextmanager
+def track_stage(ctx: ImageContext, stage: str):
+    """
+    Record memory figures for one pipeline stage in ctx.memory[stage]
+
+    pixels_mb is exact for this upload; rss_mb and peak_growth_mb are process-wide and
+    also include concurrent uploads handled by other workers.
+    """
+    peak_before = peak_rss_bytes()
+    try:
+        yield
+    finally:
+        figures = {
+            'pixels_mb': round(ctx.pixel_bytes() / MB, 1),
+            'rss_mb': round(rss_bytes() / MB, 1),
+            'peak_growth_mb': round((peak_rss_bytes() - peak_before) / MB, 1),
+        }
+        ctx.memory[stage] = figures
+        logger.debug("stage %s for %s: %s", stage, os.path.basename(ctx.path), figures)
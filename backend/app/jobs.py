@@ -0,0 +1,198 @@
+"""
+Local Report Processing Queue
+In-process priority queue and worker threads; no external broker required
+"""
+
+import os
+import heapq
+import queue
+import logging
+import itertools
+import threading
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_MAX = int(os.getenv("REPORT_QUEUE_MAX", "1000"))
+REPORT_BATCH_SIZE = int(os.getenv("REPORT_BATCH_SIZE", "8"))  # ready jobs a worker runs together
+
+# Lower value is served first; inspectors jump ahead of citizen submissions
+PRIORITY_INSPECTOR = 0
+PRIORITY_CITIZEN = 10
+ROLE_PRIORITY = {"admin": PRIORITY_INSPECTOR, "inspector": PRIORITY_INSPECTOR, "citizen": PRIORITY_CITIZEN}
+
+def priority_for_role(role: Optional[str]) -> int:
+    """Queue priority for a submitter role (anonymous uploads rank as citizens)"""
+    return ROLE_PRIORITY.get(role or "citizen", PRIORITY_CITIZEN)
+
+@dataclass
+class Job:
+    """A queued unit of work and its progress"""
+    job_id: str
+    priority: int
+    func: Callable
+    args: Tuple = ()
+    kwargs: Dict = field(default_factory=dict)
+    batch: Optional[Callable[[List["Job"]], List]] = None
+    seq: int = 0
+    state: str = "queued"
+    error: Optional[str] = None
+    queued_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds REPORT_QUEUE_MAX jobs"""
+
+class ReportJobQueue:
+    """
+    Priority work queue served by a pool of daemon threads
+
+    Jobs are ordered by (priority, submission order). The queue only tracks jobs
+    submitted to this process; durable progress lives on Report.processing_status.
+    Jobs submitted with a batch runner are grouped: a worker takes up to batch_size
+    ready jobs that share it, in queue order, and runs them in one call.
+    """
+
+    def __init__(self, workers: int = REPORT_WORKERS, max_size: int = REPORT_QUEUE_MAX,
+                 batch_size: int = REPORT_BATCH_SIZE):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self._queue = queue.PriorityQueue(maxsize=max_size)
+        self._seq = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"report-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0):
+        """Ask workers to exit once the jobs ahead of them are done"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put((float("inf"), next(self._seq), None))
+        for t in threads:
+            t.join(timeout)
+
+    def submit(self, job_id: str, func: Callable, *args, priority: int = PRIORITY_CITIZEN,
+               batch: Optional[Callable[[List[Job]], List]] = None, **kwargs) -> Job:
+        """
+        Queue func(*args, **kwargs) under job_id
+
+        batch, when given, runs several such jobs at once instead: it receives the
+        Job objects and returns one result or raised exception per job.
+        """
+        self.start()
+        job = Job(job_id=job_id, priority=priority, func=func, args=args, kwargs=kwargs, batch=batch, seq=next(self._seq))
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait((priority, job.seq, job))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            raise QueueFullError(f"Report queue is full ({self._queue.maxsize} jobs)")
+        return job
+
+    def update(self, job_id: str, state: str):
+        """Record progress reported by a running job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.state = state
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Progress of a job submitted to this process, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = {
+                "state": job.state,
+                "error": job.error,
+                "queued_at": job.queued_at.isoformat(),
+                "started_at": job.started_at.isoformat() if job.started_at else None,
+                "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+            }
+        if status["state"] == "queued":
+            status["queue_position"] = self._position(job)
+        return status
+
+    def _position(self, job: Job) -> int:
+        """Number of queued jobs that will run before this one"""
+        with self._queue.mutex:
+            return sum(1 for p, seq, j in self._queue.queue if j is not None and (p, seq) < (job.priority, job.seq))
+
+    def _take_batch(self, first: Job) -> List[Job]:
+        """
+        first plus ready jobs sharing its batch runner, in queue order
+
+        Matching entries are picked out of the heap in place; others never leave the
+        queue, so a submitter filling the freed slots cannot block the worker.
+        """
+        jobs = [first]
+        with self._queue.mutex:
+            heap = self._queue.queue
+            taken = set()
+            for entry in sorted(heap):
+                if len(jobs) >= self.batch_size or entry[2] is None:
+                    break  # full, or stop() was called and the rest must wait behind it
+                if entry[2].batch is first.batch:
+                    jobs.append(entry[2])
+                    taken.add(entry[1])
+            if taken:
+                heap[:] = [entry for entry in heap if entry[1] not in taken]
+                heapq.heapify(heap)
+                self._queue.not_full.notify(len(taken))
+        return jobs
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            jobs = self._take_batch(job) if job.batch else [job]
+            for j in jobs:
+                j.state = "running"
+                j.started_at = datetime.utcnow()
+            try:
+                if job.batch:
+                    results = job.batch(jobs)
+                else:
+                    results = [job.func(*job.args, **job.kwargs)]
+            except Exception as e:
+                results = [e] * len(jobs)
+            for j, res in zip(jobs, results):
+                if isinstance(res, Exception):
+                    logger.error("Job %s failed", j.job_id, exc_info=res)
+                    j.state = "failed"
+                    j.error = str(res)
+                else:
+                    j.state = "done"
+                j.finished_at = datetime.utcnow()
+            self._forget_finished()
+
+    def _forget_finished(self, keep: int = 1000):
+        """Bound memory by dropping the oldest finished jobs"""
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j.finished_at is not None]
+            if len(finished) <= keep:
+                return
+            finished.sort(key=lambda j: j.finished_at)
+            for j in finished[:len(finished) - keep]:
+                del self._jobs[j.job_id]
+
+# Process-wide queue used by the reports router
+report_queue = ReportJobQueue()
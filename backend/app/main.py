@@ -4,19 +4,33 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from .db import init_db
+from .jobs import report_queue
+from .executors import ingest_executors
+from .storage import public_store, BlobStaticFiles
 from .routers import reports, registry, review, stats, auth
 app = FastAPI(title="Billboard Sentinel - Complete", version="1.0.0")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], allow_credentials=True)
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], allow_credentials=True,
+                   expose_headers=["X-Next-Cursor", "Link"])  # pagination headers read by the dashboard
 static_dir = os.path.join(os.path.dirname(__file__), "..", "static")
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 # Serve uploaded images
-uploads_dir = os.path.join(os.path.dirname(__file__), "..", "data", "uploads")
-app.mount("/api/uploads", StaticFiles(directory=uploads_dir), name="uploads")
+app.mount("/api/uploads", BlobStaticFiles(directory=public_store.root), name="uploads")
 init_db()
 app.include_router(auth.router, prefix="/api/auth")
 app.include_router(reports.router, prefix="/api")
 app.include_router(registry.router, prefix="/api")
 app.include_router(review.router, prefix="/api")
 app.include_router(stats.router, prefix="/api")
+@app.on_event("startup")
+def warm_up():
+    # Load the detector (and its model) before the first upload rather than during it
+    ingest_executors.warmup()
+    # Pick up reports a previous run accepted but did not finish
+    if reports.RESUME_PENDING_REPORTS:
+        reports.resume_pending_reports()
+@app.on_event("shutdown")
+def stop_workers():
+    report_queue.stop()
+    ingest_executors.shutdown()
 @app.get("/health")
 def health(): return {"ok": True}
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, Float, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, Date, Text, Float, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
 class User(Base):
@@ -28,15 +29,27 @@ class Report(Base):
     captured_at = Column(DateTime, default=datetime.utcnow)
     lat = Column(Float); lon = Column(Float)
     img_uri = Column(Text); img_uri_redacted = Column(Text, nullable=True)
+    content_sha256 = Column(String(64), nullable=True, index=True)
     device_heading = Column(Float, nullable=True)
     model_version = Column(String, default="ondevice-0.1")
     status = Column(String, default="pending")
     archived = Column(String, default="false")  # "false", "true", "auto"
     archived_at = Column(DateTime, nullable=True)
+    raw_uri = Column(Text, nullable=True)
+    idempotency_key = Column(String, unique=True, index=True, nullable=True)
+    processing_status = Column(String, default="done")  # queued, redacting, detecting, evaluating, done, failed
+    processing_error = Column(Text, nullable=True)
+    zone_id = Column(String, nullable=True)  # geofence zone at ingestion; None when unzoned
+    phash = Column(String(16), nullable=True, index=True)  # 64-bit dHash, hex
+    duplicate_of = Column(String, ForeignKey("report.id"), nullable=True, index=True)
+    renditions = Column(Text, nullable=True)  # JSON {name: {width, height, webp, jpeg}} of public store paths
+    detections = relationship("Detection", back_populates="report")
+    # Matches the dashboard ordering so keyset pages are index range scans
+    __table_args__ = (Index("ix_report_archived_captured_at", "archived", "captured_at", "id"),)
 class Detection(Base):
     __tablename__ = "detection"
     id = Column(String, primary_key=True)
-    report_id = Column(String, ForeignKey("report.id"))
+    report_id = Column(String, ForeignKey("report.id"), index=True)
     bbox = Column(Text)
     corners = Column(Text)
     est_width_m = Column(Float)
@@ -45,10 +58,34 @@ class Detection(Base):
     ocr_text = Column(Text, nullable=True)
     license_id = Column(Text, nullable=True)
     confidence = Column(Float)
+    report = relationship("Report", back_populates="detections")
+    violations = relationship("Violation", back_populates="detection")
 class Violation(Base):
     __tablename__ = "violation"
     id = Column(String, primary_key=True)
-    detection_id = Column(String, ForeignKey("detection.id"))
+    detection_id = Column(String, ForeignKey("detection.id"), index=True)
     type = Column(String)
     reason = Column(Text)
     severity = Column(Integer, default=3)
+    detection = relationship("Detection", back_populates="violations")
+class HeatmapCell(Base):
+    """Report and violation counts per base-zoom tile cell and day"""
+    __tablename__ = "heatmap_cell"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    vtype = Column(String, nullable=False)  # "*" counts reports, otherwise a violation type
+    cell_x = Column(Integer, nullable=False)
+    cell_y = Column(Integer, nullable=False)
+    day = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    __table_args__ = (UniqueConstraint("vtype", "cell_x", "cell_y", "day", name="uq_heatmap_cell"),)
+class StatsRollup(Base):
+    """Report, detection and violation counts per day, type, severity and zone"""
+    __tablename__ = "stats_rollup"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    metric = Column(String, nullable=False)  # "report", "detection" or "violation"
+    vtype = Column(String, nullable=False, default="")  # violation type; "" for other metrics
+    severity = Column(Integer, nullable=False, default=0)
+    zone = Column(String, nullable=False, default="")  # geofence zone id; "" when unzoned
+    count = Column(Integer, nullable=False, default=0)
+    __table_args__ = (UniqueConstraint("metric", "day", "vtype", "severity", "zone", name="uq_stats_rollup"),)
@@ -0,0 +1,175 @@
+"""
+ONNX Runtime Billboard Detector
+CPU inference for an exported YOLOv8 model with letterboxing and micro-batching
+"""
+
+import os
+import time
+import queue
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Dict, Sequence, Tuple, Union
+import numpy as np
+from PIL import Image
+from .imaging import ImageContext
+from .executors import EXECUTOR_PROCESSES
+from .postprocess import postprocess, normalize_boxes
+
+try:
+    import onnxruntime as ort
+except ImportError:  # only needed when DETECTOR_BACKEND=onnx
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_MODEL_PATH = os.getenv("DETECTOR_MODEL_PATH", "./models/billboard-yolov8n.onnx")
+DETECTOR_INPUT_SIZE = int(os.getenv("DETECTOR_INPUT_SIZE", "640"))  # used when the model has dynamic spatial dims
+DETECTOR_CONF = float(os.getenv("DETECTOR_CONF", "0.25"))
+DETECTOR_IOU = float(os.getenv("DETECTOR_IOU", "0.45"))
+DETECTOR_MAX_BATCH = int(os.getenv("DETECTOR_MAX_BATCH", "8"))
+DETECTOR_BATCH_WAIT_MS = float(os.getenv("DETECTOR_BATCH_WAIT_MS", "5"))
+# Pixel work already runs one process per core, so each session defaults to its share of the cores
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, EXECUTOR_PROCESSES)))))
+ONNX_INTER_OP_THREADS = int(os.getenv("ONNX_INTER_OP_THREADS", "1"))
+BILLBOARD_CLASS = 0  # training/data.yaml: ['billboard', 'license_plate']
+LETTERBOX_FILL = 114
+
+def letterbox(img: Image.Image, size: int) -> Tuple[np.ndarray, float, Tuple[int, int]]:
+    """
+    Fit an RGB image into a size x size square without distortion
+
+    Returns:
+        (CHW float32 array in [0, 1], scale applied, (pad_x, pad_y) in pixels)
+    """
+    scale = min(size / img.width, size / img.height)
+    w, h = max(1, round(img.width * scale)), max(1, round(img.height * scale))
+    if (w, h) != img.size:
+        img = img.resize((w, h), Image.BILINEAR)
+    pad_x, pad_y = (size - w) // 2, (size - h) // 2
+    canvas = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    canvas[pad_y:pad_y + h, pad_x:pad_x + w] = np.asarray(img)
+    return canvas.transpose(2, 0, 1).astype(np.float32) / 255.0, scale, (pad_x, pad_y)
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into one batched call
+
+    A caller blocks in submit() while a background thread gathers up to max_batch
+    items, waiting at most max_wait_s after the first one, and runs them together.
+    """
+
+    def __init__(self, run_batch: Callable[[List], List], max_batch: int = DETECTOR_MAX_BATCH,
+                 max_wait_s: float = DETECTOR_BATCH_WAIT_MS / 1000.0):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max_wait_s
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="detector-batcher", daemon=True)
+                self._thread.start()
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = self.run_batch([item for item, _ in batch])
+                for (_, fut), res in zip(batch, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+
+class OnnxBillboardDetector:
+    """YOLOv8 detector served by ONNX Runtime on CPU; one session per process"""
+
+    def __init__(self, model_path: str = DETECTOR_MODEL_PATH, conf: float = DETECTOR_CONF, iou: float = DETECTOR_IOU,
+                 intra_op_threads: int = ONNX_INTRA_OP_THREADS, inter_op_threads: int = ONNX_INTER_OP_THREADS,
+                 max_batch: int = DETECTOR_MAX_BATCH):
+        if ort is None:
+            raise RuntimeError("DETECTOR_BACKEND=onnx requires the onnxruntime package")
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = intra_op_threads
+        opts.inter_op_num_threads = inter_op_threads
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.input_size = inp.shape[2] if isinstance(inp.shape[2], int) else DETECTOR_INPUT_SIZE
+        self.fixed_batch = inp.shape[0] if isinstance(inp.shape[0], int) else None
+        self.max_batch = self.fixed_batch or max(1, max_batch)
+        self.conf, self.iou = conf, iou
+        self.model_version = onnx_model_version(model_path)
+        self._batcher = MicroBatcher(self._detect, self.max_batch)
+
+    def _infer(self, tensors: List[np.ndarray]) -> List[np.ndarray]:
+        """Raw model output per input tensor, in chunks of max_batch"""
+        outputs = []
+        for start in range(0, len(tensors), self.max_batch):
+            chunk = tensors[start:start + self.max_batch]
+            if self.fixed_batch:
+                outputs.extend(self.session.run(None, {self.input_name: t[None]})[0][0] for t in chunk)
+            else:
+                outputs.extend(self.session.run(None, {self.input_name: np.stack(chunk)})[0])
+        return outputs
+
+    def _detect(self, tensors: List[np.ndarray]) -> List[np.ndarray]:
+        """Billboard detections per input tensor as (K, 6) arrays in letterboxed pixels"""
+        return postprocess(np.stack(self._infer(tensors)), self.conf, self.iou, classes=[BILLBOARD_CLASS])
+
+    def _boxes(self, ctx: ImageContext, dets: np.ndarray, scale: float, pad: Tuple[int, int]) -> List[Tuple[List[float], float]]:
+        """Detections as normalized [x1, y1, x2, y2] with their scores"""
+        boxes = normalize_boxes(dets, scale, pad, ctx.scaled(self.input_size).size)
+        return [(box, score) for box, score in zip(boxes.tolist(), dets[:, 4].tolist())]
+
+    def _prepare(self, ctx: ImageContext):
+        # The shared context supplies a copy already reduced to the input size
+        return letterbox(ctx.scaled(self.input_size), self.input_size)
+
+    def detect_boxes(self, image: Union[str, ImageContext]) -> List[Tuple[List[float], float]]:
+        """Boxes for one image; concurrent callers in this process share batched runs"""
+        ctx = ImageContext.of(image)
+        tensor, scale, pad = self._prepare(ctx)
+        return self._boxes(ctx, self._batcher.submit(tensor), scale, pad)
+
+    def detect_boxes_batch(self, images: Sequence[Union[str, ImageContext]]) -> List[List[Tuple[List[float], float]]]:
+        """Boxes for many images with batched inference"""
+        ctxs = [ImageContext.of(i) for i in images]
+        prepared = [self._prepare(ctx) for ctx in ctxs]
+        dets = self._detect([t for t, _, _ in prepared]) if prepared else []
+        return [self._boxes(ctx, d, scale, pad) for ctx, d, (_, scale, pad) in zip(ctxs, dets, prepared)]
+
+    def warmup(self):
+        """Run one dummy batch so the first request doesn't pay for allocation and graph setup"""
+        self._detect([np.zeros((3, self.input_size, self.input_size), dtype=np.float32)])
+
+_versions: Dict[str, str] = {}
+
+def onnx_model_version(model_path: str = DETECTOR_MODEL_PATH) -> str:
+    """Stable identifier for a model file: name plus a prefix of its SHA-256"""
+    if model_path not in _versions:
+        digest = hashlib.sha256()
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        _versions[model_path] = f"{os.path.splitext(os.path.basename(model_path))[0]}-{digest.hexdigest()[:12]}"
+    return _versions[model_path]
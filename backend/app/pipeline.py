@@ -0,0 +1,520 @@
+"""
+Report Processing Pipeline
+Runs redaction, detection and violation evaluation for a stored upload
+"""
+
+import os
+import math
+import uuid
+import json
+import logging
+from contextlib import ExitStack
+from dataclasses import dataclass
+from functools import partial
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List, Dict, Optional, Callable, Iterable, Sequence, Set, Tuple, Union
+from . import models
+from .db import SessionLocal
+from .util import nearest_junction, distance_m
+from .spatial import load_point_index, DATA_DIR
+from .redaction import redact_regions
+from .imaging import ImageContext, track_stage
+from .storage import BlobStore, public_store, content_digest
+from .renditions import make_renditions
+from .detection import analyze_billboard_images, detector_model_version
+from .detection_cache import detection_cache
+from .dedup import duplicate_index, dhash, hamming, DEDUP_ENABLED, DHASH_SOURCE_EDGE
+from .aggregates import record_report_heatmap, record_report_stats, zone_for_point, tile_cache
+
+logger = logging.getLogger(__name__)
+
+JUNCTIONS = load_point_index(os.path.join(DATA_DIR, "junctions.geojson"))
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", str(os.cpu_count() or 2)))
+# Uploads rendered together in one worker call; bounds the decoded images held at once
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "8"))
+
+# Report.processing_status values, in pipeline order
+STATUS_QUEUED = "queued"
+STATUS_REDACTING = "redacting"
+STATUS_DETECTING = "detecting"
+STATUS_EVALUATING = "evaluating"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+# Stored but not finished; a restart leaves these rows to be re-queued
+PENDING_STATUSES = (STATUS_QUEUED, STATUS_REDACTING, STATUS_DETECTING, STATUS_EVALUATING)
+
+class RedactionError(Exception):
+    """Raised when the uploaded image cannot be redacted"""
+
+@dataclass
+class RedactedImage:
+    """Stored redacted copy of an upload and its dashboard renditions"""
+    path: str
+    renditions: Dict[str, Dict]
+
+@dataclass
+class RenderedUpload:
+    """What redaction and detection produce for one upload"""
+    redacted: RedactedImage
+    detections: List[Dict]
+
+@dataclass
+class PreparedUpload:
+    """Pixel-stage result for one upload; a duplicate carries its original's image and no detections"""
+    redacted: RedactedImage
+    detections: List[Dict]
+    phash: Optional[int]  # None when dedup is disabled
+    duplicate_of: Optional[str] = None
+
+def _outcome(fn: Callable, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return e
+
+def redact_stage(ctx: ImageContext, store: Optional[BlobStore] = None) -> RedactedImage:
+    """Write the redacted copy of the upload and its renditions to the public store"""
+    store = store or public_store
+    redacted = store.temp_path(".jpg")
+    try:
+        with track_stage(ctx, "redact"):
+            clean = redact_regions(ctx)  # faces and plates only; billboard text stays legible
+            clean.save(redacted, format="JPEG")
+            # Renditions are encoded from the decoded, redacted pixels already in memory
+            renditions = make_renditions(clean, store)
+    except Exception as e:
+        if os.path.exists(redacted):
+            os.remove(redacted)
+        raise RedactionError(str(e)) from e
+    return RedactedImage(path=store.adopt(redacted, ext=".jpg").path, renditions=renditions)
+
+def detect_stage(ctxs: Sequence[ImageContext],
+                 detections: Sequence[Optional[List[Dict]]]) -> List[Union[List[Dict], Exception]]:
+    """
+    Use client-supplied or cached detections where given, otherwise run the CV pipeline
+
+    Uploads that need inference share one batched call; if it fails, each of
+    them gets the exception.
+    """
+    out: List[Union[List[Dict], Exception]] = list(detections)
+    pending = [i for i, d in enumerate(out) if d is None]
+    if pending:
+        with ExitStack() as stack:
+            for i in pending:
+                stack.enter_context(track_stage(ctxs[i], "detect"))
+            found = _outcome(analyze_billboard_images, [ctxs[i] for i in pending])
+        for n, i in enumerate(pending):
+            out[i] = found if isinstance(found, Exception) else found[n]
+    return out
+
+def cached_detections(raw_path: str, detections: Optional[List[Dict]] = None,
+                      digest: Optional[str] = None) -> Tuple[Optional[Tuple[str, str]], Optional[List[Dict]]]:
+    """
+    Detection cache key and the detections to hand to detect_stage
+
+    Client-supplied detections, including an empty list, are used as they are and
+    never cached. Otherwise the key is (content sha256, model version) and the
+    detections are the cached result, or None when inference has to run.
+    """
+    if detections is not None or not detection_cache.enabled:
+        return None, detections
+    key = (digest or content_digest(raw_path), detector_model_version())
+    return key, detection_cache.get(*key)
+
+def remember_detections(key: Optional[Tuple[str, str]], hit: Optional[List[Dict]], detections: List[Dict]):
+    """Cache freshly computed detections; no-op for client-supplied or cached ones"""
+    if key is not None and hit is None:
+        detection_cache.put(*key, detections)
+
+def perceptual_hash(ctx: ImageContext) -> Optional[int]:
+    """dHash of the upload, or None when dedup is disabled or the image is unreadable"""
+    if not DEDUP_ENABLED:
+        return None
+    try:
+        with track_stage(ctx, "hash"):
+            return dhash(ctx.scaled(DHASH_SOURCE_EDGE))
+    except Exception:
+        return None  # redaction reports the unreadable image
+
+def find_duplicate(db, phash: Optional[int], lat: float, lon: float) -> Optional[str]:
+    """Id of an existing report showing the same billboard nearby, if any"""
+    if phash is None:
+        return None
+    return duplicate_index.find(db, phash, lat, lon)
+
+def find_duplicates(db, uploads: Sequence[Tuple[str, Optional[int], float, float]]) -> List[Optional[str]]:
+    """
+    Per (report_id, phash, lat, lon), the report it duplicates, if any
+
+    Matches stored originals through the index and, failing that, an earlier
+    original in the same sequence.
+    """
+    originals, out = [], []
+    for report_id, phash, lat, lon in uploads:
+        original_id = find_duplicate(db, phash, lat, lon)
+        if original_id is None and phash is not None:
+            original_id = next((rid for rid, h, olat, olon in originals if hamming(h, phash) <= duplicate_index.max_hamming
+                                and distance_m(olat, olon, lat, lon) <= duplicate_index.radius_m), None)
+            if original_id is None:
+                originals.append((report_id, phash, lat, lon))
+        out.append(original_id)
+    return out
+
+def stored_images(db, report_ids: Iterable[str]) -> Dict[str, RedactedImage]:
+    """Redacted images of processed reports, which duplicates of them reuse"""
+    ids = set(report_ids)
+    if not ids:
+        return {}
+    rows = db.query(models.Report.id, models.Report.img_uri, models.Report.renditions).filter(
+        models.Report.id.in_(ids), models.Report.img_uri.isnot(None))
+    return {rid: RedactedImage(path=img_uri, renditions=json.loads(renditions) if renditions else {})
+            for rid, img_uri, renditions in rows}
+
+def hash_batch(sources: Sequence[Union[str, ImageContext]]) -> List[Optional[int]]:
+    """
+    Perceptual hash per upload, from a reduced decode (JPEG DCT scaling)
+
+    Safe to run in a worker process. Contexts passed in stay open so the
+    pixel stages can reuse them; ones opened here are closed.
+    """
+    ctxs = [ImageContext.of(src) for src in sources]
+    try:
+        return [perceptual_hash(ctx) for ctx in ctxs]
+    finally:
+        for src, ctx in zip(sources, ctxs):
+            if ctx is not src:
+                ctx.close()
+
+def render_and_detect_batch(items: Sequence[Tuple[Union[str, ImageContext], Optional[List[Dict]]]],
+                            on_detect: Optional[Callable[[], None]] = None) -> List[Union[RenderedUpload, Exception]]:
+    """
+    Redaction and detection for several uploads, one working-resolution decode each
+
+    Uploads without supplied or cached detections go through a single batched
+    analyze_billboard_images call. Safe to run in a worker process (on_detect,
+    called between redaction and detection, is for in-process callers only).
+    Redaction decodes the working resolution and detection reuses those pixels.
+
+    Returns:
+        RenderedUpload per item, or the exception that item raised
+    """
+    ctxs = [ImageContext.of(source) for source, _ in items]
+    try:
+        redacted = [_outcome(redact_stage, ctx) for ctx in ctxs]
+        if on_detect:
+            on_detect()
+        ok = [i for i, r in enumerate(redacted) if not isinstance(r, Exception)]
+        dets: List[Union[List[Dict], Exception]] = list(redacted)
+        for i, found in zip(ok, detect_stage([ctxs[i] for i in ok], [items[i][1] for i in ok])):
+            dets[i] = found
+        return [d if isinstance(d, Exception) else RenderedUpload(redacted=r, detections=d)
+                for r, d in zip(redacted, dets)]
+    finally:
+        for ctx in ctxs:
+            logger.info("memory by stage for %s: %s", os.path.basename(ctx.path), ctx.memory)
+            ctx.close()
+
+def render_and_detect(raw_path: str, detections: Optional[List[Dict]] = None,
+                      on_detect: Optional[Callable[[], None]] = None) -> RenderedUpload:
+    """Single-upload form of render_and_detect_batch; raises the upload's error"""
+    result, = render_and_detect_batch([(raw_path, detections)], on_detect)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def _map_chunks(fn: Callable[[List], List], items: List, size: int, executor: Optional[Executor]) -> List:
+    """fn over items in chunks of size, on the executor or a private thread pool; a failed chunk fails each item"""
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    if executor is not None:
+        futures = [executor.submit(fn, chunk) for chunk in chunks]
+        done = [_outcome(f.result) for f in futures]
+    elif len(chunks) <= 1:
+        done = [_outcome(fn, chunk) for chunk in chunks]
+    else:
+        # PIL releases the GIL while decoding, filtering and encoding
+        with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+            done = list(pool.map(partial(_outcome, fn), chunks))
+    return [res for chunk, out in zip(chunks, done) for res in ([out] * len(chunk) if isinstance(out, Exception) else out)]
+
+def _chunk_size(n: int, workers: int) -> int:
+    return max(1, min(PIPELINE_BATCH_SIZE, math.ceil(n / max(1, workers))))
+
+def hash_uploads(sources: Sequence[Union[str, ImageContext]], executor: Optional[Executor] = None,
+                 workers: int = BATCH_WORKERS) -> List[Optional[int]]:
+    """hash_batch over many uploads in parallel chunks, like prepare_reports; None where hashing failed"""
+    sources = list(sources)
+    hashes = _map_chunks(hash_batch, sources, _chunk_size(len(sources), workers), executor)
+    return [None if isinstance(h, Exception) else h for h in hashes]
+
+def prepare_reports(items: Iterable[Tuple[str, Optional[List[Dict]]]], executor: Optional[Executor] = None,
+                    workers: int = BATCH_WORKERS) -> List[Union[RenderedUpload, Exception]]:
+    """
+    Redact and detect many uploads in parallel without touching the database
+
+    Uploads are split into up to `workers` chunks of at most PIPELINE_BATCH_SIZE,
+    each rendered with one batched inference call. Uploads with cached detections
+    for the current model skip inference.
+
+    Args:
+        items: (raw_path, detections or None) per upload
+        executor: Pool to run the chunks on (e.g. a process pool); a private
+            thread pool of `workers` threads is used when None
+
+    Returns:
+        RenderedUpload per item, or the exception that item raised
+    """
+    items = list(items)
+    lookups = [cached_detections(raw_path, dets) for raw_path, dets in items]
+    items = [(raw_path, hit) for (raw_path, _), (_, hit) in zip(items, lookups)]
+    results = _map_chunks(render_and_detect_batch, items, _chunk_size(len(items), workers), executor)
+    for (key, hit), res in zip(lookups, results):
+        if not isinstance(res, Exception):
+            remember_detections(key, hit, res.detections)
+    return results
+
+def prepare_uploads(db, uploads: Sequence[Tuple[str, Union[str, ImageContext], float, float]],
+                    render: Callable[[List[int]], List[Union[RenderedUpload, Exception]]],
+                    executor: Optional[Executor] = None) -> List[Union[PreparedUpload, Exception]]:
+    """
+    Hash every upload, then redact and detect only those that are not duplicates
+
+    The perceptual hash needs just a reduced decode, so a near-duplicate photo never
+    reaches redaction or inference: it reuses the original report's redacted image and
+    renditions and gets no detections. The database is only read.
+
+    Args:
+        uploads: (report_id, raw path or shared ImageContext, lat, lon) per upload
+        render: Renders the uploads at the given indices, returning
+            RenderedUpload or the exception per index
+        executor: Pool to hash on; a private thread pool is used when None
+
+    Returns:
+        PreparedUpload per upload, or the exception its rendering raised
+    """
+    sources = [source for _, source, _, _ in uploads]
+    phashes = hash_uploads(sources, executor)
+    duplicate_of = find_duplicates(db, [(rid, h, lat, lon) for (rid, _, lat, lon), h in zip(uploads, phashes)])
+    images = stored_images(db, (rid for rid in duplicate_of if rid))
+    in_call = {rid for rid, _, _, _ in uploads}
+    for i, rid in enumerate(duplicate_of):
+        if rid and rid not in in_call and rid not in images:
+            duplicate_of[i] = None  # indexed original without a stored image (e.g. deleted)
+    out: List[Union[PreparedUpload, Exception, None]] = [None] * len(uploads)
+    pending = [i for i, rid in enumerate(duplicate_of) if rid is None]
+    while pending:
+        for i, res in zip(pending, render(pending)):
+            if isinstance(res, Exception):
+                out[i] = res
+            else:
+                out[i] = PreparedUpload(res.redacted, res.detections, phashes[i])
+                images[uploads[i][0]] = res.redacted
+        # A duplicate of an upload in this call that failed to render is rendered itself
+        pending = [i for i, rid in enumerate(duplicate_of) if rid and out[i] is None and rid not in images]
+        for i in pending:
+            duplicate_of[i] = None
+    for i, rid in enumerate(duplicate_of):
+        if rid:
+            out[i] = PreparedUpload(images[rid], [], phashes[i], rid)
+    return out
+
+def registry_licenses(db, license_ids: Iterable[Optional[str]]) -> Set[str]:
+    """Return which of license_ids exist in the registry, with a single query"""
+    wanted = {l.strip() for l in license_ids if l and l.strip()}
+    if not wanted:
+        return set()
+    rows = db.query(models.RegistryBillboard.license_id).filter(models.RegistryBillboard.license_id.in_(wanted)).all()
+    return {r[0] for r in rows}
+
+def evaluate_detections(db, report_id: str, lat: float, lon: float, dets: List[Dict],
+                        known_licenses: Optional[Set[str]] = None) -> List[Dict]:
+    """
+    Add Detection and Violation rows for a report to the session and return the API payload
+
+    known_licenses, when given, is a prefetched registry_licenses() result used instead
+    of querying the registry once per detection.
+    """
+    out = []
+    # one lookup per report: every detection shares the report's location
+    j, distm = nearest_junction(lat, lon, JUNCTIONS)
+    for d in dets:
+        did = str(uuid.uuid4())
+        det = models.Detection(id=did, report_id=report_id, bbox=json.dumps(d.get('bbox')), corners=json.dumps(d.get('corners')),
+            est_width_m=float(d.get('est_width_m', 0.0)), est_height_m=float(d.get('est_height_m', 0.0)),
+            qr_text=d.get('qr_text'), ocr_text=d.get('ocr_text'), license_id=d.get('license_id'), confidence=float(d.get('confidence', 0.5)))
+        db.add(det)
+        # simple checks
+        violations = []
+        # size
+        if det.est_width_m * det.est_height_m > float(os.getenv('CITY_MAX_W', '12')) * float(os.getenv('CITY_MAX_H', '4')):
+            violations.append(('size', f"Estimated {det.est_width_m}x{det.est_height_m} m exceeds cap", 4))
+        # junction proximity
+        if distm < float(os.getenv('CITY_MIN_DIST', '50')):
+            violations.append(('placement', f"Near {j['properties']['name']} (~{int(distm)} m)", 3))
+        # license
+        if not det.license_id or det.license_id.strip() == '':
+            violations.append(('license_missing', 'No license', 5))
+        else:
+            # try registry
+            if known_licenses is not None:
+                reg = det.license_id.strip() in known_licenses
+            else:
+                reg = db.query(models.RegistryBillboard).filter(models.RegistryBillboard.license_id == det.license_id.strip()).first()
+            if not reg:
+                violations.append(('license_invalid', f"License {det.license_id} not found", 5))
+        vio_objs = []
+        for typ, reason, sev in violations:
+            vid = str(uuid.uuid4())
+            db.add(models.Violation(id=vid, detection_id=did, type=typ, reason=reason, severity=sev))
+            vio_objs.append({'type': typ, 'reason': reason, 'severity': sev})
+        out.append({'id': did, 'violations': vio_objs, 'confidence': det.confidence})
+    return out
+
+def record_aggregates(db, report: models.Report, out: List[Dict]):
+    """Update counter tables for a freshly evaluated report, in the caller's transaction"""
+    report.zone_id = zone_for_point(report.lat, report.lon)
+    record_report_heatmap(db, report.lat, report.lon, report.captured_at,
+                          [v['type'] for d in out for v in d['violations']])
+    record_report_stats(db, report.captured_at, report.zone_id, out)
+
+def aggregates_committed(report: models.Report):
+    """Invalidate caches derived from the counter tables once the transaction is committed"""
+    tile_cache.invalidate_point(report.lat, report.lon)
+
+class _ReportRun:
+    """Database side of processing one report: stage updates, evaluation and failure marking"""
+
+    def __init__(self, report_id: str, raw_path: str, detections: Optional[List[Dict]],
+                 on_stage: Optional[Callable[[str, str], None]]):
+        self.report_id, self.raw_path, self.on_stage = report_id, raw_path, on_stage
+        self.db = SessionLocal()
+        self.rep = self.db.query(models.Report).filter(models.Report.id == report_id).first()
+        if self.rep is None:
+            self.db.close()
+            raise LookupError(f"Report {report_id} not found")
+        try:
+            # A resubmitted image reuses the detections stored for its content and model
+            self.key, self.supplied = cached_detections(raw_path, detections, self.rep.content_sha256)
+            self.set_stage(STATUS_REDACTING)
+        except Exception as e:
+            raise self.fail(e)
+
+    def set_stage(self, stage: str):
+        self.rep.processing_status = stage
+        self.db.commit()
+        if self.on_stage:
+            self.on_stage(self.report_id, stage)
+
+    def finish(self, prepared: PreparedUpload) -> Dict:
+        db, rep = self.db, self.rep
+        original_id = prepared.duplicate_of
+        try:
+            if not original_id:
+                remember_detections(self.key, self.supplied, prepared.detections)
+            rep.img_uri = prepared.redacted.path
+            rep.renditions = json.dumps(prepared.redacted.renditions)
+            rep.phash = f"{prepared.phash:016x}" if prepared.phash is not None else None
+            rep.duplicate_of = original_id
+            self.set_stage(STATUS_EVALUATING)
+            # Same billboard photographed again: no rule checks for the copy
+            out = [] if original_id else evaluate_detections(db, self.report_id, rep.lat, rep.lon, prepared.detections)
+            record_aggregates(db, rep, out)
+            rep.processing_status = STATUS_DONE
+            rep.processing_error = None
+            db.commit()
+            aggregates_committed(rep)
+            if prepared.phash is not None and not original_id:
+                duplicate_index.add(self.report_id, prepared.phash, rep.lat, rep.lon)
+            if self.on_stage:
+                self.on_stage(self.report_id, STATUS_DONE)
+            return {'id': self.report_id, 'detections': out, 'duplicate_of': original_id}
+        except Exception as e:
+            raise self.fail(e)
+        finally:
+            db.close()
+
+    def fail(self, error: Exception) -> Exception:
+        """Mark the report failed and close the session; returns error for the caller to raise"""
+        try:
+            self.db.rollback()
+            self.rep.processing_status = STATUS_FAILED
+            self.rep.processing_error = str(error)
+            self.db.commit()
+            if self.on_stage:
+                self.on_stage(self.report_id, STATUS_FAILED)
+        finally:
+            self.db.close()
+        return error
+
+def process_reports(reports: Sequence[Tuple[str, str, Optional[List[Dict]]]],
+                    on_stage: Optional[Callable[[str, str], None]] = None,
+                    executor: Optional[Executor] = None) -> List[Union[Dict, Exception]]:
+    """
+    Run every CPU stage for several reports whose rows already exist
+
+    The current stage is written to Report.processing_status so it can be polled
+    from any worker process, and passed to on_stage(report_id, stage). Uploads are
+    hashed first (see prepare_uploads); a near-duplicate is linked to its original,
+    reuses its image and gets no detections or violations. The rest are rendered by
+    one render_and_detect_batch call, on the executor when given (the status then
+    goes from redacting to evaluating), so inference runs as one batch. In this
+    process the hash and the pixel stages share each upload's ImageContext.
+
+    Args:
+        reports: (report_id, raw_path, detections or None) per report
+
+    Returns:
+        Per report, {'id': report_id, 'detections': [...]} as returned by
+        POST /api/reports, or the exception it failed with (the row is marked failed)
+    """
+    results: List[Union[Dict, Exception]] = [None] * len(reports)
+    runs = []
+    for i, (report_id, raw_path, detections) in enumerate(reports):
+        try:
+            runs.append((i, _ReportRun(report_id, raw_path, detections, on_stage)))
+        except Exception as e:
+            results[i] = e
+    if not runs:
+        return results
+    sources = [run.raw_path if executor is not None else ImageContext(run.raw_path) for _, run in runs]
+
+    def render(indices: List[int]) -> List[Union[RenderedUpload, Exception]]:
+        items = [(sources[n], runs[n][1].supplied) for n in indices]
+        if executor is not None:
+            rendered = _outcome(executor.submit(render_and_detect_batch, items).result)
+        else:
+            rendered = _outcome(render_and_detect_batch, items,
+                                lambda: [runs[n][1].set_stage(STATUS_DETECTING) for n in indices])
+        return [rendered] * len(indices) if isinstance(rendered, Exception) else rendered
+
+    db = SessionLocal()
+    try:
+        uploads = [(run.report_id, source, run.rep.lat, run.rep.lon) for (_, run), source in zip(runs, sources)]
+        prepared = _outcome(prepare_uploads, db, uploads, render, executor)
+    finally:
+        db.close()
+        for source in sources:
+            if isinstance(source, ImageContext):
+                source.close()
+    if isinstance(prepared, Exception):
+        prepared = [prepared] * len(runs)
+    for (i, run), res in zip(runs, prepared):
+        results[i] = run.fail(res) if isinstance(res, Exception) else _outcome(run.finish, res)
+    return results
+
+def process_report(report_id: str, raw_path: str, detections: Optional[List[Dict]] = None,
+                   on_stage: Optional[Callable[[str], None]] = None, executor: Optional[Executor] = None) -> Dict:
+    """
+    Run every CPU stage for a report whose row already exists
+
+    Single-report form of process_reports: on_stage receives just the stage, and
+    failures mark the report as failed and re-raise.
+
+    Returns:
+        {'id': report_id, 'detections': [...]} as returned by POST /api/reports
+    """
+    result, = process_reports([(report_id, raw_path, detections)],
+                              on_stage=(lambda _, stage: on_stage(stage)) if on_stage else None, executor=executor)
+    if isinstance(result, Exception):
+        raise result
+    return result
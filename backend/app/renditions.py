@@ -0,0 +1,49 @@
+"""
+Image Renditions
+Fixed-size WebP and JPEG derivatives of the redacted image for the dashboard
+"""
+
+import os
+from typing import Dict, Optional
+from PIL import Image
+from .storage import BlobStore, public_store
+
+# name -> longest edge in pixels; images are never upscaled
+RENDITION_SIZES = {
+    "thumb": int(os.getenv("RENDITION_THUMB_PX", "320")),
+    "medium": int(os.getenv("RENDITION_MEDIUM_PX", "960")),
+    "full": int(os.getenv("RENDITION_FULL_PX", "2048")),
+}
+RENDITION_FORMATS = {"webp": ("WEBP", ".webp"), "jpeg": ("JPEG", ".jpg")}
+RENDITION_QUALITY = int(os.getenv("RENDITION_QUALITY", "80"))
+
+def make_renditions(img: Image.Image, store: BlobStore = public_store) -> Dict[str, Dict]:
+    """
+    Encode every rendition of an already decoded RGB image into the store
+
+    Sizes are produced largest first and each one is downscaled from the previous,
+    which is cheaper than resampling the original every time.
+
+    Returns:
+        {name: {'width', 'height', 'webp': path, 'jpeg': path}}
+    """
+    out = {}
+    current = img
+    for name, edge in sorted(RENDITION_SIZES.items(), key=lambda kv: -kv[1]):
+        scale = min(1.0, edge / max(current.width, current.height))
+        if scale < 1.0:
+            current = current.resize((max(1, round(current.width * scale)), max(1, round(current.height * scale))), Image.LANCZOS)
+        entry = {'width': current.width, 'height': current.height}
+        for key, (fmt, ext) in RENDITION_FORMATS.items():
+            tmp = store.temp_path(ext)
+            current.save(tmp, format=fmt, quality=RENDITION_QUALITY, optimize=True)
+            entry[key] = store.adopt(tmp, ext=ext).path
+        out[name] = entry
+    return out
+
+def rendition_urls(renditions: Optional[Dict], prefix: str, store: BlobStore = public_store) -> Optional[Dict]:
+    """Replace stored paths with public URLs"""
+    if not renditions:
+        return None
+    return {name: {k: store.url_for(v, prefix) if k in RENDITION_FORMATS else v for k, v in entry.items()}
+            for name, entry in renditions.items()}
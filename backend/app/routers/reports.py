@@ -1,145 +1,422 @@
 
-import os, uuid, json
-from datetime import datetime
-from fastapi import APIRouter, UploadFile, File, Form
+import os, uuid, json, base64, logging
+from datetime import datetime, date
+from functools import partial
+from typing import Optional, List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
 from ..db import SessionLocal
 from .. import models, schemas
-from ..util import redact_image, nearest_junction
-from ..detection import analyze_billboard_image
-from ..rules import BillboardRulesEngine, Detection as RuleDetection
-from ..geofence import validate_billboard_location
+from ..auth import get_optional_user, get_admin_user
+from ..aggregates import heatmap_tile as aggregated_tile, rebuild_heatmap, HEATMAP_BASE_ZOOM, HEATMAP_TILE_TTL
+from ..storage import raw_store, public_store
+from ..renditions import rendition_urls
+from ..detection import detector_model_version
+from ..pipeline import (
+    process_report, process_reports, prepare_reports, prepare_uploads, evaluate_detections, registry_licenses,
+    record_aggregates, aggregates_committed,
+    RedactionError, STATUS_QUEUED, STATUS_DONE, STATUS_FAILED, PENDING_STATUSES
+)
+from ..streaming import iter_query, stream_rows, FORMAT_JSON, STREAM_FORMATS
+from ..dedup import duplicate_index
+from ..executors import ingest_executors
+from ..jobs import report_queue, priority_for_role, QueueFullError
 router = APIRouter(tags=['reports'])
-UPLOAD_DIR = os.getenv("STORAGE_DIR", "./data/uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-with open(os.path.join(os.path.dirname(__file__), "..", "..", "data", "junctions.geojson")) as f:
-    JUNCTIONS = json.load(f)
+logger = logging.getLogger(__name__)
+DEFAULT_PAGE_SIZE = 100
+INGEST_MODE = os.getenv("REPORT_INGEST_MODE", "sync")  # "sync" or "async"
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "100"))
+BATCH_COMMIT_SIZE = int(os.getenv("BATCH_COMMIT_SIZE", "50"))
+# With several server processes sharing a database, enable this in exactly one of them
+RESUME_PENDING_REPORTS = os.getenv("RESUME_PENDING_REPORTS", "true").lower() == "true"
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-@router.post("/reports", response_model=schemas.ReportOut)
-async def create_report(lat: float = Form(...), lon: float = Form(...), device_heading: float | None = Form(None), detections_json: str = Form(None), image: UploadFile = File(...)):
+@router.post("/reports", response_model=schemas.ReportOut, responses={202: {"model": schemas.JobAccepted}})
+async def create_report(request: Request, lat: float = Form(...), lon: float = Form(...), device_heading: float | None = Form(None), detections_json: str = Form(None), image: UploadFile = File(...),
+                        current_user: Optional[models.User] = Depends(get_optional_user)):
     # Validate image file type
     if not image.content_type or not image.content_type.startswith('image/'):
         raise HTTPException(status_code=400, detail="File must be an image")
+    try:
+        dets = json.loads(detections_json) if detections_json else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="detections_json is not valid JSON")
     
-    rid = str(uuid.uuid4())
-    raw_path = os.path.join(UPLOAD_DIR, f"{rid}_raw_{image.filename}")
-    
+    # 503/429 with Retry-After when ingestion is saturated; blocking work never runs on the event loop
+    with ingest_executors.admit(_client_key(request, current_user)):
+        rid = str(uuid.uuid4())
+        # Copied in bounded chunks on the I/O pool; rejects oversized bodies and pixel counts while streaming
+        upload = await ingest_executors.run_io(raw_store.store_upload, image.file)
+        raw_path = upload.path
+        await ingest_executors.run_io(_insert_report, rid, current_user, lat, lon, device_heading, raw_path, upload.sha256)
+        
+        if INGEST_MODE == "async":
+            # Respond immediately; redaction, detection and rule checks run on the local worker pool
+            try:
+                report_queue.submit(rid, process_report, rid, raw_path, dets,
+                                    on_stage=partial(report_queue.update, rid), executor=ingest_executors.pixels,
+                                    priority=priority_for_role(current_user.role if current_user else None),
+                                    batch=_process_queued)
+            except QueueFullError as e:
+                await ingest_executors.run_io(_discard_report, rid, raw_path)
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+            return JSONResponse(status_code=202, content={'id': rid, 'job_id': rid, 'status': STATUS_QUEUED,
+                                                          'status_url': f"/api/reports/{rid}/status"})
+        
+        try:
+            return await ingest_executors.run_io(process_report, rid, raw_path, dets, executor=ingest_executors.pixels)
+        except RedactionError as e:
+            # Clean up failed upload
+            await ingest_executors.run_io(_discard_report, rid, raw_path)
+            raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+
+def _process_queued(jobs):
+    """Report queue batch runner: queued reports share one render and inference call"""
+    return process_reports([job.args for job in jobs], on_stage=report_queue.update, executor=ingest_executors.pixels)
+
+def resume_pending_reports() -> int:
+    """
+    Queue reports a previous run stored but never finished; returns how many were queued
+
+    The job queue lives in memory, so a restart would otherwise leave such rows
+    queued (or mid-stage) forever. Client-supplied detections are not stored and
+    are re-derived by inference or the detection cache.
+    """
+    db = SessionLocal()
     try:
-        with open(raw_path, "wb") as f:
-            f.write(await image.read())
-        redacted = os.path.join(UPLOAD_DIR, f"{rid}_redacted.jpg")
-        redact_image(raw_path, redacted, mode="blur")  # Use blur instead of mosaic for better image quality
-    except Exception as e:
-        # Clean up failed upload
-        if os.path.exists(raw_path):
-            os.remove(raw_path)
-        raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+        rows = (db.query(models.Report.id, models.Report.raw_uri, models.User.role)
+                .outerjoin(models.User, models.User.id == models.Report.user_id)
+                .filter(models.Report.processing_status.in_(PENDING_STATUSES))
+                .order_by(models.Report.captured_at).all())
+        queued = 0
+        for rid, raw_path, role in rows:
+            if not raw_path or not os.path.exists(raw_path):
+                db.query(models.Report).filter(models.Report.id == rid).update(
+                    {'processing_status': STATUS_FAILED, 'processing_error': "Upload missing after restart"})
+                continue
+            try:
+                report_queue.submit(rid, process_report, rid, raw_path, None,
+                                    on_stage=partial(report_queue.update, rid), executor=ingest_executors.pixels,
+                                    priority=priority_for_role(role), batch=_process_queued)
+            except QueueFullError:
+                logger.warning("Report queue full; %d pending reports wait for the next restart", len(rows) - queued)
+                break
+            queued += 1
+        db.commit()
+        return queued
+    finally:
+        db.close()
+
+def _client_key(request: Request, current_user: Optional[models.User]) -> str:
+    """Identity used for per-client admission limits"""
+    if current_user:
+        return f"user:{current_user.id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def _insert_report(rid, current_user, lat, lon, device_heading, raw_path, sha256):
     db = SessionLocal()
-    rep = models.Report(id=rid, captured_at=datetime.utcnow(), lat=lat, lon=lon, img_uri=redacted, device_heading=device_heading or 0.0, model_version="billboard-yolo-v1.2")
-    db.add(rep)
-    db.commit()
-    
-    # Use AI detection pipeline if no detections provided
-    if detections_json:
-        dets = json.loads(detections_json)
-    else:
-        # Run computer vision analysis on uploaded image
-        dets = analyze_billboard_image(raw_path)
-    
-    out = []
-    for d in dets:
-        did = str(uuid.uuid4())
-        det = models.Detection(id=did, report_id=rid, bbox=json.dumps(d.get('bbox')), corners=json.dumps(d.get('corners')),
-            est_width_m=float(d.get('est_width_m',0.0)), est_height_m=float(d.get('est_height_m',0.0)),
-            qr_text=d.get('qr_text'), ocr_text=d.get('ocr_text'), license_id=d.get('license_id'), confidence=float(d.get('confidence',0.5)))
-        db.add(det)
-        # simple checks
-        violations = []
-        # size
-        if det.est_width_m * det.est_height_m > float(os.getenv('CITY_MAX_W','12')) * float(os.getenv('CITY_MAX_H','4')):
-            violations.append(('size', f"Estimated {det.est_width_m}x{det.est_height_m} m exceeds cap", 4))
-        # junction proximity
-        j, distm = nearest_junction(lat, lon, JUNCTIONS)
-        if distm < float(os.getenv('CITY_MIN_DIST','50')):
-            violations.append(('placement', f"Near {j['properties']['name']} (~{int(distm)} m)", 3))
-        # license
-        if not det.license_id or det.license_id.strip() == '':
-            violations.append(('license_missing','No license',5))
-        else:
-            # try registry
-            reg = db.query(models.RegistryBillboard).filter(models.RegistryBillboard.license_id==det.license_id.strip()).first()
-            if not reg:
-                violations.append(('license_invalid', f"License {det.license_id} not found",5))
-        vio_objs = []
-        for typ, reason, sev in violations:
-            vid = str(uuid.uuid4())
-            db.add(models.Violation(id=vid, detection_id=did, type=typ, reason=reason, severity=sev))
-            vio_objs.append({'type': typ, 'reason': reason, 'severity': sev})
-        out.append({'id': did, 'violations': vio_objs, 'confidence': det.confidence})
-    db.commit()
-    return {'id': rid, 'detections': out}
-@router.get("/reports/{report_id}")
-def get_report(report_id: str):
+    try:
+        db.add(models.Report(id=rid, user_id=current_user.id if current_user else None, captured_at=datetime.utcnow(), lat=lat, lon=lon,
+            raw_uri=raw_path, device_heading=device_heading or 0.0, model_version=detector_model_version(), content_sha256=sha256,
+            processing_status=STATUS_QUEUED))
+        db.commit()
+    finally:
+        db.close()
+
+@router.post("/reports/batch", response_model=schemas.BatchOut)
+async def create_reports_batch(request: Request, items: str = Form(...), images: List[UploadFile] = File(...),
+                               current_user: Optional[models.User] = Depends(get_optional_user)):
+    """
+    Ingest many reports in one request (offline mobile queues)
+
+    `items` is a JSON array with one entry per image carrying idempotency_key, lat,
+    lon and optionally device_heading, detections and the image filename it refers
+    to (matched by position otherwise). Items whose idempotency_key was already
+    ingested are reported as duplicates and not processed again.
+    """
+    try:
+        batch = TypeAdapter(List[schemas.BatchItemIn]).validate_json(items)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    if len(batch) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_ITEMS} items")
+    by_name = {img.filename: img for img in images}
+    if len(batch) != len(images) and not all(item.image in by_name for item in batch):
+        raise HTTPException(status_code=400, detail="Each item needs a matching image")
+
+    with ingest_executors.admit(_client_key(request, current_user)):
+        seen = await ingest_executors.run_io(_existing_keys, [item.idempotency_key for item in batch])
+        results = [None] * len(batch)
+        pending = []  # one dict per item that still has to be stored
+
+        for i, item in enumerate(batch):
+            if item.idempotency_key in seen:
+                results[i] = {'idempotency_key': item.idempotency_key, 'status': 'duplicate', 'id': seen[item.idempotency_key]}
+                continue
+            image = by_name[item.image] if item.image in by_name else images[i]
+            rid = str(uuid.uuid4())
+            seen[item.idempotency_key] = rid  # repeated keys within one batch are duplicates too
+            try:
+                upload = await ingest_executors.run_io(raw_store.store_upload, image.file)
+            except HTTPException as e:
+                results[i] = {'idempotency_key': item.idempotency_key, 'status': 'failed', 'error': str(e.detail)}
+                continue
+            pending.append({'i': i, 'item': item, 'id': rid, 'raw_path': upload.path, 'sha': upload.sha256})
+
+        await ingest_executors.run_io(_ingest_batch, pending, results, current_user)
+
+    counts = {s: sum(1 for r in results if r['status'] == s) for s in ('created', 'duplicate', 'failed')}
+    return {'created': counts['created'], 'duplicates': counts['duplicate'], 'failed': counts['failed'], 'results': results}
+
+def _existing_keys(keys):
+    """idempotency_key -> report id for keys that were already ingested"""
     db = SessionLocal()
+    try:
+        return {k: rid for k, rid in db.query(models.Report.idempotency_key, models.Report.id)
+                .filter(models.Report.idempotency_key.in_(keys)).all()}
+    finally:
+        db.close()
+
+def _ingest_batch(pending, results, current_user):
+    """Deduplicate, redact, detect and store streamed batch uploads; runs on an executor thread"""
+    db = SessionLocal()
+    try:
+        # Near-duplicates (of stored reports or earlier items) are found from the hash alone;
+        # only the rest are redacted and run through inference, in parallel
+        render = lambda indices: prepare_reports([(pending[n]['raw_path'], pending[n]['item'].detections) for n in indices],
+                                                 executor=ingest_executors.pixels)
+        prepared = prepare_uploads(db, [(e['id'], e['raw_path'], e['item'].lat, e['item'].lon) for e in pending], render,
+                                   executor=ingest_executors.pixels)
+        ok = []
+        for entry, res in zip(pending, prepared):
+            if isinstance(res, Exception):
+                _release_raw(db, entry['raw_path'])
+                results[entry['i']] = {'idempotency_key': entry['item'].idempotency_key, 'status': 'failed',
+                                       'error': f"Image processing failed: {res}"}
+                continue
+            entry.update(redacted=res.redacted, phash=res.phash, duplicate_of=res.duplicate_of, dets=res.detections)
+            ok.append(entry)
+
+        # Rows are written in a few bulk transactions
+        known = registry_licenses(db, (d.get('license_id') for e in ok for d in e['dets']))
+        for start in range(0, len(ok), BATCH_COMMIT_SIZE):
+            chunk = ok[start:start + BATCH_COMMIT_SIZE]
+            _store_batch_chunk(db, chunk, known, current_user, results)
+    finally:
+        db.close()
+
+def _store_batch_chunk(db, chunk, known_licenses, current_user, results):
+    """Write one chunk of prepared batch items in a single transaction"""
+    staged = {}
+    reports = []
+    for entry in chunk:
+        item, redacted = entry['item'], entry['redacted']
+        rep = models.Report(id=entry['id'], user_id=current_user.id if current_user else None, captured_at=datetime.utcnow(),
+            lat=item.lat, lon=item.lon, raw_uri=entry['raw_path'], device_heading=item.device_heading or 0.0,
+            model_version=detector_model_version(), content_sha256=entry['sha'], idempotency_key=item.idempotency_key,
+            phash=f"{entry['phash']:016x}" if entry['phash'] is not None else None, duplicate_of=entry['duplicate_of'],
+            img_uri=redacted.path, renditions=json.dumps(redacted.renditions), processing_status=STATUS_DONE)
+        db.add(rep)
+        reports.append(rep)
+        staged[entry['id']] = evaluate_detections(db, rep.id, item.lat, item.lon, entry['dets'], known_licenses)
+        record_aggregates(db, rep, staged[entry['id']])
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent retry stored some of these keys first; fall back to one item per transaction
+        db.rollback()
+        if len(chunk) > 1:
+            for entry in chunk:
+                _store_batch_chunk(db, [entry], known_licenses, current_user, results)
+            return
+        entry = chunk[0]
+        _release_raw(db, entry['raw_path'])
+        key = entry['item'].idempotency_key
+        existing = db.query(models.Report.id).filter(models.Report.idempotency_key == key).scalar()
+        results[entry['i']] = {'idempotency_key': key, 'status': 'duplicate', 'id': existing}
+        return
+    for rep in reports:
+        aggregates_committed(rep)
+        if rep.phash and not rep.duplicate_of:
+            duplicate_index.add(rep.id, int(rep.phash, 16), rep.lat, rep.lon)
+    for entry in chunk:
+        results[entry['i']] = {'idempotency_key': entry['item'].idempotency_key, 'status': 'created', 'id': entry['id'],
+                               'detections': staged[entry['id']], 'duplicate_of': entry['duplicate_of']}
+
+def _release_raw(db, raw_path: str):
+    """Delete a raw blob unless another report was stored with the same bytes"""
+    if not db.query(models.Report.id).filter(models.Report.raw_uri == raw_path).first():
+        raw_store.delete(raw_path)
+
+def _discard_report(report_id: str, raw_path: str):
+    """Remove a report row and its raw upload when ingestion is abandoned"""
+    db = SessionLocal()
+    db.query(models.Report).filter(models.Report.id == report_id).delete()
+    db.commit()
+    _release_raw(db, raw_path)
+    db.close()
+
+@router.get("/reports/{report_id}/status")
+def get_report_status(report_id: str, db: Session = Depends(get_db)):
     rep = db.query(models.Report).filter(models.Report.id == report_id).first()
     if not rep:
         return {'error': 'not found'}
-    dets = db.query(models.Detection).filter(models.Detection.report_id == report_id).all()
-    out = []
-    for d in dets:
-        vios = db.query(models.Violation).filter(models.Violation.detection_id == d.id).all()
-        out.append({'id': d.id, 'bbox': d.bbox, 'est_w': d.est_width_m, 'est_h': d.est_height_m, 'license_id': d.license_id, 'violations': [{'type': v.type, 'reason': v.reason, 'severity': v.severity} for v in vios]})
-    return {'id': rep.id, 'img_uri': rep.img_uri, 'lat': rep.lat, 'lon': rep.lon, 'detections': out}
+    status = rep.processing_status or STATUS_DONE
+    out = {'id': rep.id, 'job_id': rep.id, 'status': status, 'error': rep.processing_error}
+    # Queue position and timings are only known to the process that accepted the upload
+    job = report_queue.status(report_id)
+    if job:
+        out['job'] = job
+    if status == STATUS_DONE:
+        out['report_url'] = f"/api/reports/{rep.id}"
+    return out
+def _violation_dict(v):
+    return {'type': v.type, 'reason': v.reason, 'severity': v.severity}
+
+def _detection_dict(d):
+    return {'id': d.id, 'bbox': d.bbox, 'est_w': d.est_width_m, 'est_h': d.est_height_m, 'license_id': d.license_id,
+            'violations': [_violation_dict(v) for v in d.violations]}
+
+def _report_dict(report):
+    """Dashboard representation of a report with its detections loaded"""
+    return {
+        'id': report.id,
+        'location': f"Location {report.id[:8]}",  # Generate a location name
+        'coordinates': [report.lat, report.lon],
+        'status': report.status,
+        'timestamp': report.captured_at.isoformat(),
+        'detections': [_detection_dict(d) for d in report.detections],
+        'image': public_store.url_for(report.img_uri, "/api/uploads") if report.img_uri else "https://via.placeholder.com/300x200/4CAF50/FFFFFF?text=Billboard+Detection",
+        'archived': report.archived,
+        'archived_at': report.archived_at.isoformat() if report.archived_at else None,
+        'duplicate_of': report.duplicate_of,
+        'renditions': rendition_urls(json.loads(report.renditions), "/api/uploads") if report.renditions else None
+    }
+
+# Detections and their violations in two extra IN queries, whatever the page size
+_WITH_DETECTIONS = selectinload(models.Report.detections).selectinload(models.Detection.violations)
+
+def _encode_cursor(report) -> str:
+    key = [report.archived, report.captured_at.isoformat(), report.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        archived, captured_at, rid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return archived, datetime.fromisoformat(captured_at), rid
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _reports_query(db, status: Optional[str], archived: Optional[str], since: Optional[datetime], until: Optional[datetime]):
+    """Filtered reports in dashboard order: active first, then archived, newest first within each group"""
+    R = models.Report
+    q = db.query(R)
+    if status:
+        q = q.filter(R.status == status)
+    if archived:
+        q = q.filter(R.archived == archived)
+    if since:
+        q = q.filter(R.captured_at >= since)
+    if until:
+        q = q.filter(R.captured_at < until)
+    return q.order_by(R.archived.asc(), R.captured_at.desc(), R.id.desc())
+
+@router.get("/reports/{report_id}")
+def get_report(report_id: str, db: Session = Depends(get_db)):
+    rep = db.query(models.Report).options(_WITH_DETECTIONS).filter(models.Report.id == report_id).first()
+    if not rep:
+        return {'error': 'not found'}
+    out = [_detection_dict(d) for d in rep.detections]
+    renditions = rendition_urls(json.loads(rep.renditions), "/api/uploads") if rep.renditions else None
+    return {'id': rep.id, 'img_uri': rep.img_uri, 'lat': rep.lat, 'lon': rep.lon, 'detections': out, 'duplicate_of': rep.duplicate_of,
+            'renditions': renditions}
+
+def _after_cursor(q, cursor: str):
+    """Rows after the cursor: archived ascending, then captured_at and id descending"""
+    R = models.Report
+    c_archived, c_captured, c_id = _decode_cursor(cursor)
+    return q.filter(or_(
+        R.archived > c_archived,
+        and_(R.archived == c_archived, or_(
+            R.captured_at < c_captured,
+            and_(R.captured_at == c_captured, R.id < c_id)))))
 
 @router.get("/reports")
-def get_all_reports():
-    db = SessionLocal()
-    # Sort reports: active first, then archived (by priority)
-    reports = db.query(models.Report).order_by(
-        models.Report.archived.asc(),  # false first, then true
-        models.Report.captured_at.desc()  # newest first within each group
-    ).all()
-    out = []
-    for report in reports:
-        # Get detections for this report
-        detections = db.query(models.Detection).filter(models.Detection.report_id == report.id).all()
-        detection_data = []
-        for det in detections:
-            violations = db.query(models.Violation).filter(models.Violation.detection_id == det.id).all()
-            detection_data.append({
-                'id': det.id,
-                'bbox': det.bbox,
-                'est_w': det.est_width_m,
-                'est_h': det.est_height_m,
-                'license_id': det.license_id,
-                'violations': [{'type': v.type, 'reason': v.reason, 'severity': v.severity} for v in violations]
-            })
-        
-        out.append({
-            'id': report.id,
-            'location': f"Location {report.id[:8]}",  # Generate a location name
-            'coordinates': [report.lat, report.lon],
-            'status': report.status,
-            'timestamp': report.captured_at.isoformat(),
-            'detections': detection_data,
-            'image': f"/api/uploads/{report.img_uri.split('/')[-1]}" if report.img_uri else "https://via.placeholder.com/300x200/4CAF50/FFFFFF?text=Billboard+Detection",
-            'archived': report.archived,
-            'archived_at': report.archived_at.isoformat() if report.archived_at else None
-        })
-    return out
+def get_all_reports(request: Request, response: Response, limit: Optional[int] = Query(None, ge=1, le=500), cursor: Optional[str] = None,
+                    status: Optional[str] = None, archived: Optional[str] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    format: str = Query(FORMAT_JSON, pattern="^(json|ndjson|json-stream)$"),
+                    db: Session = Depends(get_db)):
+    """
+    One page of reports with detections and violations
+
+    Pages are keyset-paginated on (archived, captured_at, id); pass the X-Next-Cursor
+    response header back as `cursor` to fetch the next page. With format=ndjson or
+    format=json-stream every matching report (after `cursor`, up to `limit` if given)
+    is streamed from a server-side cursor instead.
+    """
+    if format in STREAM_FORMATS:
+        def build(stream_db):
+            q = _reports_query(stream_db, status, archived, since, until)
+            if cursor:
+                q = _after_cursor(q, cursor)
+            if limit:
+                q = q.limit(limit)
+            return q.options(_WITH_DETECTIONS)
+        return stream_rows(iter_query(build, _report_dict), format)
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    q = _reports_query(db, status, archived, since, until)
+    if cursor:
+        q = _after_cursor(q, cursor)
+    reports = q.options(_WITH_DETECTIONS).limit(limit + 1).all()
+    if len(reports) > limit:
+        reports = reports[:limit]
+        next_cursor = _encode_cursor(reports[-1])
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return [_report_dict(r) for r in reports]
+
+def _heatmap_feature(row):
+    rid, lat, lon, captured_at = row
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': {'id': rid, 'captured_at': captured_at.isoformat()}}
 
 @router.get("/heatmap")
-def heatmap():
-    db = SessionLocal()
-    reps = db.query(models.Report).all()
-    features = []
-    for r in reps:
-        features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [r.lon, r.lat]}, 'properties': {'id': r.id, 'captured_at': r.captured_at.isoformat()}})
-    return {'type': 'FeatureCollection', 'features': features}
+def heatmap(format: str = Query(FORMAT_JSON, pattern="^(json|ndjson|json-stream)$")):
+    R = models.Report
+    build = lambda db: db.query(R.id, R.lat, R.lon, R.captured_at)
+    features = iter_query(build, _heatmap_feature)
+    if format in STREAM_FORMATS:
+        return stream_rows(features, format, prefix='{"type": "FeatureCollection", "features": [', suffix=']}')
+    return {'type': 'FeatureCollection', 'features': list(features)}
+
+@router.get("/heatmap/{z}/{x}/{y}")
+def heatmap_tile(z: int, x: int, y: int, response: Response, type: Optional[str] = None,
+                 since: Optional[date] = None, until: Optional[date] = None, db: Session = Depends(get_db)):
+    """
+    Pre-aggregated report counts for one Web Mercator tile
+
+    `type` restricts the counts to one violation type; `since`/`until` bound the
+    capture day (inclusive).
+    """
+    if not 0 <= z <= HEATMAP_BASE_ZOOM or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        raise HTTPException(status_code=400, detail=f"Tile out of range (max zoom {HEATMAP_BASE_ZOOM})")
+    response.headers["Cache-Control"] = f"public, max-age={int(HEATMAP_TILE_TTL)}"
+    return aggregated_tile(db, z, x, y, type, since, until)
+
+@router.post("/heatmap/rebuild")
+def rebuild_heatmap_tiles(db: Session = Depends(get_db), admin: models.User = Depends(get_admin_user)):
+    cells = rebuild_heatmap(db)
+    db.commit()
+    return {'ok': True, 'cells': cells}
 
 @router.patch("/reports/{report_id}")
 def update_report_status(report_id: str, status_update: dict):
@@ -2,6 +2,7 @@
 from fastapi import APIRouter
 from ..db import SessionLocal
 from .. import models
+from ..aggregates import record_violation_stats
 router = APIRouter(tags=['review'])
 @router.post("/review/{detection_id}")
 def review_detection(detection_id: str, status: str, notes: str = ""):
@@ -11,5 +12,6 @@ def review_detection(detection_id: str, status: str, notes: str = ""):
         return {"error": "not found"}
     vio = models.Violation(id=str(__import__('uuid').uuid4()), detection_id=detection_id, type=f"review:{status}", reason=notes, severity=0)
     db.add(vio)
+    record_violation_stats(db, vio.type, vio.severity, det.report.zone_id if det.report else None)
     db.commit()
     return {"ok": True}
@@ -1,15 +1,36 @@
 
-from fastapi import APIRouter
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
 from ..db import SessionLocal
 from .. import models
+from ..auth import get_admin_user
+from ..aggregates import stats_summary, stats_timeseries, rebuild_stats
+from ..detection_cache import detection_cache
 router = APIRouter(tags=['stats'])
-@router.get("/stats/summary")
-def summary():
+def get_db():
     db = SessionLocal()
-    total_reports = db.query(models.Report).count()
-    total_detections = db.query(models.Detection).count()
-    total_violations = db.query(models.Violation).count()
-    by_type = {}
-    for v in db.query(models.Violation).all():
-        by_type[v.type] = by_type.get(v.type, 0) + 1
-    return {"reports": total_reports, "detections": total_detections, "violations": total_violations, "violations_by_type": by_type}
+    try:
+        yield db
+    finally:
+        db.close()
+@router.get("/stats/summary")
+def summary(db: Session = Depends(get_db)):
+    # Summed from the stats_rollup counters maintained at ingestion and review
+    return stats_summary(db)
+@router.get("/stats/timeseries")
+def timeseries(bucket: str = Query("day", pattern="^(day|week)$"), metric: str = Query("violation", pattern="^(report|detection|violation)$"),
+               type: Optional[str] = None, zone: Optional[str] = None, severity: Optional[int] = None,
+               since: Optional[date] = None, until: Optional[date] = None, db: Session = Depends(get_db)):
+    return {"bucket": bucket, "metric": metric,
+            "series": stats_timeseries(db, metric, bucket, type, zone, severity, since, until)}
+@router.get("/stats/detection-cache")
+def detection_cache_stats():
+    # Counters of the API process, where cache lookups for every ingest path happen
+    return detection_cache.stats()
+@router.post("/stats/rebuild")
+def rebuild(db: Session = Depends(get_db), admin: models.User = Depends(get_admin_user)):
+    rows = rebuild_stats(db)
+    db.commit()
+    return {"ok": True, "rows": rows}
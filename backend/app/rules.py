@@ -5,9 +5,10 @@ Implements standardized violation detection with configurable thresholds
 
 import os
 import math
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 from dataclasses import dataclass
 from enum import Enum
+from .spatial import PointIndex, index_points
 
 class ViolationType(Enum):
     SIZE_VIOLATION = "size"
@@ -91,7 +92,7 @@ class BillboardRulesEngine:
         ]
     
     def evaluate_detection(self, detection: Detection, lat: float, lon: float, 
-                          junctions_data: List[Dict] = None, 
+                          junctions_data: Union[List[Dict], PointIndex] = None, 
                           registry_check_func=None) -> List[Violation]:
         """
         Evaluate a single detection against all active rules
@@ -99,7 +100,7 @@ class BillboardRulesEngine:
         Args:
             detection: Billboard detection data
             lat, lon: GPS coordinates of detection
-            junctions_data: List of nearby traffic junctions
+            junctions_data: Traffic junction features, or a PointIndex over them
             registry_check_func: Function to check license validity
             
         Returns:
@@ -145,30 +146,24 @@ class BillboardRulesEngine:
         return None
     
     def _check_junction_proximity(self, lat: float, lon: float, rule: ViolationRule, 
-                                 junctions_data: List[Dict]) -> Optional[Violation]:
-        """Check if billboard is too close to traffic junction"""
+                                 junctions_data: Union[List[Dict], PointIndex]) -> Optional[Violation]:
+        """Check if billboard is too close to the nearest traffic junction"""
         if not junctions_data:
             return None
             
         min_distance = rule.threshold
         
-        for junction in junctions_data:
-            try:
-                j_coords = junction["geometry"]["coordinates"]
-                j_lon, j_lat = j_coords[0], j_coords[1]
-                distance = self._haversine_distance(lat, lon, j_lat, j_lon)
-                
-                if distance < min_distance:
-                    junction_name = junction.get("properties", {}).get("name", "Unknown Junction")
-                    return Violation(
-                        rule_type=rule.rule_type,
-                        severity=rule.severity,
-                        reason=f"Only {distance:.0f}m from {junction_name} (min: {min_distance}m)",
-                        confidence=min(0.9, (min_distance - distance) / min_distance),
-                        metadata={"distance": distance, "junction_name": junction_name}
-                    )
-            except (KeyError, IndexError, TypeError):
-                continue
+        # Raw features are indexed once per collection; malformed ones are skipped
+        junction, distance = index_points(junctions_data).nearest(lat, lon)
+        if junction is not None and distance < min_distance:
+            junction_name = (junction.get("properties") or {}).get("name", "Unknown Junction")
+            return Violation(
+                rule_type=rule.rule_type,
+                severity=rule.severity,
+                reason=f"Only {distance:.0f}m from {junction_name} (min: {min_distance}m)",
+                confidence=min(0.9, (min_distance - distance) / min_distance),
+                metadata={"distance": distance, "junction_name": junction_name}
+            )
                 
         return None
     
@@ -18,6 +18,14 @@ class ReportIn(BaseModel):
     device_heading: float | None = None
     detections: List[DetectionIn]
 
+class BatchItemIn(BaseModel):
+    idempotency_key: str
+    lat: float
+    lon: float
+    device_heading: float | None = None
+    detections: Optional[List[dict]] = None  # same shape as create_report's detections_json
+    image: Optional[str] = None  # filename of the matching upload; defaults to position
+
 class ViolationOut(BaseModel):
     type: str
     reason: str
@@ -31,3 +39,24 @@ class DetectionOut(BaseModel):
 class ReportOut(BaseModel):
     id: str
     detections: List[DetectionOut]
+    duplicate_of: Optional[str] = None
+
+class JobAccepted(BaseModel):
+    id: str
+    job_id: str
+    status: str
+    status_url: str
+
+class BatchItemOut(BaseModel):
+    idempotency_key: str
+    status: str  # created, duplicate, failed
+    id: Optional[str] = None
+    duplicate_of: Optional[str] = None  # near-duplicate photo of an existing report
+    detections: Optional[List[DetectionOut]] = None
+    error: Optional[str] = None
+
+class BatchOut(BaseModel):
+    created: int
+    duplicates: int
+    failed: int
+    results: List[BatchItemOut]
@@ -5,8 +5,28 @@ Implements camera-based size estimation using standard assumptions and depth est
 
 import math
 import numpy as np
-from typing import Tuple, Dict, Optional
-from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple, Dict, List, Optional, Sequence, Union
+from dataclasses import dataclass, astuple
+
+ArrayLike = Union[float, Sequence[float], np.ndarray]
+DEFAULT_BILLBOARD_HEIGHT_M = 3.5  # typical 3-4m panel, used when no distance is known
+MIN_DISTANCE_M, MAX_DISTANCE_M = 5.0, 200.0
+DEPTH_SAMPLE_MAX = 4096  # depth pixels read per ROI; larger ROIs are subsampled on a grid
+
+def _roi_median(roi: np.ndarray, max_samples: int = DEPTH_SAMPLE_MAX) -> float:
+    """Median of the finite values in a depth ROI, from at most about max_samples pixels"""
+    if roi.size > max_samples:
+        step = math.ceil(math.sqrt(roi.size / max_samples))
+        roi = roi[step // 2::step, step // 2::step]  # grid centred in the ROI
+    values = roi.ravel()
+    values = values[np.isfinite(values)]
+    n = values.size
+    if n == 0:
+        return float("nan")
+    lo, hi = (n - 1) // 2, n // 2
+    part = np.partition(values, [lo, hi])
+    return float((part[lo] + part[hi]) / 2)
 
 @dataclass
 class CameraParams:
@@ -17,6 +37,13 @@ class CameraParams:
     image_height_px: int = 1080
     assumed_height_m: float = 1.6  # Assumed camera height (person holding phone)
 
+@lru_cache(maxsize=128)
+def _camera_constants(params: Tuple) -> Tuple[float, float]:
+    """(tan of half the horizontal FOV, focal length in pixels) for astuple(CameraParams)"""
+    focal_length_mm, sensor_width_mm, image_width_px = params[0], params[1], params[2]
+    horizontal_fov = 2 * math.atan(sensor_width_mm / (2 * focal_length_mm))
+    return math.tan(horizontal_fov / 2), focal_length_mm * image_width_px / sensor_width_mm
+
 @dataclass
 class SizeEstimate:
     """Size estimation result with confidence metrics"""
@@ -28,6 +55,36 @@ class SizeEstimate:
     margin_of_error: float
     method: str
 
+@dataclass
+class SizeEstimates:
+    """Size estimates for N boxes as parallel arrays; estimates[i] is a SizeEstimate"""
+    width_m: np.ndarray
+    height_m: np.ndarray
+    area_m2: np.ndarray
+    distance_m: np.ndarray
+    confidence: np.ndarray
+    margin_of_error: np.ndarray
+    method: str
+
+    def __len__(self) -> int:
+        return len(self.width_m)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __getitem__(self, i: int) -> SizeEstimate:
+        return SizeEstimate(float(self.width_m[i]), float(self.height_m[i]), float(self.area_m2[i]),
+                            float(self.distance_m[i]), float(self.confidence[i]), float(self.margin_of_error[i]),
+                            self.method)
+
+    def to_dicts(self) -> List[Dict]:
+        """Rounded per-box dictionaries, as returned by estimate_billboard_size"""
+        columns = [a.tolist() for a in (self.width_m, self.height_m, self.area_m2, self.distance_m,
+                                        self.confidence, self.margin_of_error)]
+        return [{"width_m": round(w, 1), "height_m": round(h, 1), "area_m2": round(a, 1), "distance_m": round(d, 1),
+                 "confidence": round(c, 2), "margin_of_error": f"±{m}m", "method": self.method}
+                for w, h, a, d, c, m in zip(*columns)]
+
 class BillboardSizeEstimator:
     """
     Billboard size estimation using monocular vision techniques
@@ -46,6 +103,11 @@ class BillboardSizeEstimator:
             (20, 50): {"mean_error": 1.2, "std_dev": 0.9, "samples": 234},
             (50, 100): {"mean_error": 2.1, "std_dev": 1.4, "samples": 89}
         }
+        self.default_accuracy = {"mean_error": 3.0, "std_dev": 2.0, "samples": 10}  # outside calibrated range
+
+    def camera_constants(self) -> Tuple[float, float]:
+        """FOV-derived constants for the current camera_params, computed once per distinct params"""
+        return _camera_constants(astuple(self.camera_params))
     
     def estimate_size_from_bbox(self, bbox: list, image_width: int, image_height: int, 
                                assumed_distance_m: Optional[float] = None) -> SizeEstimate:
@@ -53,52 +115,50 @@ class BillboardSizeEstimator:
         Option A: Fast size estimation using standard camera assumptions
         
         Args:
-            bbox: [x1, y1, x2, y2] bounding box coordinates
+            bbox: [x1, y1, x2, y2] bounding box coordinates in pixels
             image_width, image_height: Image dimensions in pixels
             assumed_distance_m: Optional distance override
             
         Returns:
             SizeEstimate with dimensions and confidence metrics
         """
-        x1, y1, x2, y2 = bbox
-        bbox_width_px = x2 - x1
-        bbox_height_px = y2 - y1
-        
-        # Calculate field of view
-        horizontal_fov = 2 * math.atan(
-            self.camera_params.sensor_width_mm / (2 * self.camera_params.focal_length_mm)
-        )
+        return self.estimate_sizes([bbox], image_width, image_height, assumed_distance_m)[0]
+
+    def estimate_sizes(self, boxes: ArrayLike, image_width: ArrayLike, image_height: ArrayLike,
+                       assumed_distance_m: Optional[ArrayLike] = None) -> SizeEstimates:
+        """
+        Option A for many boxes in one vectorized pass
+
+        Args:
+            boxes: (N, 4) array of [x1, y1, x2, y2] in pixels
+            image_width, image_height: Image dimensions, scalars or (N,) arrays when
+                the boxes come from different images
+            assumed_distance_m: Optional distance override, scalar or (N,)
+
+        Returns:
+            SizeEstimates with one entry per box
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        bbox_width_px = boxes[:, 2] - boxes[:, 0]
+        bbox_height_px = boxes[:, 3] - boxes[:, 1]
+        image_width = np.asarray(image_width, dtype=np.float64)
+        tan_half_hfov, _ = self.camera_constants()
         
-        # Estimate distance if not provided
+        # Estimate distance if not provided, from the typical billboard height
         if assumed_distance_m is None:
-            # Use billboard height assumption (typical 3-4m height)
-            assumed_billboard_height_m = 3.5
-            distance_m = self._estimate_distance_from_height(
-                bbox_height_px, image_height, assumed_billboard_height_m
-            )
+            distance_m = self._estimate_distances_from_height(bbox_height_px, image_width, image_height,
+                                                              DEFAULT_BILLBOARD_HEIGHT_M)
         else:
-            distance_m = assumed_distance_m
-        
-        # Calculate real-world dimensions
-        pixels_per_meter_horizontal = image_width / (2 * distance_m * math.tan(horizontal_fov / 2))
-        pixels_per_meter_vertical = pixels_per_meter_horizontal  # Assume square pixels
+            distance_m = np.broadcast_to(np.asarray(assumed_distance_m, dtype=np.float64), bbox_height_px.shape)
         
-        width_m = bbox_width_px / pixels_per_meter_horizontal
-        height_m = bbox_height_px / pixels_per_meter_vertical
-        area_m2 = width_m * height_m
+        # Calculate real-world dimensions; square pixels, so one scale for both axes
+        pixels_per_meter = image_width / (2 * distance_m * tan_half_hfov)
+        width_m = bbox_width_px / pixels_per_meter
+        height_m = bbox_height_px / pixels_per_meter
         
-        # Calculate confidence and margin of error
-        confidence, margin_of_error = self._calculate_confidence(distance_m, bbox_width_px, bbox_height_px)
-        
-        return SizeEstimate(
-            width_m=width_m,
-            height_m=height_m,
-            area_m2=area_m2,
-            distance_m=distance_m,
-            confidence=confidence,
-            margin_of_error=margin_of_error,
-            method="camera_assumptions"
-        )
+        confidence, margin_of_error = self._calculate_confidences(distance_m, bbox_width_px, bbox_height_px)
+        return SizeEstimates(width_m=width_m, height_m=height_m, area_m2=width_m * height_m, distance_m=distance_m,
+                             confidence=confidence, margin_of_error=margin_of_error, method="camera_assumptions")
     
     def estimate_size_with_depth(self, bbox: list, depth_map: np.ndarray) -> SizeEstimate:
         """
@@ -111,81 +171,86 @@ class BillboardSizeEstimator:
         Returns:
             SizeEstimate with improved accuracy
         """
-        x1, y1, x2, y2 = [int(coord) for coord in bbox]
-        
-        # Extract depth information from bounding box region
-        roi_depth = depth_map[y1:y2, x1:x2]
-        median_depth = np.median(roi_depth)
-        
+        return self.estimate_sizes_with_depth([bbox], depth_map)[0]
+
+    def estimate_sizes_with_depth(self, boxes: ArrayLike, depth_map: np.ndarray,
+                                  max_samples: int = DEPTH_SAMPLE_MAX) -> SizeEstimates:
+        """
+        Option B for every box of one image against a single depth map
+
+        Each ROI's depth is the median of its finite values, found with np.partition
+        instead of a full sort. ROIs larger than max_samples pixels are read on a regular
+        subsampled grid, so the cost per box is bounded; smaller ROIs give the exact
+        median. Boxes are in depth-map pixels and are clipped to the map.
+
+        Returns:
+            SizeEstimates with one entry per box (NaN distance for an empty ROI)
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4).astype(int)
+        map_h, map_w = depth_map.shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, map_w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, map_h)
         # Convert depth to real-world distance (assuming depth in meters)
-        distance_m = float(median_depth)
-        
-        # Use camera intrinsics for precise calculation
-        fx = self.camera_params.focal_length_mm * self.camera_params.image_width_px / self.camera_params.sensor_width_mm
-        fy = fx  # Assume square pixels
+        distance_m = np.array([_roi_median(depth_map[y1:y2, x1:x2], max_samples) for x1, y1, x2, y2 in boxes.tolist()])
         
-        # Calculate real-world dimensions
-        bbox_width_px = x2 - x1
-        bbox_height_px = y2 - y1
-        
-        width_m = (bbox_width_px * distance_m) / fx
-        height_m = (bbox_height_px * distance_m) / fy
-        area_m2 = width_m * height_m
+        # Use camera intrinsics for precise calculation; square pixels
+        _, fx = self.camera_constants()
+        bbox_width_px = (boxes[:, 2] - boxes[:, 0]).astype(np.float64)
+        bbox_height_px = (boxes[:, 3] - boxes[:, 1]).astype(np.float64)
+        width_m = bbox_width_px * distance_m / fx
+        height_m = bbox_height_px * distance_m / fx
         
         # Higher confidence with depth information
-        confidence, margin_of_error = self._calculate_confidence(distance_m, bbox_width_px, bbox_height_px)
-        confidence = min(0.95, confidence * 1.2)  # Boost confidence for depth-based estimation
-        margin_of_error *= 0.7  # Reduce margin of error
+        confidence, margin_of_error = self._calculate_confidences(distance_m, bbox_width_px, bbox_height_px)
+        confidence = np.minimum(0.95, confidence * 1.2)  # Boost confidence for depth-based estimation
+        margin_of_error = margin_of_error * 0.7  # Reduce margin of error
         
-        return SizeEstimate(
-            width_m=width_m,
-            height_m=height_m,
-            area_m2=area_m2,
-            distance_m=distance_m,
-            confidence=confidence,
-            margin_of_error=margin_of_error,
-            method="depth_estimation"
-        )
+        return SizeEstimates(width_m=width_m, height_m=height_m, area_m2=width_m * height_m, distance_m=distance_m,
+                             confidence=confidence, margin_of_error=margin_of_error, method="depth_estimation")
     
-    def _estimate_distance_from_height(self, bbox_height_px: int, image_height: int, 
+    def _estimate_distance_from_height(self, bbox_height_px: int, image_width: int, image_height: int,
                                      assumed_height_m: float) -> float:
         """Estimate distance using assumed billboard height"""
-        # Simple pinhole camera model
-        vertical_fov = 2 * math.atan(
-            (self.camera_params.sensor_width_mm * image_height / self.camera_params.image_width_px) / 
-            (2 * self.camera_params.focal_length_mm)
-        )
-        
+        return float(self._estimate_distances_from_height(np.array([bbox_height_px]), image_width, image_height,
+                                                          assumed_height_m)[0])
+
+    def _estimate_distances_from_height(self, bbox_height_px: np.ndarray, image_width: ArrayLike, image_height: ArrayLike,
+                                        assumed_height_m: float) -> np.ndarray:
+        """Distances for many boxes with a simple pinhole camera model, clamped to a reasonable range"""
+        image_width = np.asarray(image_width, dtype=np.float64)
+        image_height = np.asarray(image_height, dtype=np.float64)
+        tan_half_hfov, _ = self.camera_constants()
+        # tan(vfov / 2) follows from the horizontal FOV and the aspect ratio of this image
+        vertical_fov = 2 * np.arctan(tan_half_hfov * image_height / image_width)
         angular_height = (bbox_height_px / image_height) * vertical_fov
-        distance_m = assumed_height_m / (2 * math.tan(angular_height / 2))
-        
-        # Clamp to reasonable range
-        return max(5.0, min(200.0, distance_m))
+        with np.errstate(divide="ignore"):
+            distance_m = assumed_height_m / (2 * np.tan(angular_height / 2))
+        return np.clip(distance_m, MIN_DISTANCE_M, MAX_DISTANCE_M)
     
     def _calculate_confidence(self, distance_m: float, width_px: int, height_px: int) -> Tuple[float, float]:
         """Calculate confidence score and margin of error based on distance and bbox size"""
-        
-        # Find appropriate accuracy range
-        accuracy_data = None
-        for (min_dist, max_dist), data in self.size_accuracy_table.items():
-            if min_dist <= distance_m < max_dist:
-                accuracy_data = data
-                break
-        
-        if accuracy_data is None:
-            # Default for distances outside calibrated range
-            accuracy_data = {"mean_error": 3.0, "std_dev": 2.0, "samples": 10}
+        confidence, margin_of_error = self._calculate_confidences(np.array([distance_m], dtype=np.float64),
+                                                                  np.array([width_px]), np.array([height_px]))
+        return float(confidence[0]), float(margin_of_error[0])
+
+    def _calculate_confidences(self, distance_m: np.ndarray, width_px: np.ndarray,
+                               height_px: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Confidence scores and margins of error for many boxes"""
+        # Calibrated accuracy for each distance; the first matching range wins
+        ranges = [(lo <= distance_m) & (distance_m < hi) for lo, hi in self.size_accuracy_table]
+        rows = list(self.size_accuracy_table.values())
+        pick = lambda field: np.select(ranges, [row[field] for row in rows], self.default_accuracy[field])
+        samples = pick("samples")
         
         # Base confidence on distance and bbox size
-        distance_factor = max(0.3, 1.0 - (distance_m - 10) / 100)  # Decreases with distance
-        size_factor = min(1.0, (width_px * height_px) / 10000)  # Increases with bbox size
-        sample_factor = min(1.0, accuracy_data["samples"] / 100)  # Based on calibration data
+        distance_factor = np.maximum(0.3, 1.0 - (distance_m - 10) / 100)  # Decreases with distance
+        size_factor = np.minimum(1.0, (width_px * height_px) / 10000)  # Increases with bbox size
+        sample_factor = np.minimum(1.0, samples / 100)  # Based on calibration data
         
-        confidence = distance_factor * size_factor * sample_factor
-        confidence = max(0.1, min(0.95, confidence))
+        confidence = np.clip(distance_factor * size_factor * sample_factor, 0.1, 0.95)
         
         # Margin of error from calibration data
-        margin_of_error = accuracy_data["mean_error"] + accuracy_data["std_dev"]
+        margin_of_error = pick("mean_error") + pick("std_dev")
         
         return confidence, margin_of_error
     
@@ -211,6 +276,9 @@ class BillboardSizeEstimator:
             "calibration_notes": "Accuracy data from field testing with iPhone 12 and Pixel 6"
         }
 
+# Shared estimator; camera constants are cached per CameraParams
+size_estimator = BillboardSizeEstimator()
+
 # Utility functions for integration
 def estimate_billboard_size(bbox: list, image_width: int, image_height: int, 
                           distance_hint: Optional[float] = None) -> Dict:
@@ -220,15 +288,9 @@ def estimate_billboard_size(bbox: list, image_width: int, image_height: int,
     Returns:
         Dictionary with size estimates and metadata
     """
-    estimator = BillboardSizeEstimator()
-    estimate = estimator.estimate_size_from_bbox(bbox, image_width, image_height, distance_hint)
-    
-    return {
-        "width_m": round(estimate.width_m, 1),
-        "height_m": round(estimate.height_m, 1),
-        "area_m2": round(estimate.area_m2, 1),
-        "distance_m": round(estimate.distance_m, 1),
-        "confidence": round(estimate.confidence, 2),
-        "margin_of_error": f"±{estimate.margin_of_error}m",
-        "method": estimate.method
-    }
+    return estimate_billboard_sizes([bbox], image_width, image_height, distance_hint)[0]
+
+def estimate_billboard_sizes(bboxes: ArrayLike, image_width: ArrayLike, image_height: ArrayLike,
+                             distance_hint: Optional[ArrayLike] = None) -> List[Dict]:
+    """Size estimate dictionaries for many boxes in one vectorized call"""
+    return size_estimator.estimate_sizes(bboxes, image_width, image_height, distance_hint).to_dicts()
@@ -0,0 +1,212 @@
+"""
+Point-of-Interest Index
+Grid-bucketed points on a local metric projection for nearest-neighbour and radius queries
+"""
+
+import os
+import json
+import math
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+EARTH_RADIUS_M = 6371000
+POI_CELL_M = float(os.getenv("POI_CELL_M", "250"))  # grid cell edge; about the typical query radius
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+
+def lonlat_to_metres(lon, lat, lat0: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Equirectangular projection to metres, true to scale near latitude lat0"""
+    x = np.radians(np.asarray(lon, dtype=float)) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    y = np.radians(np.asarray(lat, dtype=float)) * EARTH_RADIUS_M
+    return x, y
+
+def haversine_m(lat, lon, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in metres from one point to arrays of points (broadcasts)"""
+    p1, p2 = np.radians(lat), np.radians(lats)
+    dp, dl = p2 - p1, np.radians(lons) - np.radians(lon)
+    a = np.sin(dp / 2) ** 2 + np.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+class PointIndex:
+    """
+    Immutable index over GeoJSON point features
+
+    Points are projected once to equirectangular metres around the data's mean latitude
+    and bucketed into square cells, so a query touches only the cells around it and
+    computes exact haversine distances for those candidates. An optional per-point
+    radius (e.g. a "buffer_m" property) supports "which buffers contain this point".
+    """
+
+    def __init__(self, features: Iterable[Dict], cell_m: float = POI_CELL_M, radius_property: Optional[str] = None):
+        self.features, lats, lons, radii = [], [], [], []
+        for f in features:
+            try:
+                lon, lat = f["geometry"]["coordinates"][:2]
+                radius = float(f.get("properties", {})[radius_property]) if radius_property else 0.0
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue  # not a usable point feature
+            self.features.append(f)
+            lats.append(float(lat)); lons.append(float(lon)); radii.append(radius)
+        self.lats, self.lons = np.array(lats), np.array(lons)
+        self.radii = np.array(radii)
+        self.max_radius = float(self.radii.max()) if len(self.radii) else 0.0
+        self.cell_m = cell_m
+        self._lat0 = float(self.lats.mean()) if len(self.lats) else 0.0
+        x, y = self._project(self.lats, self.lons)
+        buckets = defaultdict(list)
+        for i, key in enumerate(zip((x // cell_m).astype(int).tolist(), (y // cell_m).astype(int).tolist())):
+            buckets[key].append(i)
+        self._cells: Dict[Tuple[int, int], np.ndarray] = {key: np.array(ids) for key, ids in buckets.items()}
+        if self._cells:
+            keys = np.array(list(self._cells))
+            self._cell_min, self._cell_max = keys.min(axis=0), keys.max(axis=0)
+
+    @classmethod
+    def from_geojson(cls, source: Union[str, Dict], **kwargs) -> "PointIndex":
+        """Index a FeatureCollection given as a parsed dict or a file path"""
+        if isinstance(source, str):
+            with open(source) as f:
+                source = json.load(f)
+        return cls(source.get("features", []), **kwargs)
+
+    @classmethod
+    def of(cls, points: Union["PointIndex", Dict, Sequence[Dict]], **kwargs) -> "PointIndex":
+        """Return an index unchanged, or build one from a FeatureCollection or a list of features"""
+        if isinstance(points, cls):
+            return points
+        if isinstance(points, dict):
+            return cls.from_geojson(points, **kwargs)
+        return cls(points or [], **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def _project(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        return lonlat_to_metres(lon, lat, self._lat0)
+
+    def _cell_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        x, y = self._project(lat, lon)
+        return int(x // self.cell_m), int(y // self.cell_m)
+
+    def _candidates(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        """Indices of points in the cells overlapping a radius around the point"""
+        if not self._cells:
+            return np.empty(0, dtype=int)
+        return self._cell_candidates(*self._cell_of(lat, lon), radius_m)
+
+    def _cell_candidates(self, cx: int, cy: int, radius_m: float) -> np.ndarray:
+        """Indices of points near any location inside cell (cx, cy)"""
+        # one extra cell covers the query's offset inside its own cell
+        reach = int(math.ceil(radius_m / self.cell_m)) + 1
+        x0, x1 = max(cx - reach, self._cell_min[0]), min(cx + reach, self._cell_max[0])
+        y0, y1 = max(cy - reach, self._cell_min[1]), min(cy + reach, self._cell_max[1])
+        if x1 < x0 or y1 < y0:
+            return np.empty(0, dtype=int)  # the radius does not reach the grid
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self._cells):
+            return np.arange(len(self.features))  # the radius covers most of the grid
+        found = [self._cells[(x, y)] for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) if (x, y) in self._cells]
+        return np.concatenate(found) if found else np.empty(0, dtype=int)
+
+    def within(self, lat: float, lon: float, radius_m: float) -> List[Tuple[Dict, float]]:
+        """(feature, distance_m) for points closer than radius_m, nearest first"""
+        ids = self._candidates(lat, lon, radius_m)
+        d = haversine_m(lat, lon, self.lats[ids], self.lons[ids])
+        hit = d < radius_m
+        ids, d = ids[hit], d[hit]
+        order = np.argsort(d, kind="stable")
+        return [(self.features[i], float(dist)) for i, dist in zip(ids[order].tolist(), d[order].tolist())]
+
+    def containing_buffers(self, lat: float, lon: float) -> List[Tuple[Dict, float]]:
+        """(feature, distance_m) for points whose own radius reaches this location, nearest first"""
+        ids = self._candidates(lat, lon, self.max_radius)
+        d = haversine_m(lat, lon, self.lats[ids], self.lons[ids])
+        hit = d < self.radii[ids]
+        ids, d = ids[hit], d[hit]
+        order = np.argsort(d, kind="stable")
+        return [(self.features[i], float(dist)) for i, dist in zip(ids[order].tolist(), d[order].tolist())]
+
+    def buffer_hits(self, lats, lons) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        containing_buffers() for arrays of locations at once
+
+        Queries are grouped by grid cell, so each cell's candidates are gathered once
+        and matched against all of its queries in one distance matrix.
+
+        Returns:
+            (query index, feature index, distance_m) arrays, by query then distance
+        """
+        lats, lons = np.atleast_1d(np.asarray(lats, dtype=float)), np.atleast_1d(np.asarray(lons, dtype=float))
+        q_out, f_out, d_out = [np.empty(0, dtype=np.intp)], [np.empty(0, dtype=np.intp)], [np.empty(0)]
+        if self._cells and len(lats):
+            x, y = self._project(lats, lons)
+            cells = np.column_stack([(x // self.cell_m).astype(int), (y // self.cell_m).astype(int)])
+            keys, inverse = np.unique(cells, axis=0, return_inverse=True)
+            by_cell = np.argsort(inverse.ravel(), kind="stable")
+            bounds = np.cumsum(np.bincount(inverse.ravel(), minlength=len(keys)))[:-1]
+            for (cx, cy), queries in zip(keys.tolist(), np.split(by_cell, bounds)):
+                ids = self._cell_candidates(cx, cy, self.max_radius)
+                if not len(ids):
+                    continue
+                d = haversine_m(lats[queries, None], lons[queries, None], self.lats[ids], self.lons[ids])
+                qi, fi = np.nonzero(d < self.radii[ids])
+                q_out.append(queries[qi]); f_out.append(ids[fi]); d_out.append(d[qi, fi])
+        q, f, d = np.concatenate(q_out), np.concatenate(f_out), np.concatenate(d_out)
+        order = np.lexsort((d, q))
+        return q[order], f[order], d[order]
+
+    def nearest(self, lat: float, lon: float) -> Tuple[Optional[Dict], float]:
+        """Closest feature and its distance in metres; (None, inf) when the index is empty"""
+        if not self.features:
+            return None, math.inf
+        cx, cy = self._cell_of(lat, lon)
+        # Grow a square of cells until the best hit is closer than anything outside it
+        span = max(self._cell_max[0] - self._cell_min[0], self._cell_max[1] - self._cell_min[1])
+        gap = max(self._cell_min[0] - cx, cx - self._cell_max[0], self._cell_min[1] - cy, cy - self._cell_max[1], 0)
+        ring = gap
+        while True:
+            ids = self._candidates(lat, lon, ring * self.cell_m)
+            if len(ids):
+                d = haversine_m(lat, lon, self.lats[ids], self.lons[ids])
+                best = int(np.argmin(d))
+                # every point not gathered yet lies more than `ring` cells away
+                if d[best] <= ring * self.cell_m or ring > gap + span:
+                    return self.features[int(ids[best])], float(d[best])
+            ring += 1
+
+_indexes: Dict[Tuple[str, Optional[str]], PointIndex] = {}
+_indexes_lock = threading.Lock()
+
+def load_point_index(path: str, radius_property: Optional[str] = None) -> PointIndex:
+    """Index for a GeoJSON file, built once per process and shared"""
+    key = (os.path.abspath(path), radius_property)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = PointIndex.from_geojson(path, radius_property=radius_property)
+        return _indexes[key]
+
+_adhoc: "OrderedDict[Tuple[int, Optional[str]], Tuple[object, PointIndex]]" = OrderedDict()
+ADHOC_INDEXES = 8  # in-memory collections kept indexed; callers reuse a handful at most
+
+def index_points(points: Union[PointIndex, Dict, Sequence[Dict], None],
+                 radius_property: Optional[str] = None) -> PointIndex:
+    """
+    PointIndex.of() for repeated queries against the same in-memory GeoJSON
+
+    The index is remembered per collection object (which is kept alive alongside it),
+    so checking many locations against one list of features builds the grid once.
+    Collections are treated as read-only once indexed.
+    """
+    if isinstance(points, PointIndex):
+        return points
+    key = (id(points), radius_property)
+    with _indexes_lock:
+        hit = _adhoc.get(key)
+        if hit is not None and hit[0] is points:
+            _adhoc.move_to_end(key)
+            return hit[1]
+        index = PointIndex.of(points, radius_property=radius_property)
+        _adhoc[key] = (points, index)
+        while len(_adhoc) > ADHOC_INDEXES:
+            _adhoc.popitem(last=False)
+        return index
@@ -0,0 +1,141 @@
+"""
+Content-Addressed Blob Storage
+SHA-256 keyed files in a sharded directory layout with atomic, deduplicating writes
+"""
+
+import os
+import re
+import uuid
+import asyncio
+import hashlib
+from functools import partial
+from dataclasses import dataclass, replace
+from typing import BinaryIO, Optional
+from fastapi import UploadFile
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException
+from .uploads import copy_upload, StoredUpload
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "./data/uploads")  # public: served at /api/uploads
+RAW_STORAGE_DIR = os.getenv("RAW_STORAGE_DIR", "./data/raw")  # private: original uploads, never served
+HASH_CHUNK_BYTES = 1024 * 1024
+INCOMING_SUFFIX = ".incoming"  # <root>.incoming holds temporary files, beside the root on the same filesystem
+
+BLOB_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# PIL format name -> blob extension
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif", "BMP": ".bmp", "TIFF": ".tif", "MPO": ".jpg"}
+
+@dataclass
+class Blob:
+    """A stored file and its content hash"""
+    digest: str
+    path: str
+    size_bytes: int
+    created: bool  # False when identical bytes were already stored
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_digest(path: str) -> str:
+    """SHA-256 of a file, taken from its name when it is a blob"""
+    name = os.path.basename(path)
+    if BLOB_NAME.match(name):
+        return name.split(".", 1)[0]
+    return file_sha256(path)
+
+class BlobStore:
+    """
+    Files named by the SHA-256 of their bytes under root/ab/cd/<digest><ext>
+
+    Two levels of 256-way sharding keep directories small at millions of blobs.
+    Writes go to a temporary file in <root>.incoming, outside the (possibly served)
+    root but next to it, and are renamed into place, so readers never observe a
+    partial blob; identical bytes are stored once.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.incoming = os.path.normpath(root) + INCOMING_SUFFIX
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(self.incoming, exist_ok=True)
+
+    def path_for(self, digest: str, ext: str = "") -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + ext)
+
+    def temp_path(self, suffix: str = "") -> str:
+        """Scratch path to write a new blob to before calling adopt()"""
+        return os.path.join(self.incoming, uuid.uuid4().hex + suffix)
+
+    def adopt(self, tmp_path: str, digest: Optional[str] = None, ext: str = "") -> Blob:
+        """Move a finished temporary file into place, or drop it if the content exists"""
+        digest = digest or file_sha256(tmp_path)
+        size = os.path.getsize(tmp_path)
+        dest = self.path_for(digest, ext)
+        if os.path.exists(dest):
+            os.remove(tmp_path)
+            return Blob(digest=digest, path=dest, size_bytes=size, created=False)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp_path, dest)  # atomic; a concurrent writer of the same digest wrote identical bytes
+        return Blob(digest=digest, path=dest, size_bytes=size, created=True)
+
+    def store_upload(self, src: BinaryIO, **limits) -> StoredUpload:
+        """Copy an upload body into the store (blocking); the returned path is the content-addressed blob"""
+        stored = copy_upload(src, self.temp_path(), **limits)
+        blob = self.adopt(stored.path, stored.sha256, FORMAT_EXTENSIONS.get(stored.format, ""))
+        return replace(stored, path=blob.path)
+
+    async def save_upload(self, upload: UploadFile, **limits) -> StoredUpload:
+        """store_upload() for an UploadFile, run on the event loop's default thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(self.store_upload, upload.file, **limits))
+
+    def contains(self, path: Optional[str]) -> bool:
+        """True if path lies inside this store"""
+        if not path:
+            return False
+        root = os.path.abspath(self.root)
+        return os.path.commonpath([root, os.path.abspath(path)]) == root
+
+    def delete(self, path: str):
+        """Remove a blob; callers must make sure no other record still references it"""
+        if self.contains(path) and os.path.exists(path):
+            os.remove(path)
+
+    def url_for(self, path: Optional[str], prefix: str) -> Optional[str]:
+        """
+        Public URL of a stored file under prefix
+
+        Legacy reports hold flat paths such as ./data/uploads/<id>_redacted.jpg,
+        which are served by basename.
+        """
+        if not path:
+            return None
+        if self.contains(path):
+            rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+            return f"{prefix}/{rel.replace(os.sep, '/')}"
+        return f"{prefix}/{os.path.basename(path)}"
+
+class BlobStaticFiles(StaticFiles):
+    """Serves a BlobStore root; content-addressed blobs are cached by clients for good"""
+
+    async def get_response(self, path: str, scope):
+        # Hidden entries (e.g. a .incoming directory left in the root by older versions) are never served
+        if any(part.startswith(".") for part in path.replace("\\", "/").split("/")):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if BLOB_NAME.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+# Redacted images and other derivatives, mounted at /api/uploads
+public_store = BlobStore(STORAGE_DIR)
+# Unredacted originals, readable only by the pipeline
+raw_store = BlobStore(RAW_STORAGE_DIR)
@@ -0,0 +1,57 @@
+"""
+Streaming Response Helpers
+Serialize large query results row by row from a server-side cursor
+"""
+
+import os
+import json
+from typing import Callable, Iterable, Iterator, Dict
+from fastapi.responses import StreamingResponse
+from .db import SessionLocal
+
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# format query parameter values understood by list endpoints
+FORMAT_JSON = "json"
+FORMAT_NDJSON = "ndjson"
+FORMAT_JSON_STREAM = "json-stream"
+STREAM_FORMATS = (FORMAT_NDJSON, FORMAT_JSON_STREAM)
+
+def iter_query(build_query: Callable, transform: Callable, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Dict]:
+    """
+    Yield transform(row) for every row of build_query(db) in fixed-size batches
+
+    The generator owns its session because it is consumed after the endpoint has
+    returned. Rows are fetched with yield_per over a streaming (server-side) cursor
+    so only one batch is resident at a time.
+    """
+    db = SessionLocal()
+    try:
+        query = build_query(db).execution_options(stream_results=True).yield_per(batch_size)
+        for row in query:
+            yield transform(row)
+    finally:
+        db.close()
+
+def _ndjson(rows: Iterable[Dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+def _json_array(rows: Iterable[Dict], prefix: str, suffix: str) -> Iterator[str]:
+    yield prefix
+    sep = ""
+    for row in rows:
+        yield sep + json.dumps(row)
+        sep = ","
+    yield suffix
+
+def stream_rows(rows: Iterable[Dict], fmt: str, prefix: str = "[", suffix: str = "]") -> StreamingResponse:
+    """
+    Stream rows as NDJSON or as one JSON document emitted in chunks
+
+    For FORMAT_JSON_STREAM the rows are wrapped as prefix + comma-separated rows + suffix,
+    which lets callers stream e.g. the features array of a GeoJSON FeatureCollection.
+    """
+    if fmt == FORMAT_NDJSON:
+        return StreamingResponse(_ndjson(rows), media_type="application/x-ndjson")
+    return StreamingResponse(_json_array(rows, prefix, suffix), media_type="application/json")
@@ -0,0 +1,101 @@
+"""
+Streaming Upload Handling
+Copies multipart uploads to disk in bounded chunks while hashing and enforcing limits
+"""
+
+import os
+import asyncio
+import hashlib
+from io import BytesIO
+from functools import partial
+from dataclasses import dataclass
+from typing import BinaryIO, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))  # 1 MiB per read
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))  # 25 MiB
+MAX_UPLOAD_PIXELS = int(os.getenv("MAX_UPLOAD_PIXELS", str(50_000_000)))  # ~50 MP phone photos
+HEADER_PROBE_BYTES = 512 * 1024  # JPEG SOF marker can sit behind large EXIF blocks
+
+@dataclass
+class StoredUpload:
+    """Upload that has been written to disk"""
+    path: str
+    sha256: str
+    size_bytes: int
+    width: int
+    height: int
+    format: Optional[str]
+
+def _probe_dimensions(head: bytes) -> Optional[Tuple[int, int, Optional[str]]]:
+    """Read image size from the header bytes only; None if more bytes are needed"""
+    try:
+        with Image.open(BytesIO(head)) as img:
+            return img.width, img.height, img.format
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=413, detail="Image has too many pixels")
+    except Exception:
+        # Truncated or unrecognised header
+        return None
+
+def copy_upload(src: BinaryIO, dest_path: str,
+                max_bytes: int = MAX_UPLOAD_BYTES,
+                max_pixels: int = MAX_UPLOAD_PIXELS) -> StoredUpload:
+    """
+    Copy an upload body to dest_path without holding it all in memory
+
+    The body is read in UPLOAD_CHUNK_BYTES chunks, hashed with SHA-256 and written to
+    a temporary file that is renamed into place once every check has passed. Image
+    dimensions are probed from the first bytes so oversized photos are rejected before
+    the rest of the body is copied. This blocks on disk I/O; async callers run it on
+    a thread.
+
+    Raises:
+        HTTPException 413 if the body or pixel count exceeds the limits,
+        HTTPException 400 if the bytes are not a readable image
+    """
+    digest = hashlib.sha256()
+    head = bytearray()
+    dims = None
+    size = 0
+    part_path = dest_path + ".part"
+
+    try:
+        with open(part_path, "wb") as f:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                f.write(chunk)
+
+                if dims is None and len(head) < HEADER_PROBE_BYTES:
+                    head.extend(chunk[:HEADER_PROBE_BYTES - len(head)])
+                    dims = _probe_dimensions(bytes(head))
+                    if dims is None and len(head) >= HEADER_PROBE_BYTES:
+                        raise HTTPException(status_code=400, detail="File must be an image")
+                    if dims is not None and dims[0] * dims[1] > max_pixels:
+                        raise HTTPException(status_code=413, detail=f"Image exceeds {max_pixels} pixels")
+
+        if dims is None:
+            raise HTTPException(status_code=400, detail="File must be an image")
+        os.replace(part_path, dest_path)
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    width, height, fmt = dims
+    return StoredUpload(path=dest_path, sha256=digest.hexdigest(), size_bytes=size,
+                        width=width, height=height, format=fmt)
+
+async def save_upload_stream(upload: UploadFile, dest_path: str,
+                             max_bytes: int = MAX_UPLOAD_BYTES,
+                             max_pixels: int = MAX_UPLOAD_PIXELS) -> StoredUpload:
+    """copy_upload() for an UploadFile, run on the event loop's default thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(
+        None, partial(copy_upload, upload.file, dest_path, max_bytes, max_pixels))
@@ -0,0 +1,45 @@
+"""
+Builds tiny_detector.onnx, a stand-in for the exported YOLOv8 model used by the tests
+
+The graph ignores the pixel values and returns the same candidates for every image in
+the batch, in the YOLOv8 layout (batch, 4 + classes, anchors) with boxes as centre x,
+centre y, width, height in 64x64 input pixels.
+"""
+
+import os
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+
+INPUT_SIZE = 64
+CANDIDATES = np.array([
+    # cx,   cy,   w,    h,   billboard, license_plate
+    [32.0, 20.0, 40.0, 10.0, 0.90, 0.01],  # billboard
+    [33.0, 21.0, 40.0, 10.0, 0.80, 0.02],  # same billboard, suppressed by NMS
+    [16.0, 50.0, 12.0, 6.0, 0.05, 0.70],   # license plate
+    [50.0, 50.0, 8.0, 8.0, 0.10, 0.05],    # below the confidence threshold
+], dtype=np.float32).T[None]  # (1, 6, anchors)
+
+def build() -> onnx.ModelProto:
+    const = numpy_helper.from_array(CANDIDATES, "candidates")
+    zero = numpy_helper.from_array(np.array(0.0, dtype=np.float32), "zero")
+    shape = numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), "shape")
+    nodes = [
+        helper.make_node("ReduceMean", ["images"], ["mean"], axes=[1, 2, 3], keepdims=1),
+        helper.make_node("Mul", ["mean", "zero"], ["zeros"]),
+        helper.make_node("Reshape", ["zeros", "shape"], ["per_image"]),
+        helper.make_node("Add", ["per_image", "candidates"], ["output0"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "tiny_detector",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, INPUT_SIZE, INPUT_SIZE])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", 6, CANDIDATES.shape[2]])],
+        initializer=[const, zero, shape],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+    return model
+
+if __name__ == "__main__":
+    onnx.save(build(), os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiny_detector.onnx"))
@@ -0,0 +1,141 @@
+"""
+Unit tests for incremental aggregates and heatmap tiles
+"""
+
+import unittest
+import sys
+import os
+from unittest import mock
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import models, aggregates
+from app.db import Base
+from app.aggregates import (
+    lonlat_to_tile, tile_to_lonlat, TileCache, HEATMAP_BASE_ZOOM,
+    record_report_stats, record_violation_stats, stats_summary, stats_timeseries, rebuild_stats
+)
+
+class TestTileMath(unittest.TestCase):
+
+    def test_known_tile(self):
+        """Test tile lookup against a known slippy-map tile"""
+        self.assertEqual(lonlat_to_tile(0.0, 0.0, 1), (1, 1))
+        self.assertEqual(lonlat_to_tile(30.3555, 76.3651, 10), (729, 421))
+
+    def test_round_trip(self):
+        """Test a tile's centre maps back into the same tile"""
+        x, y = lonlat_to_tile(30.3555, 76.3651, 14)
+        lon, lat = tile_to_lonlat(x + 0.5, y + 0.5, 14)
+        self.assertEqual(lonlat_to_tile(lat, lon, 14), (x, y))
+
+    def test_parent_tiles_nest(self):
+        """Test base-zoom cells shift down to their parent tiles"""
+        cx, cy = lonlat_to_tile(30.3555, 76.3651, HEATMAP_BASE_ZOOM)
+        for z in range(HEATMAP_BASE_ZOOM + 1):
+            shift = HEATMAP_BASE_ZOOM - z
+            self.assertEqual((cx >> shift, cy >> shift), lonlat_to_tile(30.3555, 76.3651, z))
+
+class TestTileCache(unittest.TestCase):
+
+    def test_invalidate_point_drops_covering_tiles(self):
+        """Test a new report evicts every zoom level's tile containing it"""
+        cache = TileCache(max_tiles=100, ttl=60)
+        near = lonlat_to_tile(30.3555, 76.3651, 12)
+        far = lonlat_to_tile(28.7041, 77.1025, 12)
+        cache.put((12, *near), ("*", None, None), {"features": []})
+        cache.put((12, *far), ("*", None, None), {"features": []})
+
+        cache.invalidate_point(30.3555, 76.3651)
+        self.assertIsNone(cache.get((12, *near), ("*", None, None)))
+        self.assertIsNotNone(cache.get((12, *far), ("*", None, None)))
+
+    def test_lru_bound(self):
+        """Test the cache keeps at most max_tiles tiles"""
+        cache = TileCache(max_tiles=2, ttl=60)
+        for x in range(3):
+            cache.put((5, x, 0), ("*", None, None), {"x": x})
+        self.assertIsNone(cache.get((5, 0, 0), ("*", None, None)))
+        self.assertEqual(cache.get((5, 2, 0), ("*", None, None)), {"x": 2})
+
+class TestStatsRollup(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        self.db = sessionmaker(bind=engine)()
+
+    def tearDown(self):
+        self.db.close()
+
+    def _ingest(self, day, zone=None):
+        detections = [
+            {'violations': [{'type': 'size', 'severity': 4}, {'type': 'license_missing', 'severity': 5}]},
+            {'violations': []},
+        ]
+        record_report_stats(self.db, datetime.fromisoformat(day), zone, detections)
+
+    def test_summary_counts(self):
+        """Test summary totals and breakdowns come from the rollup"""
+        self._ingest("2024-03-04T10:00:00")
+        self._ingest("2024-03-05T10:00:00", zone="commercial_zone_001")
+        record_violation_stats(self.db, "review:approved", 0, None)
+        self.db.commit()
+
+        summary = stats_summary(self.db)
+        self.assertEqual(summary["reports"], 2)
+        self.assertEqual(summary["detections"], 4)
+        self.assertEqual(summary["violations"], 5)
+        self.assertEqual(summary["violations_by_type"], {"size": 2, "license_missing": 2, "review:approved": 1})
+        self.assertEqual(summary["violations_by_zone"], {"unzoned": 3, "commercial_zone_001": 2})
+
+    def test_timeseries_buckets(self):
+        """Test daily and weekly buckets"""
+        for day in ("2024-03-04", "2024-03-05", "2024-03-11"):
+            self._ingest(day + "T08:00:00")
+        self.db.commit()
+
+        daily = stats_timeseries(self.db, "report", "day")
+        self.assertEqual([b["bucket"] for b in daily], ["2024-03-04", "2024-03-05", "2024-03-11"])
+        weekly = stats_timeseries(self.db, "violation", "week", vtype="size")
+        self.assertEqual(weekly, [{"bucket": "2024-03-04", "count": 2}, {"bucket": "2024-03-11", "count": 1}])
+
+    def test_rebuild_counts_report_tables(self):
+        """Test rebuild_stats backfills the rollup from reports stored before it existed"""
+        for i, (day, lat, lon) in enumerate((("2024-03-04", 30.3650, 76.3730), ("2024-03-05", 30.40, 76.40),
+                                              ("2024-03-12", 30.40, 76.40))):
+            self.db.add(models.Report(id=f"r{i}", captured_at=datetime.fromisoformat(day + "T09:00:00"), lat=lat, lon=lon))
+            self.db.add(models.Detection(id=f"d{i}", report_id=f"r{i}", confidence=0.9))
+            self.db.add(models.Violation(id=f"v{i}", detection_id=f"d{i}", type="size", reason="big", severity=4))
+        self.db.add(models.Violation(id="v-extra", detection_id="d0", type="license_missing", reason="none", severity=5))
+        self.db.commit()
+        self.assertEqual(stats_summary(self.db)["reports"], 0)
+
+        rebuild_stats(self.db)
+        self.db.commit()
+        summary = stats_summary(self.db)
+        self.assertEqual((summary["reports"], summary["detections"], summary["violations"]), (3, 3, 4))
+        self.assertEqual(summary["violations_by_zone"], {"commercial_zone_001": 2, "unzoned": 2})
+        self.assertEqual(stats_timeseries(self.db, "violation", "week", vtype="size"),
+                         [{"bucket": "2024-03-04", "count": 2}, {"bucket": "2024-03-11", "count": 1}])
+        self.assertEqual([b["bucket"] for b in stats_timeseries(self.db, "report", "day", zone="unzoned")],
+                         ["2024-03-05", "2024-03-12"])
+
+    def test_rebuild_streams_chunks(self):
+        """Test the rebuild zones reports one chunk at a time and counts the same as one pass"""
+        for i in range(5):
+            self.db.add(models.Report(id=f"r{i}", captured_at=datetime(2024, 3, 4 + i), lat=30.3650, lon=76.3730 + i * 0.01))
+        self.db.commit()
+        whole = aggregates.count_stats(self.db, chunk_size=100)
+        with mock.patch.object(aggregates, "zones_for_points", wraps=aggregates.zones_for_points) as zoned:
+            chunked = aggregates.count_stats(self.db, chunk_size=2)
+        self.assertEqual([len(c.args[0]) for c in zoned.call_args_list], [2, 2, 1])
+        self.assertEqual(chunked, whole)
+        self.assertEqual(sum(n for key, n in whole.items() if dict(key)["metric"] == "report"), 5)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
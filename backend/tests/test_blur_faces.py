@@ -0,0 +1,62 @@
+"""
+Unit tests for batch mode of the face_blur script
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+import numpy as np
+import cv2
+
+# face_blur/ is a standalone script next to the backend
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "face_blur"))
+
+import blur_faces
+
+class TestBatchJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmpdir.name, "survey")
+        os.makedirs(os.path.join(self.src, "day1"))
+        for name in ("a.jpg", os.path.join("day1", "b.png"), "notes.txt"):
+            path = os.path.join(self.src, name)
+            if name.endswith(".txt"):
+                open(path, "w").close()
+            else:
+                cv2.imwrite(path, np.full((40, 60, 3), 128, dtype=np.uint8))
+        self.out = os.path.join(self.src, "redacted")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def relative(self, jobs):
+        return sorted((os.path.relpath(i, self.src), os.path.relpath(o, self.out)) for i, o in jobs)
+
+    def test_nested_output_dir_not_walked(self):
+        """Test outputs written inside the input dir are not picked up as inputs on the next run"""
+        jobs, skipped = blur_faces.collect_jobs(self.src, self.out)
+        self.assertEqual(self.relative(jobs), [("a.jpg", "a.jpg"), (os.path.join("day1", "b.png"), os.path.join("day1", "b.png"))])
+        self.assertEqual(blur_faces.run_batch(self.src, self.out, workers=1), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.out, "day1", "b.png")))
+
+        jobs, skipped = blur_faces.collect_jobs(self.src, self.out)
+        self.assertEqual((jobs, skipped), ([], 2))
+        jobs, skipped = blur_faces.collect_jobs(self.src, self.out, force=True)
+        self.assertEqual(len(jobs), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.out, "redacted")))
+
+    def test_glob_skips_nested_output_dir(self):
+        """Test a recursive glob over the input ignores files under the output dir"""
+        blur_faces.run_batch(self.src, self.out, workers=1)
+        jobs, _ = blur_faces.collect_jobs(os.path.join(self.src, "**", "*.jpg"), self.out, force=True)
+        self.assertEqual(self.relative(jobs), [("a.jpg", "a.jpg")])
+
+    def test_output_same_as_input(self):
+        """Test redacting in place still lists every image"""
+        jobs, _ = blur_faces.collect_jobs(self.src, self.src, force=True)
+        self.assertEqual(len(jobs), 2)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
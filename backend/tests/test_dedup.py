@@ -0,0 +1,57 @@
+"""
+Unit tests for perceptual hashing and the near-duplicate index
+"""
+
+import unittest
+import sys
+import os
+import io
+import random
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+from app.dedup import dhash, hamming, BKTree
+
+def sample_image(seed=0, size=(640, 480)):
+    """Smooth random gradients so the hash has structure to latch onto"""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 255, (6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(coarse).resize(size, Image.BICUBIC)
+
+class TestDHash(unittest.TestCase):
+
+    def test_stable_under_resize_and_reencode(self):
+        """Test a resized, re-encoded copy stays within a few bits"""
+        img = sample_image()
+        buf = io.BytesIO()
+        img.resize((320, 240)).save(buf, format="JPEG", quality=60)
+        buf.seek(0)
+        self.assertLessEqual(hamming(dhash(img), dhash(Image.open(buf))), 4)
+
+    def test_different_images_far_apart(self):
+        """Test unrelated images differ in many bits"""
+        self.assertGreater(hamming(dhash(sample_image(1)), dhash(sample_image(2))), 10)
+
+class TestBKTree(unittest.TestCase):
+
+    def test_search_matches_brute_force(self):
+        """Test tree search returns exactly the hashes a linear scan finds"""
+        rnd = random.Random(7)
+        hashes = [rnd.getrandbits(64) for _ in range(500)]
+        hashes += [h ^ (1 << rnd.randrange(64)) for h in hashes[:50]]  # near neighbours
+        tree = BKTree()
+        for i, h in enumerate(hashes):
+            tree.add(h, i)
+        for q in hashes[:20] + [rnd.getrandbits(64) for _ in range(5)]:
+            expected = sorted(i for i, h in enumerate(hashes) if hamming(q, h) <= 8)
+            self.assertEqual(sorted(i for _, i in tree.search(q, 8)), expected)
+
+    def test_empty_tree(self):
+        """Test searching an empty tree"""
+        self.assertEqual(BKTree().search(0, 10), [])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
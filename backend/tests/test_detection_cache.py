@@ -0,0 +1,102 @@
+"""
+Unit tests for the detection result cache
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+from unittest import mock
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.detection_cache import DetectionCache
+from app import pipeline
+
+DIGEST = "ab" * 32
+DETS = [{'bbox': [0.1, 0.2, 0.5, 0.4], 'confidence': 0.9, 'ocr_text': "SALE", 'license_id': ""}]
+
+class TestDetectionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = DetectionCache(max_entries=2, directory=self.tmpdir.name)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_memory_hit_returns_copy(self):
+        """Test a stored result comes back equal but independent of the caller's objects"""
+        self.cache.put(DIGEST, "v1", DETS)
+        hit = self.cache.get(DIGEST, "v1")
+        self.assertEqual(hit, DETS)
+        hit[0]['confidence'] = 0.0
+        self.assertEqual(self.cache.get(DIGEST, "v1"), DETS)
+
+    def test_keyed_by_model_version(self):
+        """Test a result for one model version is a miss for another"""
+        self.cache.put(DIGEST, "v1", DETS)
+        self.assertIsNone(self.cache.get(DIGEST, "v2"))
+
+    def test_disk_tier(self):
+        """Test a fresh process-level cache finds results written by another"""
+        self.cache.put(DIGEST, "model/v1", DETS)
+        other = DetectionCache(max_entries=2, directory=self.tmpdir.name)
+        self.assertEqual(other.get(DIGEST, "model/v1"), DETS)
+        self.assertEqual(other.stats()['disk_hits'], 1)
+        self.assertEqual(other.get(DIGEST, "model/v1"), DETS)
+        self.assertEqual(other.stats()['memory_hits'], 1)
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry leaves memory first"""
+        memory_only = DetectionCache(max_entries=2, directory=None)
+        for digest in ("a", "b"):
+            memory_only.put(digest, "v1", DETS)
+        memory_only.get("a", "v1")
+        memory_only.put("c", "v1", DETS)
+        self.assertIsNone(memory_only.get("b", "v1"))
+        self.assertIsNotNone(memory_only.get("a", "v1"))
+        self.assertEqual(memory_only.stats()['entries'], 2)
+
+    def test_hit_rate(self):
+        """Test the hit rate counts memory and disk hits against all lookups"""
+        self.cache.get(DIGEST, "v1")
+        self.cache.put(DIGEST, "v1", DETS)
+        self.cache.get(DIGEST, "v1")
+        stats = self.cache.stats()
+        self.assertEqual((stats['lookups'], stats['misses'], stats['stores']), (2, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+class TestPipelineCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DetectionCache(directory=None)
+        patcher = mock.patch.object(pipeline, "detection_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.raw_path = os.path.join("data", "raw", DIGEST[:2], DIGEST[2:4], f"{DIGEST}.jpg")
+
+    def test_resubmitted_image_skips_inference(self):
+        """Test the second lookup for the same content returns the stored detections"""
+        key, hit = pipeline.cached_detections(self.raw_path)
+        self.assertEqual(key, (DIGEST, pipeline.detector_model_version()))
+        self.assertIsNone(hit)
+        pipeline.remember_detections(key, hit, DETS)
+        self.assertEqual(pipeline.cached_detections(self.raw_path), (key, DETS))
+        with mock.patch.object(pipeline, "analyze_billboard_images") as analyze:
+            self.assertEqual(pipeline.detect_stage([mock.Mock()], [DETS]), [DETS])
+            analyze.assert_not_called()
+
+    def test_client_detections_not_cached(self):
+        """Test client-supplied detections, including an empty list, bypass the cache"""
+        self.assertEqual(pipeline.cached_detections(self.raw_path, DETS), (None, DETS))
+        self.assertEqual(pipeline.cached_detections(self.raw_path, []), (None, []))
+        with mock.patch.object(pipeline, "analyze_billboard_images") as analyze:
+            self.assertEqual(pipeline.detect_stage([mock.Mock()], [[]]), [[]])
+            analyze.assert_not_called()
+        self.assertEqual(self.cache.stats()['lookups'], 0)
+        self.assertEqual(self.cache.stats()['stores'], 0)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
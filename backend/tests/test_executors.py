@@ -0,0 +1,75 @@
+"""
+Unit tests for ingest executors and admission control
+"""
+
+import unittest
+import asyncio
+import threading
+import sys
+import os
+from fastapi import HTTPException
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.executors import IngestExecutors
+
+class TestAdmission(unittest.TestCase):
+
+    def setUp(self):
+        self.ex = IngestExecutors(threads=2, processes=0, max_inflight=2, max_per_client=1, retry_after=7)
+
+    def tearDown(self):
+        self.ex.shutdown()
+
+    def test_per_client_limit(self):
+        """Test a second concurrent request from the same client gets 429 with Retry-After"""
+        with self.ex.admit("ip:a"):
+            with self.assertRaises(HTTPException) as cm:
+                with self.ex.admit("ip:a"):
+                    pass
+        self.assertEqual(cm.exception.status_code, 429)
+        self.assertEqual(cm.exception.headers["Retry-After"], "7")
+
+    def test_global_limit(self):
+        """Test requests beyond max_inflight get 503"""
+        with self.ex.admit("ip:a"), self.ex.admit("ip:b"):
+            with self.assertRaises(HTTPException) as cm:
+                with self.ex.admit("ip:c"):
+                    pass
+        self.assertEqual(cm.exception.status_code, 503)
+
+    def test_slots_released(self):
+        """Test slots are returned after success and after errors"""
+        with self.ex.admit("ip:a"):
+            pass
+        with self.assertRaises(ValueError):
+            with self.ex.admit("ip:a"):
+                raise ValueError("boom")
+        self.assertEqual(self.ex.inflight, 0)
+        with self.ex.admit("ip:a"):
+            self.assertEqual(self.ex.inflight, 1)
+
+class TestPools(unittest.TestCase):
+
+    def test_run_io_off_event_loop(self):
+        """Test blocking work runs on a pool thread, not the loop thread"""
+        ex = IngestExecutors(threads=1, processes=0)
+        try:
+            loop_thread = threading.get_ident()
+            worker_thread = asyncio.run(ex.run_io(threading.get_ident))
+            self.assertNotEqual(worker_thread, loop_thread)
+            self.assertIsNone(ex.pixels)
+        finally:
+            ex.shutdown()
+
+    def test_process_pool(self):
+        """Test pixel work can be submitted to the process pool"""
+        ex = IngestExecutors(threads=1, processes=1)
+        try:
+            self.assertEqual(ex.pixels.submit(pow, 2, 10).result(timeout=60), 1024)
+        finally:
+            ex.shutdown()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
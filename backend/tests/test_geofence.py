@@ -0,0 +1,152 @@
+"""
+Unit tests for GeoJSON geofence zones and their indexed buffers
+"""
+
+import unittest
+import sys
+import os
+import json
+import tempfile
+import threading
+import numpy as np
+from shapely.geometry import Point, box
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.geofence import BillboardGeofence, load_zones, get_geofence, validate_billboard_location
+from app.aggregates import zones_for_points
+from app.util import distance_m
+
+def zone_feature(zone_id, lon0, lat0, lon1, lat1, buffer_m=0, prohibited=True, **props):
+    rules = {"buffer_distance_m": buffer_m, "reason": "test"} if buffer_m else {"reason": "test"}
+    return {"type": "Feature", "geometry": box(lon0, lat0, lon1, lat1).__geo_interface__,
+            "properties": {"zone_id": zone_id, "name": zone_id, "max_billboards": 0, "size_limit_m2": 10.0,
+                           "prohibited": prohibited, "special_rules": rules, **props}}
+
+def write_zones(features):
+    f = tempfile.NamedTemporaryFile("w", suffix=".geojson", delete=False)
+    json.dump({"type": "FeatureCollection", "features": features}, f)
+    f.close()
+    return f.name
+
+class TestGeofenceZones(unittest.TestCase):
+
+    def setUp(self):
+        self.geofence = BillboardGeofence()
+
+    def test_bundled_zones_use_lon_lat_order(self):
+        """Test the bundled zones match points given as lat, lon"""
+        self.assertEqual(len(self.geofence.restricted_zones), 4)
+        self.assertEqual(self.geofence.zone_for_point(30.3550, 76.3630).zone_id, "school_buffer_001")
+        self.assertEqual(self.geofence.zone_for_point(30.3650, 76.3730).zone_id, "commercial_zone_001")
+        self.assertIsNone(self.geofence.zone_for_point(76.3630, 30.3550))
+
+    def test_prohibited_zone(self):
+        """Test a point in a prohibited zone stays prohibited with other violations present"""
+        result = self.geofence.check_location_compliance(30.3550, 76.3630)
+        self.assertEqual(result["compliance_status"], "prohibited")
+        self.assertEqual(result["zone_info"]["zone_id"], "school_buffer_001")
+        self.assertEqual(result["violations"][0]["type"], "prohibited_zone")
+
+    def test_zone_buffer_violation(self):
+        """Test buffer_distance_m applies just outside a zone and not beyond it"""
+        # about 67 m north of the school zone's edge, inside its 100 m buffer
+        result = self.geofence.check_location_compliance(30.3561, 76.3630)
+        buffers = [v for v in result["violations"] if v["location"] == "Government Model Senior Secondary School Buffer"]
+        self.assertEqual(len(buffers), 1)
+        self.assertEqual(buffers[0]["type"], "buffer_violation")
+        self.assertAlmostEqual(buffers[0]["actual_distance"], distance_m(30.3555, 76.3630, 30.3561, 76.3630), delta=0.5)
+        self.assertEqual(result["zone_info"]["zone_id"], None)
+        far = self.geofence.check_location_compliance(30.3566, 76.3630)
+        self.assertFalse(any(v["location"] == "Government Model Senior Secondary School Buffer" for v in far["violations"]))
+
+    def test_zone_size_limit(self):
+        """Test the area limit in a permitted zone"""
+        result = self.geofence.check_location_compliance(30.3650, 76.3730, billboard_area_m2=60)
+        self.assertEqual(result["compliance_status"], "non_compliant")
+        self.assertEqual(result["violations"][0]["type"], "size_exceeds_zone_limit")
+
+    def test_index_matches_brute_force(self):
+        """Test indexed zone and buffer lookups against shapely checks on every zone"""
+        rng = np.random.default_rng(0)
+        features = []
+        for i, (lon, lat) in enumerate(rng.uniform([76.30, 30.30], [76.42, 30.40], (2000, 2)).tolist()):
+            features.append(zone_feature(f"z{i}", lon, lat, lon + 0.001, lat + 0.0008, buffer_m=float(rng.choice([0, 50, 150]))))
+        path = write_zones(features)
+        try:
+            geofence = BillboardGeofence(zones_path=path)
+        finally:
+            os.remove(path)
+        self.assertEqual(len(geofence.restricted_zones), 2000)
+        for lat, lon in rng.uniform([30.30, 76.30], [30.40, 76.42], (100, 2)).tolist():
+            inside = [i for i, z in enumerate(geofence.restricted_zones) if z.geometry.intersects(Point(lon, lat))]
+            zone = geofence.zone_for_point(lat, lon)
+            self.assertEqual(zone.zone_id if zone else None, f"z{inside[0]}" if inside else None)
+            _, zone_idx, hit_inside, distance = geofence._locate(lat, lon)
+            for z, d in zip(zone_idx[~hit_inside].tolist(), distance[~hit_inside].tolist()):
+                self.assertLess(d, geofence.restricted_zones[z].buffer_distance_m + 1e-6)
+
+    def test_malformed_and_empty_zone_files(self):
+        """Test malformed features are skipped and an empty file gives no zones"""
+        path = write_zones([zone_feature("ok", 76.36, 30.35, 76.37, 30.36),
+                            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [76.36, 30.35]},
+                             "properties": {"zone_id": "point"}},
+                            {"type": "Feature", "geometry": box(0, 0, 1, 1).__geo_interface__, "properties": {}}])
+        try:
+            self.assertEqual([z.zone_id for z in load_zones(path)], ["ok"])
+        finally:
+            os.remove(path)
+        path = write_zones([])
+        try:
+            geofence = BillboardGeofence(zones_path=path)
+        finally:
+            os.remove(path)
+        self.assertIsNone(geofence.zone_for_point(30.355, 76.363))
+        self.assertEqual(geofence.check_location_compliance(30.40, 76.40)["compliance_status"], "compliant")
+
+class TestGeofenceBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.geofence = get_geofence()
+
+    def test_batch_matches_single_checks(self):
+        """Test validate_locations equals one check_location_compliance per point"""
+        rng = np.random.default_rng(3)
+        # around the bundled zones and sensitive locations, so most points hit something
+        points = [(lat, lon, area) for lat, lon, area in
+                  rng.uniform([30.351, 76.357, 0], [30.367, 76.375, 60], (400, 3)).tolist()]
+        batch = self.geofence.validate_locations(points)
+        self.assertEqual(len(batch), len(points))
+        self.assertTrue(any(r["violations"] for r in batch))
+        for point, result in zip(points, batch):
+            self.assertEqual(result, self.geofence.check_location_compliance(*point))
+
+    def test_batch_input_shapes(self):
+        """Test lat/lon pairs, an ndarray and an empty batch"""
+        self.assertEqual(self.geofence.validate_locations([]), [])
+        pairs = self.geofence.validate_locations([(30.3550, 76.3630), (30.40, 76.40)])
+        self.assertEqual([r["compliance_status"] for r in pairs], ["prohibited", "compliant"])
+        array = self.geofence.validate_locations(np.array([[30.3650, 76.3730, 60.0]]))
+        self.assertEqual(array[0]["violations"][0]["type"], "size_exceeds_zone_limit")
+
+    def test_zones_for_points(self):
+        """Test batch zone lookup, including reports without coordinates"""
+        zones = zones_for_points([30.3550, None, 30.40, 30.3650], [76.3630, 76.3630, 76.40, 76.3730])
+        self.assertEqual(zones, ["school_buffer_001", None, None, "commercial_zone_001"])
+
+    def test_singleton_shared_across_threads(self):
+        """Test every thread gets the same geofence and validate_billboard_location reuses it"""
+        seen = []
+        threads = [threading.Thread(target=lambda: seen.append(get_geofence())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(all(g is self.geofence for g in seen))
+        result = validate_billboard_location(30.3550, 76.3630, license_id="LIC-CHD-001")
+        self.assertEqual(result["location_compliance"]["compliance_status"], "prohibited")
+        self.assertEqual(result["overall_status"], "non_compliant")
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
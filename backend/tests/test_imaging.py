@@ -0,0 +1,93 @@
+"""
+Unit tests for the shared image context
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+from unittest import mock
+from PIL import Image
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import imaging, pipeline
+from app.storage import BlobStore
+from app.imaging import ImageContext, fit_size, track_stage
+from app.detection import analyze_billboard_image
+
+class TestImageContext(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "photo.jpg")
+        Image.new('RGB', (1600, 1200), color='navy').save(self.path, format='JPEG')
+        self.opens = mock.patch.object(imaging.Image, 'open', wraps=Image.open)
+        self.open_mock = self.opens.start()
+
+    def tearDown(self):
+        self.opens.stop()
+        self.tmpdir.cleanup()
+
+    def test_single_decode(self):
+        """Test repeated access decodes the file once"""
+        ctx = ImageContext(self.path)
+        first = ctx.image()
+        self.assertIs(ctx.image(), first)
+        self.assertEqual(ctx.size, (1600, 1200))
+        ctx.scaled(200)
+        self.assertEqual(self.open_mock.call_count, 1)
+
+    def test_scaled_before_full_decode(self):
+        """Test a downsampled copy can be produced without a full-resolution decode"""
+        ctx = ImageContext(self.path)
+        small = ctx.scaled(128)
+        self.assertEqual(small.size, (128, 96))
+        self.assertIs(ctx.scaled(128), small)
+        self.assertIsNone(ctx._full)
+
+    def test_detection_opens_once(self):
+        """Test detection with OCR crops and size estimation reuses the decode from redaction"""
+        ctx = ImageContext(self.path)
+        ctx.image()
+        for _ in range(5):
+            analyze_billboard_image(ctx)
+        self.assertEqual(self.open_mock.call_count, 1)
+
+    def test_render_and_detect_decodes_once(self):
+        """Test redaction and detection share one decode per upload"""
+        store = BlobStore(os.path.join(self.tmpdir.name, "public"))
+        with mock.patch.object(pipeline, 'public_store', store):
+            rendered = pipeline.render_and_detect(self.path)
+        self.assertEqual(self.open_mock.call_count, 1)
+        self.assertTrue(rendered.redacted.path.startswith(store.root))
+        self.assertIsInstance(rendered.detections, list)
+
+    def test_decode_bounded_to_max_edge(self):
+        """Test large photos are reduced while decoding and keep their native size"""
+        ctx = ImageContext(self.path, max_edge=400)
+        self.assertEqual(ctx.image().size, (400, 300))
+        self.assertEqual(ctx.size, (1600, 1200))
+
+    def test_refuses_decompression_bomb(self):
+        """Test images above the pixel cap are rejected before decoding"""
+        with mock.patch.object(imaging, 'MAX_DECODE_PIXELS', 1000):
+            with self.assertRaises(Image.DecompressionBombError):
+                ImageContext(self.path).image()
+
+    def test_track_stage(self):
+        """Test per-stage memory figures are recorded"""
+        ctx = ImageContext(self.path)
+        with track_stage(ctx, "decode"):
+            ctx.image()
+        self.assertAlmostEqual(ctx.memory["decode"]["pixels_mb"], 1600 * 1200 * 3 / 1024 / 1024, places=0)
+        self.assertGreater(ctx.memory["decode"]["rss_mb"], 0)
+
+    def test_fit_size(self):
+        """Test size fitting keeps aspect ratio and never upscales"""
+        self.assertEqual(fit_size((4000, 3000), 1000), (1000, 750))
+        self.assertEqual(fit_size((300, 200), 1000), (300, 200))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,125 @@
+"""
+Unit tests for the local report processing queue
+"""
+
+import unittest
+import queue
+import threading
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.jobs import Job, ReportJobQueue, PRIORITY_INSPECTOR, PRIORITY_CITIZEN, priority_for_role
+
+class _RefillingQueue(queue.PriorityQueue):
+    """Stands in for submitters that take every slot a get() frees"""
+    refill = []
+
+    def _get(self):
+        entry = super()._get()
+        if self.refill:
+            self._put(self.refill.pop(0))
+        return entry
+
+class TestReportJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = ReportJobQueue(workers=1, max_size=10)
+        self.gate = threading.Event()
+        self.done = threading.Event()
+        self.order = []
+
+    def tearDown(self):
+        self.gate.set()
+        self.queue.stop()
+
+    def _record(self, name):
+        self.order.append(name)
+        if len(self.order) == 4:
+            self.done.set()
+
+    def test_inspector_jobs_jump_ahead(self):
+        """Test inspector jobs run before earlier citizen jobs"""
+        # Occupy the single worker so the rest queue up behind it
+        started = threading.Event()
+        self.queue.submit("blocker", lambda: (started.set(), self.gate.wait(5), self._record("blocker")))
+        self.assertTrue(started.wait(5))
+        self.queue.submit("citizen-1", self._record, "citizen-1", priority=PRIORITY_CITIZEN)
+        self.queue.submit("citizen-2", self._record, "citizen-2", priority=PRIORITY_CITIZEN)
+        self.queue.submit("inspector", self._record, "inspector", priority=PRIORITY_INSPECTOR)
+
+        self.assertEqual(self.queue.status("citizen-2")["queue_position"], 2)
+        self.gate.set()
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.order, ["blocker", "inspector", "citizen-1", "citizen-2"])
+        self.assertEqual(self.queue.status("inspector")["state"], "done")
+
+    def test_failed_job_records_error(self):
+        """Test a raising job is marked failed with its error"""
+        def boom():
+            try:
+                raise RuntimeError("redaction failed")
+            finally:
+                self.done.set()
+        self.queue.submit("bad", boom)
+        self.assertTrue(self.done.wait(5))
+        self.queue.stop()
+        status = self.queue.status("bad")
+        self.assertEqual(status["state"], "failed")
+        self.assertIn("redaction failed", status["error"])
+
+    def test_batch_runner_groups_ready_jobs(self):
+        """Test ready jobs sharing a batch runner run in one call, in order, with per-job results"""
+        calls = []
+        def run_batch(jobs):
+            calls.append([j.job_id for j in jobs])
+            return [ValueError("bad image") if j.job_id == "b" else j.job_id for j in jobs]
+
+        started = threading.Event()
+        self.queue.submit("blocker", lambda: (started.set(), self.gate.wait(5)))
+        self.assertTrue(started.wait(5))
+        for name in ("a", "b", "c"):
+            self.queue.submit(name, self._record, name, batch=run_batch)
+        self.queue.submit("plain", self._record, "plain")
+        self.queue.submit("d", self._record, "d", batch=run_batch)
+        self.gate.set()
+        self.queue.stop()
+        self.assertEqual(calls, [["a", "b", "c", "d"]])
+        self.assertEqual(self.order, ["plain"])
+        self.assertEqual(self.queue.status("b")["state"], "failed")
+        self.assertIn("bad image", self.queue.status("b")["error"])
+        self.assertEqual([self.queue.status(j)["state"] for j in ("a", "c", "d", "plain")], ["done"] * 4)
+
+    def test_batching_with_full_queue(self):
+        """Test gathering a batch from a full queue never blocks on re-queueing other jobs"""
+        jobs = ReportJobQueue(workers=1, max_size=4, batch_size=4)
+        jobs._queue = _RefillingQueue(maxsize=4)
+        run_batch = lambda batch: [j.job_id for j in batch]
+        first = Job("a", PRIORITY_CITIZEN, self._record, batch=run_batch, seq=0)
+        queued = [Job("plain-1", PRIORITY_CITIZEN, self._record, seq=1),
+                  Job("b", PRIORITY_CITIZEN, self._record, batch=run_batch, seq=2),
+                  Job("plain-2", PRIORITY_CITIZEN, self._record, seq=3),
+                  Job("c", PRIORITY_CITIZEN, self._record, batch=run_batch, seq=4)]
+        for job in queued:
+            jobs._queue.put_nowait((job.priority, job.seq, job))
+        jobs._queue.refill = [(PRIORITY_CITIZEN, 10 + i, Job(f"late-{i}", PRIORITY_CITIZEN, self._record, seq=10 + i))
+                              for i in range(4)]
+
+        taken = []
+        worker = threading.Thread(target=lambda: taken.extend(jobs._take_batch(first)), daemon=True)
+        worker.start()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual([j.job_id for j in taken], ["a", "b", "c"])
+        self.assertEqual([entry[2].job_id for entry in sorted(jobs._queue.queue)], ["plain-1", "plain-2"])
+
+    def test_role_priority(self):
+        """Test role to priority mapping"""
+        self.assertEqual(priority_for_role("inspector"), PRIORITY_INSPECTOR)
+        self.assertEqual(priority_for_role("citizen"), PRIORITY_CITIZEN)
+        self.assertEqual(priority_for_role(None), PRIORITY_CITIZEN)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
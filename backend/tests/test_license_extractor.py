@@ -0,0 +1,50 @@
+"""
+Unit tests for the compiled license extractor
+"""
+
+import unittest
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ocr import LicenseExtractor, BillboardOCR, license_extractor
+
+class TestLicenseExtractor(unittest.TestCase):
+
+    def test_all_formats_in_one_pass(self):
+        """Test every license format is found in order of appearance"""
+        text = "MEGA SALE LIC-CHD-001 CH/2024/156 ADV-240001 PERMIT-2024-078"
+        self.assertEqual(license_extractor.extract(text), ["LIC-CHD-001", "CH/2024/156", "ADV-240001", "PERMIT-2024-078"])
+
+    def test_normalizes_case_and_spacing(self):
+        """Test OCR output with lower case and spaced separators is normalized"""
+        self.assertEqual(license_extractor.extract("call now lic - chd-002 or ch / 2024 / 289"), ["LIC-CHD-002", "CH/2024/289"])
+
+    def test_duplicates_collapse(self):
+        """Test the same license written twice is returned once"""
+        self.assertEqual(license_extractor.extract("LIC-CHD-001 lic-chd-001"), ["LIC-CHD-001"])
+
+    def test_batch(self):
+        """Test the batch API keeps one result per input, including empty rows"""
+        self.assertEqual(license_extractor.extract_many(["ADV-240001", None, "", "NO LICENSE HERE"]),
+                         [["ADV-240001"], [], [], []])
+
+    def test_custom_patterns(self):
+        """Test the extractor compiles any named set of formats"""
+        extractor = LicenseExtractor({'ward': r'WARD-\d{2}'})
+        self.assertEqual(extractor.extract("ward - 07"), ["WARD-07"])
+        self.assertEqual(extractor.match("WARD-07"), "ward")
+
+    def test_verify_license_format(self):
+        """Test format verification reports the matching pattern and the normalized license"""
+        ocr = BillboardOCR()
+        result = ocr.verify_license_format("permit-2024-001")
+        self.assertTrue(result["valid_format"])
+        self.assertEqual(result["pattern"], r'PERMIT-\d{4}-\d{3}')
+        self.assertEqual(result["license"], "PERMIT-2024-001")
+        self.assertFalse(ocr.verify_license_format("SALE")["valid_format"])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
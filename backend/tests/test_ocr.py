@@ -0,0 +1,69 @@
+"""
+Unit tests for region-based OCR
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+from unittest import mock
+from PIL import Image
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.imaging import ImageContext
+from app import ocr, detection
+
+class TestRegionOCR(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmpdir.name, "street.jpg")
+        Image.new('RGB', (2000, 1000), color='navy').save(cls.path, format='JPEG')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_crops_follow_bboxes(self):
+        """Test each crop covers its bbox plus margin, in grayscale"""
+        crops = ocr.crop_regions(ImageContext(self.path), [[0.1, 0.1, 0.3, 0.2], [0.0, 0.9, 1.0, 1.0]])
+        self.assertEqual(crops[0].mode, "L")
+        self.assertEqual(crops[0].size, (480, 140))
+        self.assertEqual(crops[1].size, (1024, 61))  # clipped to the frame, then bounded by OCR_CROP_MAX_EDGE
+
+    def test_degenerate_bbox(self):
+        """Test an empty bbox still yields a crop instead of failing"""
+        crop, = ocr.crop_regions(ImageContext(self.path), [[1.0, 1.0, 1.0, 1.0]])
+        self.assertGreater(crop.width * crop.height, 0)
+
+    def test_one_result_per_region(self):
+        """Test the batch API returns a result per bbox and nothing for no bboxes"""
+        results = ocr.extract_region_text(ImageContext(self.path), [[0.1, 0.1, 0.3, 0.2]] * 3)
+        self.assertEqual(len(results), 3)
+        for res in results:
+            self.assertIn("full_text", res)
+            self.assertIn("license_numbers", res)
+        self.assertEqual(ocr.extract_region_text(self.path, []), [])
+
+    def test_engine_reused(self):
+        """Test OCR calls share the module engine instead of building a new one"""
+        with mock.patch.object(ocr.BillboardOCR, "__init__", side_effect=AssertionError("engine rebuilt")):
+            ocr.extract_billboard_text(self.path)
+            ocr.extract_region_text(self.path, [[0.1, 0.1, 0.3, 0.2]])
+
+    def test_detector_runs_one_ocr_batch(self):
+        """Test every detection in an image is read in a single batched OCR call"""
+        ctx = ImageContext(self.path)
+        with mock.patch.object(ocr.ocr_engine, "extract_text_from_crops", wraps=ocr.ocr_engine.extract_text_from_crops) as batch:
+            dets = detection.detector.detect_billboards(ctx)
+        batch.assert_called_once()
+        self.assertEqual(len(batch.call_args[0][0]), len(dets))
+        for det in dets:
+            self.assertIn('ocr_text', det)
+            self.assertIn('license_id', det)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
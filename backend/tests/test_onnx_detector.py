@@ -0,0 +1,99 @@
+"""
+Unit tests for the ONNX Runtime detector backend
+"""
+
+import unittest
+import tempfile
+import threading
+import sys
+import os
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.imaging import ImageContext
+from app.onnx_detector import letterbox, MicroBatcher, ort
+
+MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tiny_detector.onnx")
+
+class TestLetterbox(unittest.TestCase):
+
+    def test_pads_short_side(self):
+        """Test a wide image is scaled to fit and centred vertically"""
+        tensor, scale, pad = letterbox(Image.new('RGB', (128, 64), color='white'), 64)
+        self.assertEqual(tensor.shape, (3, 64, 64))
+        self.assertEqual((scale, pad), (0.5, (0, 16)))
+        self.assertAlmostEqual(float(tensor[0, 0, 0]), 114 / 255, places=5)
+        self.assertEqual(float(tensor[0, 32, 32]), 1.0)
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_coalesces_concurrent_calls(self):
+        """Test concurrent submissions are answered correctly from shared batched calls"""
+        calls = []
+        def run(items):
+            calls.append(len(items))
+            return [i * 2 for i in items]
+        batcher = MicroBatcher(run, max_batch=8, max_wait_s=0.05)
+        results = {}
+        threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher.submit(i))) for i in range(6)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        self.assertEqual(results, {i: i * 2 for i in range(6)})
+        self.assertEqual(sum(calls), 6)
+        self.assertLess(len(calls), 6)
+
+    def test_propagates_errors(self):
+        """Test an exception in the batch reaches the caller"""
+        def run(items):
+            raise ValueError("bad batch")
+        with self.assertRaises(ValueError):
+            MicroBatcher(run, max_wait_s=0).submit(1)
+
+@unittest.skipIf(ort is None, "onnxruntime not installed")
+class TestOnnxBillboardDetector(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from app.onnx_detector import OnnxBillboardDetector
+        from app.detection import ModelBillboardDetector
+        cls.backend = OnnxBillboardDetector(MODEL, intra_op_threads=1)
+        cls.detector = ModelBillboardDetector(cls.backend)
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmpdir.name, "wide.jpg")
+        Image.new('RGB', (1280, 640), color='gray').save(cls.path, format='JPEG')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_boxes_normalized_to_original_image(self):
+        """Test letterbox padding is removed and boxes are normalized to the photo"""
+        boxes = self.backend.detect_boxes(ImageContext(self.path))
+        self.assertEqual(len(boxes), 1)  # duplicate suppressed, plate class and weak box dropped
+        bbox, score = boxes[0]
+        np.testing.assert_allclose(bbox, [12 / 64, 0.0, 52 / 64, 9 / 32], atol=1e-6)
+        self.assertAlmostEqual(score, 0.9, places=5)
+
+    def test_batch_matches_single(self):
+        """Test batched inference returns the same boxes as single-image calls"""
+        single = self.backend.detect_boxes(ImageContext(self.path))
+        batch = self.backend.detect_boxes_batch([ImageContext(self.path) for _ in range(3)])
+        self.assertEqual(batch, [single] * 3)
+
+    def test_detection_dicts(self):
+        """Test backend boxes are described like mock detections"""
+        dets = self.detector.detect_billboards(ImageContext(self.path))
+        self.assertEqual(len(dets), 1)
+        for key in ('bbox', 'corners', 'est_width_m', 'est_height_m', 'confidence', 'ocr_text', 'license_id'):
+            self.assertIn(key, dets[0])
+        self.assertTrue(self.backend.model_version.startswith("tiny_detector-"))
+
+    def test_warmup(self):
+        """Test warm-up runs a dummy batch"""
+        self.detector.warmup()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
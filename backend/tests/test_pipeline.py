@@ -0,0 +1,148 @@
+"""
+Unit tests for batched rendering and detection in the report pipeline
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+import json
+from unittest import mock
+from PIL import Image
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import models, pipeline
+from app.db import Base
+from app.dedup import NearDuplicateIndex
+from app.storage import BlobStore
+from app.detection import analyze_billboard_images
+
+SUPPLIED = [{"bbox": [0.1, 0.1, 0.5, 0.4], "license_id": "LIC-CHD-001"}]
+
+class TestRenderBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i, color in enumerate(('navy', 'olive', 'teal', 'maroon', 'gray')):
+            path = os.path.join(self.tmpdir.name, f"photo-{i}.jpg")
+            Image.new('RGB', (640, 480), color=color).save(path, format='JPEG')
+            self.paths.append(path)
+        self.store = BlobStore(os.path.join(self.tmpdir.name, "public"))
+        self.analyze = mock.Mock(wraps=analyze_billboard_images)
+        for patcher in (mock.patch.object(pipeline, 'public_store', self.store),
+                        mock.patch.object(pipeline.detection_cache, 'enabled', False),
+                        mock.patch.object(pipeline, 'analyze_billboard_images', self.analyze)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_one_inference_call_per_batch(self):
+        """Test uploads without detections share one batched call and supplied ones skip it"""
+        items = [(self.paths[0], None), (self.paths[1], SUPPLIED), (self.paths[2], None)]
+        results = pipeline.render_and_detect_batch(items)
+        self.assertEqual(self.analyze.call_count, 1)
+        self.assertEqual([ctx.path for ctx in self.analyze.call_args[0][0]], [self.paths[0], self.paths[2]])
+        self.assertEqual(results[1].detections, SUPPLIED)
+        for res in results:
+            self.assertTrue(res.redacted.path.startswith(self.store.root))
+
+    def test_failures_stay_per_item(self):
+        """Test an unreadable upload fails alone and a failed inference fails only its uploads"""
+        broken = os.path.join(self.tmpdir.name, "broken.jpg")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+        results = pipeline.render_and_detect_batch([(self.paths[0], None), (broken, None)])
+        self.assertIsInstance(results[0], pipeline.RenderedUpload)
+        self.assertIsInstance(results[1], pipeline.RedactionError)
+
+        self.analyze.side_effect = RuntimeError("model unavailable")
+        results = pipeline.render_and_detect_batch([(self.paths[0], None), (self.paths[1], SUPPLIED)])
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertEqual(results[1].detections, SUPPLIED)
+
+    def test_prepare_reports_chunks(self):
+        """Test uploads are split across workers in chunks of at most PIPELINE_BATCH_SIZE"""
+        items = [(path, None) for path in self.paths]
+        with mock.patch.object(pipeline, 'PIPELINE_BATCH_SIZE', 2):
+            results = pipeline.prepare_reports(items, workers=4)
+        self.assertEqual(sorted(len(c[0][0]) for c in self.analyze.call_args_list), [1, 2, 2])
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(isinstance(r, pipeline.RenderedUpload) for r in results))
+
+class TestPrepareUploads(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.paths = []
+        for i in range(3):
+            # Flat colours all hash to 0; noise gives each photo its own hash
+            path = os.path.join(self.tmpdir.name, f"photo-{i}.jpg")
+            Image.effect_noise((320, 240), 64).convert('RGB').save(path, format='JPEG')
+            self.paths.append(path)
+        self.store = BlobStore(os.path.join(self.tmpdir.name, "public"))
+        self.analyze = mock.Mock(wraps=analyze_billboard_images)
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/test.db")
+        Base.metadata.create_all(engine)
+        self.addCleanup(engine.dispose)
+        self.db = sessionmaker(bind=engine)()
+        self.addCleanup(self.db.close)
+        for patcher in (mock.patch.object(pipeline, 'public_store', self.store),
+                        mock.patch.object(pipeline.detection_cache, 'enabled', False),
+                        mock.patch.object(pipeline, 'analyze_billboard_images', self.analyze),
+                        mock.patch.object(pipeline, 'duplicate_index', NearDuplicateIndex()),
+                        mock.patch.object(pipeline, 'DEDUP_ENABLED', True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.rendered = []
+
+    def render(self, indices):
+        self.rendered.append(list(indices))
+        return pipeline.render_and_detect_batch([(self.uploads[i][1], None) for i in indices])
+
+    def prepare(self, uploads):
+        self.uploads = uploads
+        return pipeline.prepare_uploads(self.db, uploads, self.render)
+
+    def test_stored_duplicate_skips_pixel_stages(self):
+        """Test a near-duplicate of a stored report is not redacted or detected and reuses its image"""
+        phash = pipeline.hash_batch([self.paths[0]])[0]
+        renditions = {"thumb": {"width": 64, "height": 48, "webp": "t.webp", "jpeg": "t.jpg"}}
+        self.db.add(models.Report(id="orig", captured_at=datetime.utcnow(), lat=30.40, lon=76.40, img_uri="orig.jpg",
+                                  renditions=json.dumps(renditions), phash=f"{phash:016x}"))
+        self.db.commit()
+        results = self.prepare([("copy", self.paths[0], 30.40, 76.40), ("other", self.paths[1], 30.40, 76.40)])
+        self.assertEqual(self.rendered, [[1]])
+        self.assertEqual(self.analyze.call_count, 1)
+        self.assertEqual((results[0].duplicate_of, results[0].detections), ("orig", []))
+        self.assertEqual((results[0].redacted.path, results[0].redacted.renditions), ("orig.jpg", renditions))
+        self.assertEqual(results[0].phash, phash)
+        self.assertIsNone(results[1].duplicate_of)
+        self.assertTrue(results[1].redacted.path.startswith(self.store.root))
+
+    def test_duplicate_within_call(self):
+        """Test a repeated photo in one call reuses the first rendering, and is rendered itself if that fails"""
+        uploads = [("a", self.paths[2], 30.40, 76.40), ("b", self.paths[2], 30.40, 76.40), ("far", self.paths[2], 31.0, 77.0)]
+        results = self.prepare(uploads)
+        self.assertEqual(self.rendered, [[0, 2]])
+        self.assertEqual(results[1].duplicate_of, "a")
+        self.assertEqual(results[1].redacted, results[0].redacted)
+
+        self.rendered = []
+        self.analyze.side_effect = [RuntimeError("model unavailable"), [[]]]
+        results = self.prepare(uploads[:2])
+        self.assertEqual(self.rendered, [[0], [1]])
+        self.assertIsInstance(results[0], RuntimeError)
+        self.assertIsNone(results[1].duplicate_of)
+        self.assertEqual(results[1].detections, [])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,76 @@
+"""
+Unit tests for vectorized detector post-processing
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.postprocess import (decode, nms, postprocess, normalize_boxes, reference_postprocess,
+                             synthetic_output)
+
+# Four anchors: two overlapping billboards, a plate and a weak box
+CANDIDATES = np.array([
+    [32, 33, 16, 50], [20, 21, 50, 50], [40, 40, 12, 8], [10, 10, 6, 8],
+    [0.9, 0.8, 0.05, 0.1], [0.01, 0.02, 0.7, 0.05],
+], dtype=np.float32)
+
+class TestPostprocess(unittest.TestCase):
+
+    def test_decode_thresholds_and_converts(self):
+        """Test anchors below the threshold are dropped and boxes become corners"""
+        boxes, scores, classes, image_idx = decode(CANDIDATES, conf=0.25)
+        np.testing.assert_allclose(boxes[0], [12, 15, 52, 25])
+        np.testing.assert_allclose(scores, [0.9, 0.8, 0.7], rtol=1e-6)
+        self.assertEqual(classes.tolist(), [0, 0, 1])
+        self.assertEqual(image_idx.tolist(), [0, 0, 0])
+
+    def test_nms_is_class_aware(self):
+        """Test overlapping boxes only suppress each other within a group"""
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [0, 0, 10, 10]], dtype=np.float32)
+        scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+        self.assertEqual(nms(boxes, scores, 0.5).tolist(), [0])
+        self.assertEqual(nms(boxes, scores, 0.5, groups=np.array([0, 0, 1])).tolist(), [0, 2])
+
+    def test_single_image(self):
+        """Test the duplicate billboard is suppressed and the plate kept"""
+        dets, = postprocess(CANDIDATES, conf=0.25, iou=0.45)
+        self.assertEqual(dets.shape, (2, 6))
+        np.testing.assert_allclose(dets[:, 4:], [[0.9, 0], [0.7, 1]], rtol=1e-6)
+        billboards, = postprocess(CANDIDATES, conf=0.25, iou=0.45, classes=[0])
+        self.assertEqual(len(billboards), 1)
+
+    def test_batch_keeps_images_apart(self):
+        """Test identical boxes in different images don't suppress each other, and empty images stay aligned"""
+        empty = np.zeros_like(CANDIDATES)
+        out = postprocess(np.stack([CANDIDATES, empty, CANDIDATES]), conf=0.25, iou=0.45)
+        self.assertEqual([len(d) for d in out], [2, 0, 2])
+        np.testing.assert_array_equal(out[0], out[2])
+
+    def test_matches_reference_loop(self):
+        """Test the vectorized path keeps the same boxes as the plain-Python loop"""
+        preds = synthetic_output(batch=3, anchors=600, seed=1)
+        fast = postprocess(preds, conf=0.25, iou=0.45, max_det=600)
+        slow = reference_postprocess(preds, conf=0.25, iou=0.45)
+        for dets, expected in zip(fast, slow):
+            self.assertEqual(len(dets), len(expected))
+            np.testing.assert_allclose(dets[:, :4], [box for box, _, _ in expected], atol=1e-3)
+            np.testing.assert_allclose(dets[:, 4], [score for _, score, _ in expected], rtol=1e-6)
+            self.assertEqual(dets[:, 5].astype(int).tolist(), [cls for _, _, cls in expected])
+
+    def test_max_det(self):
+        """Test each image is capped at max_det boxes"""
+        out = postprocess(synthetic_output(batch=2, anchors=600), conf=0.25, iou=0.45, max_det=5)
+        self.assertEqual([len(d) for d in out], [5, 5])
+
+    def test_normalize_removes_letterbox(self):
+        """Test padding is removed and coordinates are clipped to the image"""
+        boxes = np.array([[12, 15, 52, 25]], dtype=np.float32)
+        np.testing.assert_allclose(normalize_boxes(boxes, 0.5, (0, 16), (128, 64)), [[12 / 64, 0.0, 52 / 64, 9 / 32]])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,72 @@
+"""
+Unit tests for the region redaction engine
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+import numpy as np
+from PIL import Image
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.imaging import ImageContext
+from app.redaction import mosaic_regions, redact_regions
+
+def naive_mosaic(pixels, box, blocks):
+    """Reference implementation with an explicit loop over cells"""
+    x, y, w, h = box
+    cell = max(1, max(w, h) // blocks)
+    out = pixels.copy()
+    for cy in range(y, y + h, cell):
+        for cx in range(x, x + w, cell):
+            y1, x1 = min(cy + cell, y + h), min(cx + cell, x + w)
+            region = pixels[cy:y1, cx:x1].astype(np.uint32)
+            out[cy:y1, cx:x1] = region.sum(axis=(0, 1)) // (region.shape[0] * region.shape[1])
+    return out
+
+class TestMosaic(unittest.TestCase):
+
+    def test_matches_reference(self):
+        """Test the vectorized mosaic equals a per-cell loop, including ragged edge cells"""
+        rng = np.random.default_rng(3)
+        pixels = rng.integers(0, 256, (120, 160, 3), dtype=np.uint8)
+        box = (13, 7, 101, 59)
+        expected = naive_mosaic(pixels, box, 12)
+        np.testing.assert_array_equal(mosaic_regions(pixels.copy(), [box], 12), expected)
+
+    def test_outside_regions_untouched(self):
+        """Test pixels outside the boxes keep their values"""
+        rng = np.random.default_rng(4)
+        pixels = rng.integers(0, 256, (50, 50, 3), dtype=np.uint8)
+        out = mosaic_regions(pixels.copy(), [(10, 10, 20, 20)])
+        np.testing.assert_array_equal(out[:10], pixels[:10])
+        np.testing.assert_array_equal(out[:, 30:], pixels[:, 30:])
+
+class TestRedactRegions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "street.jpg")
+        Image.new('RGB', (640, 480), color='gray').save(self.path, format='JPEG')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_leaves_context_image_unchanged(self):
+        """Test redaction works on a copy of the shared decode"""
+        ctx = ImageContext(self.path)
+        before = np.array(ctx.image())
+        out = redact_regions(ctx)
+        self.assertEqual(out.size, (640, 480))
+        np.testing.assert_array_equal(np.array(ctx.image()), before)
+
+    def test_blur_mode(self):
+        """Test whole-frame blur is still available"""
+        out = redact_regions(ImageContext(self.path), mode="blur")
+        self.assertEqual(out.size, (640, 480))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,52 @@
+"""
+Unit tests for dashboard image renditions
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+from PIL import Image
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.storage import BlobStore
+from app.renditions import make_renditions, rendition_urls, RENDITION_SIZES
+
+class TestRenditions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = BlobStore(os.path.join(self.tmpdir.name, "blobs"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_sizes_and_formats(self):
+        """Test each rendition fits its bound, keeps aspect ratio and is encoded in both formats"""
+        out = make_renditions(Image.new('RGB', (4000, 3000), color='green'), self.store)
+        self.assertEqual(set(out), set(RENDITION_SIZES))
+        for name, entry in out.items():
+            self.assertEqual(max(entry['width'], entry['height']), RENDITION_SIZES[name])
+            self.assertAlmostEqual(entry['width'] / entry['height'], 4 / 3, places=2)
+            with Image.open(entry['webp']) as img:
+                self.assertEqual((img.format, img.size), ('WEBP', (entry['width'], entry['height'])))
+            with Image.open(entry['jpeg']) as img:
+                self.assertEqual(img.format, 'JPEG')
+
+    def test_small_images_not_upscaled(self):
+        """Test images smaller than a rendition keep their size"""
+        out = make_renditions(Image.new('RGB', (200, 100)), self.store)
+        self.assertEqual((out['thumb']['width'], out['full']['width']), (200, 200))
+        self.assertEqual(out['thumb']['webp'], out['full']['webp'])  # identical bytes stored once
+
+    def test_urls(self):
+        """Test stored paths are turned into public URLs"""
+        out = rendition_urls(make_renditions(Image.new('RGB', (50, 50)), self.store), "/api/uploads", self.store)
+        self.assertTrue(out['thumb']['webp'].startswith("/api/uploads/"))
+        self.assertTrue(out['thumb']['webp'].endswith(".webp"))
+        self.assertEqual(out['thumb']['width'], 50)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
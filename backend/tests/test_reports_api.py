@@ -0,0 +1,224 @@
+"""
+API tests for report listing, streaming and batch ingestion, on a temporary database
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+import io
+import json
+from datetime import datetime, timedelta
+from unittest import mock
+from PIL import Image
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from app import db as app_db, models, pipeline
+from app.db import Base, SessionLocal
+from app.storage import BlobStore
+from app.executors import ingest_executors
+from app.routers import reports
+
+T0 = datetime(2026, 3, 1, 12, 0, 0)
+
+class ReportsApiTestCase(unittest.TestCase):
+    """Reports router mounted on its own app, with SessionLocal bound to a throwaway SQLite file"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{self.tmpdir.name}/test.db")
+        Base.metadata.create_all(self.engine)
+        SessionLocal.configure(bind=self.engine)
+        self.addCleanup(SessionLocal.configure, bind=app_db.engine)
+        app = FastAPI()
+        app.include_router(reports.router, prefix="/api")
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def add_reports(self, specs):
+        """Insert (id, captured_at, status, archived, detections) rows, each detection with one violation"""
+        db = SessionLocal()
+        for rid, captured_at, status, archived, n_dets in specs:
+            db.add(models.Report(id=rid, captured_at=captured_at, lat=30.35, lon=76.36, status=status, archived=archived))
+            for n in range(n_dets):
+                db.add(models.Detection(id=f"{rid}-d{n}", report_id=rid, bbox="[0, 0, 1, 1]", est_width_m=1.0,
+                                        est_height_m=1.0, confidence=0.9))
+                db.add(models.Violation(id=f"{rid}-v{n}", detection_id=f"{rid}-d{n}", type="license_missing",
+                                        reason="No license", severity=5))
+        db.commit()
+        db.close()
+
+    def count_queries(self):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.engine, "before_cursor_execute", listener)
+        self.addCleanup(event.remove, self.engine, "before_cursor_execute", listener)
+        return statements
+
+class TestReportPages(ReportsApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Several reports share a timestamp, so page boundaries fall inside ties
+        self.add_reports([(f"r{i:02d}", T0 + timedelta(minutes=i // 4), "pending" if i % 3 else "resolved",
+                           "true" if i % 5 == 0 else "false", i % 3) for i in range(23)])
+
+    def pages(self, **params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            resp = self.client.get("/api/reports", params={**params, **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(resp.status_code, 200)
+            ids += [r["id"] for r in resp.json()]
+            pages += 1
+            cursor = resp.headers.get("X-Next-Cursor")
+            if not cursor:
+                return ids, pages
+            self.assertIn('rel="next"', resp.headers["Link"])
+
+    def test_cursor_pages_cover_every_row_once(self):
+        """Test following X-Next-Cursor across equal timestamps returns every report once, in order"""
+        everything = [r["id"] for r in self.client.get("/api/reports", params={"limit": 500}).json()]
+        self.assertEqual(len(everything), 23)
+        ids, pages = self.pages(limit=4)
+        self.assertEqual(ids, everything)
+        self.assertEqual(pages, 6)
+        archived = [r["archived"] for r in self.client.get("/api/reports", params={"limit": 500}).json()]
+        self.assertEqual(archived, sorted(archived))  # active reports first
+
+    def test_page_stable_under_inserts(self):
+        """Test a report inserted ahead of the cursor does not shift the next page"""
+        first = self.client.get("/api/reports", params={"limit": 5})
+        after = self.client.get("/api/reports", params={"limit": 5, "cursor": first.headers["X-Next-Cursor"]}).json()
+        self.add_reports([("r99", T0 + timedelta(days=1), "pending", "false", 0)])
+        again = self.client.get("/api/reports", params={"limit": 5, "cursor": first.headers["X-Next-Cursor"]}).json()
+        self.assertEqual([r["id"] for r in again], [r["id"] for r in after])
+
+    def test_default_page_size(self):
+        """Test an omitted limit returns DEFAULT_PAGE_SIZE reports and a cursor"""
+        with mock.patch.object(reports, "DEFAULT_PAGE_SIZE", 10):
+            resp = self.client.get("/api/reports")
+        self.assertEqual(len(resp.json()), 10)
+        self.assertIn("X-Next-Cursor", resp.headers)
+
+    def test_filters(self):
+        """Test status, archived and captured_at filters, alone and combined with paging"""
+        resolved, _ = self.pages(status="resolved", limit=3)
+        self.assertEqual(resolved, [f"r{i:02d}" for i in sorted(range(0, 23, 3), key=lambda i: (i % 5 == 0, -(i // 4), -i))])
+        archived = [r["id"] for r in self.client.get("/api/reports", params={"archived": "true"}).json()]
+        self.assertEqual(sorted(archived), ["r00", "r05", "r10", "r15", "r20"])
+        window = self.client.get("/api/reports", params={"since": (T0 + timedelta(minutes=1)).isoformat(),
+                                                          "until": (T0 + timedelta(minutes=3)).isoformat()}).json()
+        self.assertEqual(sorted(r["id"] for r in window), [f"r{i:02d}" for i in range(4, 12)])
+        self.assertEqual(self.client.get("/api/reports", params={"cursor": "not-a-cursor"}).status_code, 400)
+
+    def test_detections_loaded_without_n_plus_one(self):
+        """Test a page costs the same number of queries whatever its size"""
+        statements = self.count_queries()
+        small = self.client.get("/api/reports", params={"limit": 2}).json()
+        small_count = len(statements)
+        del statements[:]
+        large = self.client.get("/api/reports", params={"limit": 20}).json()
+        self.assertEqual(len(statements), small_count)
+        self.assertEqual(small_count, 3)  # reports, detections, violations
+        self.assertEqual(sum(len(d["violations"]) for r in large for d in r["detections"]),
+                         sum(i % 3 for i in range(23) if f"r{i:02d}" in {r["id"] for r in large}))
+
+class TestStreamingFormats(ReportsApiTestCase):
+
+    def ndjson(self, path, **params):
+        resp = self.client.get(path, params={**params, "format": "ndjson"})
+        self.assertEqual(resp.headers["content-type"], "application/x-ndjson")
+        self.assertTrue(resp.text == "" or resp.text.endswith("\n"))
+        return [json.loads(line) for line in resp.text.splitlines()]
+
+    def json_stream(self, path, **params):
+        resp = self.client.get(path, params={**params, "format": "json-stream"})
+        self.assertEqual(resp.headers["content-type"], "application/json")
+        return json.loads(resp.text)
+
+    def test_reports_stream_matches_buffered(self):
+        """Test both streamed formats of /reports equal the buffered JSON, including limit and cursor"""
+        self.add_reports([(f"r{i:02d}", T0 + timedelta(minutes=i // 3), "pending", "true" if i % 4 == 0 else "false", i % 3)
+                          for i in range(12)])
+        buffered = self.client.get("/api/reports", params={"limit": 500}).json()
+        self.assertEqual(len(buffered), 12)
+        self.assertEqual(self.ndjson("/api/reports"), buffered)
+        self.assertEqual(self.json_stream("/api/reports"), buffered)
+        first = self.client.get("/api/reports", params={"limit": 5})
+        cursor = first.headers["X-Next-Cursor"]
+        self.assertEqual(self.ndjson("/api/reports", cursor=cursor, limit=4), buffered[5:9])
+        self.assertEqual(self.json_stream("/api/reports", status="resolved"), [])
+
+    def test_heatmap_stream_matches_buffered(self):
+        """Test both streamed formats of /heatmap equal the buffered FeatureCollection"""
+        self.add_reports([(f"r{i}", T0 + timedelta(hours=i), "pending", "false", 0) for i in range(7)])
+        buffered = self.client.get("/api/heatmap").json()
+        self.assertEqual(buffered["type"], "FeatureCollection")
+        self.assertEqual(len(buffered["features"]), 7)
+        self.assertEqual(self.json_stream("/api/heatmap"), buffered)
+        self.assertEqual(self.ndjson("/api/heatmap"), buffered["features"])
+
+    def test_empty_results(self):
+        """Test streamed formats of an empty table are valid and empty"""
+        self.assertEqual(self.ndjson("/api/reports"), [])
+        self.assertEqual(self.json_stream("/api/reports"), [])
+        self.assertEqual(self.ndjson("/api/heatmap"), [])
+        self.assertEqual(self.json_stream("/api/heatmap"), {"type": "FeatureCollection", "features": []})
+        self.assertEqual(self.client.get("/api/heatmap").json(), {"type": "FeatureCollection", "features": []})
+
+    def test_unknown_format_rejected(self):
+        """Test an unsupported format is a validation error"""
+        self.assertEqual(self.client.get("/api/reports", params={"format": "csv"}).status_code, 422)
+
+class TestBatchIngest(ReportsApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Uploads go to temporary stores and pixel work runs in this process
+        for target, name, value in ((reports, 'raw_store', BlobStore(os.path.join(self.tmpdir.name, "raw"))),
+                                    (pipeline, 'public_store', BlobStore(os.path.join(self.tmpdir.name, "public"))),
+                                    (pipeline.detection_cache, 'enabled', False),
+                                    (ingest_executors, 'processes', 0)):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        buf = io.BytesIO()
+        Image.new('RGB', (320, 240), color='navy').save(buf, format='JPEG')
+        self.image = buf.getvalue()
+
+    def post_batch(self, items):
+        return self.client.post("/api/reports/batch", data={"items": json.dumps(items)},
+                                files=[("images", (f"{i}.jpg", self.image, "image/jpeg")) for i in range(len(items))])
+
+    def test_batch_reports_idempotent(self):
+        """Test batch ingestion skips items whose idempotency key was already stored"""
+        items = [{"idempotency_key": "batch-key-1", "lat": 30.3555, "lon": 76.3651}]
+        ids = []
+        for expected in ("created", "duplicate"):
+            response = self.post_batch(items)
+            self.assertEqual(response.status_code, 200)
+            result = response.json()["results"][0]
+            self.assertEqual(result["status"], expected)
+            ids.append(result["id"])
+        self.assertEqual(ids[0], ids[1])
+        db = SessionLocal()
+        self.assertEqual(db.query(models.Report).filter(models.Report.idempotency_key == "batch-key-1").count(), 1)
+        db.close()
+
+    def test_repeated_key_within_batch(self):
+        """Test a key repeated inside one batch is stored once"""
+        response = self.post_batch([{"idempotency_key": "k", "lat": 30.40, "lon": 76.40}] * 2)
+        body = response.json()
+        self.assertEqual((body["created"], body["duplicates"]), (1, 1))
+        self.assertEqual(body["results"][0]["id"], body["results"][1]["id"])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,71 @@
+"""
+Unit tests for re-queueing reports left unfinished by a restart
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+from datetime import datetime
+from unittest import mock
+from PIL import Image
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from app import db as app_db, models, pipeline
+from app.db import Base, SessionLocal
+from app.jobs import ReportJobQueue
+from app.storage import BlobStore
+from app.executors import ingest_executors
+from app.routers import reports
+
+class TestResumePendingReports(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        engine = create_engine(f"sqlite:///{self.tmpdir.name}/test.db")
+        Base.metadata.create_all(engine)
+        SessionLocal.configure(bind=engine)
+        self.addCleanup(SessionLocal.configure, bind=app_db.engine)
+        self.queue = ReportJobQueue(workers=1)
+        self.addCleanup(self.queue.stop)
+        for target, name, value in ((reports, 'report_queue', self.queue), (ingest_executors, 'processes', 0),
+                                    (pipeline.detection_cache, 'enabled', False),
+                                    (pipeline, 'public_store', BlobStore(os.path.join(self.tmpdir.name, "public")))):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        raw = os.path.join(self.tmpdir.name, "raw.jpg")
+        Image.new('RGB', (320, 240), color='navy').save(raw, format='JPEG')
+        db = SessionLocal()
+        for rid, status, raw_uri in (("queued", "queued", raw), ("mid-stage", "detecting", raw), ("finished", "done", raw),
+                                     ("lost", "queued", os.path.join(self.tmpdir.name, "missing.jpg"))):
+            db.add(models.Report(id=rid, captured_at=datetime.utcnow(), lat=30.40, lon=76.40, raw_uri=raw_uri,
+                                 processing_status=status))
+        db.commit()
+        db.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def statuses(self):
+        db = SessionLocal()
+        try:
+            return {r.id: r.processing_status for r in db.query(models.Report).all()}
+        finally:
+            db.close()
+
+    def test_unfinished_reports_are_processed(self):
+        """Test queued and mid-stage rows are re-queued and finish, and rows without an upload fail"""
+        self.assertEqual(reports.resume_pending_reports(), 2)
+        self.assertEqual(self.statuses()["lost"], "failed")
+        self.queue.stop()
+        self.assertEqual(self.statuses(), {"queued": "done", "mid-stage": "done", "finished": "done", "lost": "failed"})
+        self.assertEqual(self.queue.status("queued")["state"], "done")
+        self.assertIsNone(self.queue.status("finished"))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,116 @@
+"""
+Unit tests for vectorized billboard size estimation
+"""
+
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.size_estimation import (BillboardSizeEstimator, CameraParams, estimate_billboard_size,
+                                 estimate_billboard_sizes, _camera_constants)
+
+BOXES = np.array([[100, 100, 700, 250], [50, 400, 250, 440], [900, 20, 1800, 400], [0, 0, 30, 10]], dtype=float)
+
+class TestSizeEstimation(unittest.TestCase):
+
+    def setUp(self):
+        self.estimator = BillboardSizeEstimator()
+
+    def test_batch_matches_single(self):
+        """Test one vectorized call equals per-box estimates"""
+        batch = self.estimator.estimate_sizes(BOXES, 1920, 1080)
+        self.assertEqual(len(batch), len(BOXES))
+        for i, box in enumerate(BOXES.tolist()):
+            single = self.estimator.estimate_size_from_bbox(box, 1920, 1080)
+            for field in ('width_m', 'height_m', 'area_m2', 'distance_m', 'confidence', 'margin_of_error'):
+                self.assertAlmostEqual(getattr(batch[i], field), getattr(single, field), places=9)
+
+    def test_per_box_image_sizes(self):
+        """Test boxes from images of different sizes in one call"""
+        batch = self.estimator.estimate_sizes(BOXES[:2], [1920, 800], [1080, 600])
+        other = self.estimator.estimate_size_from_bbox(BOXES[1].tolist(), 800, 600)
+        self.assertAlmostEqual(batch.width_m[1], other.width_m)
+
+    def test_distance_override_and_clamp(self):
+        """Test a distance hint is used as given and estimated distances stay in range"""
+        hinted = self.estimator.estimate_sizes(BOXES, 1920, 1080, assumed_distance_m=25.0)
+        np.testing.assert_array_equal(hinted.distance_m, 25.0)
+        estimated = self.estimator.estimate_sizes(np.array([[0, 0, 10, 0], [0, 0, 10, 5]]), 1920, 1080)
+        np.testing.assert_array_equal(estimated.distance_m, [200.0, 200.0])  # zero height no longer divides by zero
+
+    def test_confidence_table(self):
+        """Test calibrated ranges set the margin of error and confidence stays bounded"""
+        est = self.estimator.estimate_sizes(BOXES[:3], 1920, 1080, assumed_distance_m=[15.0, 30.0, 150.0])
+        np.testing.assert_allclose(est.margin_of_error, [1.4, 2.1, 5.0])
+        self.assertTrue(np.all((est.confidence >= 0.1) & (est.confidence <= 0.95)))
+
+    def test_dicts_match_single(self):
+        """Test the batch convenience function returns the per-box dictionaries"""
+        self.assertEqual(estimate_billboard_sizes(BOXES, 1920, 1080),
+                         [estimate_billboard_size(box, 1920, 1080) for box in BOXES.tolist()])
+
+    def test_resolution_independent(self):
+        """Test the same scene gives the same sizes at any resolution of one aspect ratio"""
+        scene = np.array([[0.2, 0.3, 0.6, 0.45], [0.1, 0.1, 0.3, 0.2]])
+        small = estimate_billboard_sizes(scene * [640, 480, 640, 480], 640, 480)
+        large = estimate_billboard_sizes(scene * [4032, 3024, 4032, 3024], 4032, 3024)
+        for a, b in zip(small, large):
+            self.assertAlmostEqual(a['width_m'], b['width_m'], places=6)
+            self.assertAlmostEqual(a['height_m'], b['height_m'], places=6)
+
+    def test_camera_constants_cached(self):
+        """Test FOV constants are computed once per distinct camera"""
+        _camera_constants.cache_clear()
+        for _ in range(3):
+            BillboardSizeEstimator(CameraParams(focal_length_mm=28.0)).estimate_sizes(BOXES, 1920, 1080)
+        info = _camera_constants.cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertGreater(info.hits, 0)
+
+class TestDepthSizeEstimation(unittest.TestCase):
+
+    def setUp(self):
+        self.estimator = BillboardSizeEstimator()
+        # Smooth depth ramp: 10 m at the top of the frame to 60 m at the bottom
+        self.depth = np.repeat(np.linspace(10, 60, 1080, dtype=np.float32)[:, None], 1920, axis=1)
+
+    def test_batch_matches_single(self):
+        """Test the batch call agrees with one-box calls"""
+        batch = self.estimator.estimate_sizes_with_depth(BOXES, self.depth)
+        for est, box in zip(batch, BOXES.tolist()):
+            single = self.estimator.estimate_size_with_depth(box, self.depth)
+            self.assertEqual(est, single)
+            self.assertEqual(est.method, "depth_estimation")
+
+    def test_exact_median_for_small_roi(self):
+        """Test small ROIs use every pixel, matching np.median"""
+        est = self.estimator.estimate_sizes_with_depth([[50, 400, 100, 440]], self.depth)
+        self.assertAlmostEqual(est.distance_m[0], float(np.median(self.depth[400:440, 50:100])), places=4)
+
+    def test_subsampled_median_for_large_roi(self):
+        """Test large ROIs are subsampled and stay close to the true median"""
+        box = [0, 0, 1920, 1080]
+        est = self.estimator.estimate_sizes_with_depth([box], self.depth, max_samples=1024)
+        self.assertAlmostEqual(est.distance_m[0], float(np.median(self.depth)), delta=0.5)
+
+    def test_invalid_depth_ignored(self):
+        """Test NaN depth pixels are skipped and an empty ROI gives NaN"""
+        depth = np.full((100, 100), 20.0)
+        depth[:50] = np.nan
+        est = self.estimator.estimate_sizes_with_depth([[0, 0, 100, 100], [10, 10, 10, 20]], depth)
+        self.assertEqual(est.distance_m[0], 20.0)
+        self.assertTrue(np.isnan(est.distance_m[1]))
+
+    def test_confidence_semantics(self):
+        """Test depth estimates boost confidence (capped) and shrink the margin of error"""
+        camera = self.estimator.estimate_sizes(BOXES, 1920, 1080, assumed_distance_m=25.0)
+        depth = self.estimator.estimate_sizes_with_depth(BOXES, np.full((1080, 1920), 25.0))
+        np.testing.assert_allclose(depth.confidence, np.minimum(0.95, camera.confidence * 1.2))
+        np.testing.assert_allclose(depth.margin_of_error, camera.margin_of_error * 0.7)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
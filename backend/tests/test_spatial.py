@@ -0,0 +1,144 @@
+"""
+Unit tests for the grid point-of-interest index
+"""
+
+import unittest
+import sys
+import os
+import math
+import json
+import tempfile
+from unittest import mock
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.spatial import PointIndex, index_points, load_point_index, haversine_m
+from app.util import distance_m, nearest_junction
+from app.geofence import BillboardGeofence
+
+def random_features(n, seed=0, radius=False):
+    rng = np.random.default_rng(seed)
+    lats, lons = rng.uniform(30.30, 30.40, n), rng.uniform(76.30, 76.42, n)
+    radii = rng.uniform(20, 300, n)
+    return [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]},
+             "properties": {"name": f"poi-{i}", "buffer_m": float(r) if radius else None}}
+            for i, (lat, lon, r) in enumerate(zip(lats.tolist(), lons.tolist(), radii.tolist()))]
+
+def brute_distances(features, lat, lon):
+    return [distance_m(lat, lon, f["geometry"]["coordinates"][1], f["geometry"]["coordinates"][0]) for f in features]
+
+QUERIES = [(30.30 + 0.1 * a, 76.30 + 0.12 * b) for a, b in np.random.default_rng(1).uniform(-0.2, 1.2, (60, 2)).tolist()]
+
+class TestPointIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.features = random_features(3000)
+        cls.index = PointIndex(cls.features, cell_m=250)
+
+    def test_haversine_matches_scalar(self):
+        """Test the vectorized distance equals the scalar helper"""
+        d = haversine_m(30.35, 76.36, np.array([30.36, 30.30]), np.array([76.37, 76.40]))
+        self.assertAlmostEqual(d[0], distance_m(30.35, 76.36, 30.36, 76.37), places=6)
+        self.assertAlmostEqual(d[1], distance_m(30.35, 76.36, 30.30, 76.40), places=6)
+
+    def test_nearest_matches_brute_force(self):
+        """Test nearest neighbour agrees with a linear scan, including queries outside the data"""
+        for lat, lon in QUERIES:
+            dists = brute_distances(self.features, lat, lon)
+            feature, d = self.index.nearest(lat, lon)
+            self.assertAlmostEqual(d, min(dists), places=6)
+            self.assertAlmostEqual(dists[self.features.index(feature)], d, places=6)
+
+    def test_within_matches_brute_force(self):
+        """Test radius queries return exactly the points in range, nearest first"""
+        for lat, lon in QUERIES:
+            dists = brute_distances(self.features, lat, lon)
+            for radius in (40, 300, 1200):
+                hits = self.index.within(lat, lon, radius)
+                expected = sorted(d for d in dists if d < radius)
+                self.assertEqual(len(hits), len(expected))
+                for (_, d), e in zip(hits, expected):
+                    self.assertAlmostEqual(d, e, places=6)
+
+    def test_containing_buffers_uses_point_radius(self):
+        """Test buffer queries honour each point's own radius"""
+        features = random_features(1500, seed=2, radius=True)
+        index = PointIndex(features, cell_m=100, radius_property="buffer_m")
+        for lat, lon in QUERIES:
+            dists = brute_distances(features, lat, lon)
+            expected = {i for i, d in enumerate(dists) if d < features[i]["properties"]["buffer_m"]}
+            got = {features.index(f) for f, _ in index.containing_buffers(lat, lon)}
+            self.assertEqual(got, expected)
+
+    def test_buffer_hits_matches_per_point(self):
+        """Test the batch buffer query equals containing_buffers for each location"""
+        features = random_features(1500, seed=4, radius=True)
+        index = PointIndex(features, cell_m=100, radius_property="buffer_m")
+        lats, lons = np.array(QUERIES).T
+        q, f, d = index.buffer_hits(lats, lons)
+        for i, (lat, lon) in enumerate(QUERIES):
+            expected = index.containing_buffers(lat, lon)
+            self.assertEqual([features[j] for j in f[q == i].tolist()], [e[0] for e in expected])
+            np.testing.assert_allclose(d[q == i], [e[1] for e in expected])
+        self.assertEqual([len(a) for a in PointIndex([]).buffer_hits(lats, lons)], [0, 0, 0])
+
+    def test_empty_and_malformed(self):
+        """Test an empty index and that features without point coordinates are skipped"""
+        empty = PointIndex([])
+        self.assertEqual(empty.nearest(30.35, 76.36), (None, math.inf))
+        self.assertEqual(empty.within(30.35, 76.36, 1000), [])
+        index = PointIndex([{"geometry": None}, {"properties": {}}, {"geometry": {"coordinates": [76.36]}},
+                            {"geometry": {"coordinates": [76.36, 30.35]}, "properties": {"name": "ok"}}])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.nearest(30.35, 76.36)[0]["properties"]["name"], "ok")
+
+    def test_of_accepts_index_collection_and_list(self):
+        """Test PointIndex.of passes an index through and builds one from GeoJSON"""
+        self.assertIs(PointIndex.of(self.index), self.index)
+        collection = {"type": "FeatureCollection", "features": self.features[:10]}
+        self.assertEqual(len(PointIndex.of(collection)), 10)
+        self.assertEqual(len(PointIndex.of(self.features[:5])), 5)
+        self.assertEqual(len(PointIndex.of(None)), 0)
+
+    def test_nearest_junction_accepts_geojson(self):
+        """Test the util helper still takes a FeatureCollection"""
+        collection = {"type": "FeatureCollection", "features": self.features}
+        lat, lon = QUERIES[0]
+        self.assertEqual(nearest_junction(lat, lon, collection), self.index.nearest(lat, lon))
+
+    def test_index_points_reuses_index(self):
+        """Test repeated queries against one collection index it once"""
+        collection = {"type": "FeatureCollection", "features": self.features}
+        first = index_points(collection)
+        self.assertIs(index_points(collection), first)
+        self.assertIs(index_points(self.index), self.index)
+        self.assertIsNot(index_points(dict(collection)), first)
+        with mock.patch.object(PointIndex, "of", side_effect=AssertionError("rebuilt")):
+            for lat, lon in QUERIES[:5]:
+                nearest_junction(lat, lon, collection)
+
+    def test_load_point_index_is_shared(self):
+        """Test a file is indexed once per process"""
+        with tempfile.NamedTemporaryFile("w", suffix=".geojson", delete=False) as f:
+            json.dump({"type": "FeatureCollection", "features": self.features[:20]}, f)
+        try:
+            first = load_point_index(f.name)
+            self.assertIs(load_point_index(f.name), first)
+            self.assertIsNot(load_point_index(f.name, radius_property="buffer_m"), first)
+            self.assertEqual(len(first), 20)
+        finally:
+            os.remove(f.name)
+
+    def test_geofence_buffer_violations(self):
+        """Test sensitive-location buffers come from the bundled GeoJSON"""
+        violations = BillboardGeofence()._check_buffer_distances(30.3548, 76.3628)
+        self.assertEqual(violations[0]["location"], "DAV Public School")
+        self.assertEqual(violations[0]["required_distance"], 100)
+        self.assertEqual(violations[0]["actual_distance"], 0.0)
+        self.assertEqual(BillboardGeofence()._check_buffer_distances(30.40, 76.40), [])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,115 @@
+"""
+Unit tests for content-addressed blob storage
+"""
+
+import unittest
+import asyncio
+import hashlib
+import tempfile
+import sys
+import os
+from io import BytesIO
+from PIL import Image
+from fastapi import FastAPI, UploadFile
+from fastapi.testclient import TestClient
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.storage import BlobStore, BlobStaticFiles
+
+def _jpeg_bytes(color='red'):
+    buf = BytesIO()
+    Image.new('RGB', (64, 48), color=color).save(buf, format='JPEG')
+    return buf.getvalue()
+
+class TestBlobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = BlobStore(os.path.join(self.tmpdir.name, "blobs"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _write_temp(self, data, suffix=".jpg"):
+        path = self.store.temp_path(suffix)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_sharded_layout(self):
+        """Test blobs are named by digest under two shard directories"""
+        data = _jpeg_bytes()
+        blob = self.store.adopt(self._write_temp(data), ext=".jpg")
+        digest = hashlib.sha256(data).hexdigest()
+        self.assertEqual(blob.digest, digest)
+        self.assertEqual(blob.path, os.path.join(self.store.root, digest[:2], digest[2:4], digest + ".jpg"))
+        with open(blob.path, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_identical_bytes_stored_once(self):
+        """Test a second copy of the same bytes reuses the first blob"""
+        data = _jpeg_bytes()
+        first = self.store.adopt(self._write_temp(data), ext=".jpg")
+        second_tmp = self._write_temp(data)
+        second = self.store.adopt(second_tmp, ext=".jpg")
+        self.assertTrue(first.created)
+        self.assertFalse(second.created)
+        self.assertEqual(first.path, second.path)
+        self.assertFalse(os.path.exists(second_tmp))
+
+    def test_save_upload(self):
+        """Test uploads are streamed into the store with an extension from the image format"""
+        data = _jpeg_bytes('blue')
+        stored = asyncio.run(self.store.save_upload(UploadFile(file=BytesIO(data), filename="../x.png")))
+        self.assertEqual(stored.path, self.store.path_for(hashlib.sha256(data).hexdigest(), ".jpg"))
+        self.assertTrue(os.path.exists(stored.path))
+        self.assertEqual(os.listdir(self.store.incoming), [])
+
+    def test_store_upload_blocking(self):
+        """Test the blocking variant used on the ingest I/O pool stores the same blob"""
+        data = _jpeg_bytes('green')
+        stored = self.store.store_upload(BytesIO(data))
+        self.assertEqual(stored.path, self.store.path_for(hashlib.sha256(data).hexdigest(), ".jpg"))
+        self.assertEqual((stored.width, stored.height, stored.format), (64, 48, "JPEG"))
+
+    def test_temp_files_outside_root(self):
+        """Test partial writes go beside the store root, not inside it"""
+        path = self.store.temp_path(".jpg")
+        self.assertFalse(self.store.contains(path))
+        self.assertEqual(os.path.dirname(path), os.path.join(self.tmpdir.name, "blobs.incoming"))
+
+    def test_static_files_hide_dot_entries(self):
+        """Test the served root returns blobs but not a leftover .incoming directory"""
+        blob = self.store.adopt(self._write_temp(_jpeg_bytes()), ext=".jpg")
+        legacy = os.path.join(self.store.root, ".incoming")
+        os.makedirs(legacy)
+        with open(os.path.join(legacy, "partial.jpg"), "wb") as f:
+            f.write(b"partial")
+        app = FastAPI()
+        app.mount("/api/uploads", BlobStaticFiles(directory=self.store.root), name="uploads")
+        client = TestClient(app)
+        served = client.get(self.store.url_for(blob.path, "/api/uploads"))
+        self.assertEqual(served.status_code, 200)
+        self.assertIn("immutable", served.headers["Cache-Control"])
+        self.assertEqual(client.get("/api/uploads/.incoming/partial.jpg").status_code, 404)
+        self.assertEqual(client.get("/api/uploads/ab/.hidden.jpg").status_code, 404)
+
+    def test_url_for(self):
+        """Test URLs for sharded blobs and legacy flat files"""
+        path = self.store.path_for("ab" * 32, ".jpg")
+        self.assertEqual(self.store.url_for(path, "/api/uploads"), f"/api/uploads/ab/ab/{'ab' * 32}.jpg")
+        self.assertEqual(self.store.url_for("./data/uploads/r1_redacted.jpg", "/api/uploads"), "/api/uploads/r1_redacted.jpg")
+        self.assertIsNone(self.store.url_for(None, "/api/uploads"))
+
+    def test_delete_only_inside_root(self):
+        """Test delete ignores paths outside the store"""
+        outside = os.path.join(self.tmpdir.name, "keep.txt")
+        with open(outside, "w") as f:
+            f.write("x")
+        self.store.delete(outside)
+        self.assertTrue(os.path.exists(outside))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
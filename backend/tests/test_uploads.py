@@ -0,0 +1,73 @@
+"""
+Unit tests for streaming upload handling
+"""
+
+import unittest
+import asyncio
+import hashlib
+import tempfile
+import sys
+import os
+from io import BytesIO
+from PIL import Image
+from fastapi import HTTPException, UploadFile
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.uploads import save_upload_stream
+
+def _jpeg_bytes(width, height):
+    buf = BytesIO()
+    Image.new('RGB', (width, height), color='red').save(buf, format='JPEG')
+    return buf.getvalue()
+
+class TestSaveUploadStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dest = os.path.join(self.tmpdir.name, "upload.jpg")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _save(self, data, **limits):
+        upload = UploadFile(file=BytesIO(data), filename="photo.jpg")
+        return asyncio.run(save_upload_stream(upload, self.dest, **limits))
+
+    def test_streams_and_hashes(self):
+        """Test the stored file, hash and dimensions match the upload"""
+        data = _jpeg_bytes(800, 600)
+        stored = self._save(data)
+
+        self.assertEqual(stored.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(stored.size_bytes, len(data))
+        self.assertEqual((stored.width, stored.height), (800, 600))
+        self.assertEqual(stored.format, "JPEG")
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_rejects_oversized_body(self):
+        """Test uploads over the byte limit are rejected and cleaned up"""
+        data = _jpeg_bytes(800, 600)
+        with self.assertRaises(HTTPException) as ctx:
+            self._save(data, max_bytes=len(data) - 1)
+        self.assertEqual(ctx.exception.status_code, 413)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_rejects_too_many_pixels(self):
+        """Test images over the pixel cap are rejected from the header"""
+        with self.assertRaises(HTTPException) as ctx:
+            self._save(_jpeg_bytes(800, 600), max_pixels=800 * 600 - 1)
+        self.assertEqual(ctx.exception.status_code, 413)
+        self.assertFalse(os.path.exists(self.dest))
+
+    def test_rejects_non_image(self):
+        """Test non-image bodies are rejected"""
+        with self.assertRaises(HTTPException) as ctx:
+            self._save(b"not an image at all")
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,26 +1,101 @@
 
-import cv2, sys, argparse
+import cv2, os, sys, glob, time, argparse
+from multiprocessing import Pool
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+_cascades = None  # per-process [(classifier, minNeighbors)], set by init_cascades
 def mosaic_region(img, x,y,w,h, scale=0.05):
     roi = img[y:y+h, x:x+w]
     small = cv2.resize(roi, (max(1,int(w*scale)), max(1,int(h*scale))), interpolation=cv2.INTER_LINEAR)
     big = cv2.resize(small, (w,h), interpolation=cv2.INTER_NEAREST)
     img[y:y+h, x:x+w] = big
-def blur_file(infile, outfile, face_xml=None, plate_xml=None):
+def init_cascades(face_xml=None, plate_xml=None, threads=None):
+    """Load the cascades once per process (also the Pool initializer)"""
+    global _cascades
+    if threads is not None: cv2.setNumThreads(threads)  # one process per core; avoid oversubscription
+    _cascades = []
+    for xml, neighbors in ((face_xml, 5), (plate_xml, 4)):
+        if not xml: continue
+        clf = cv2.CascadeClassifier(xml)
+        if clf.empty(): raise SystemExit(f"failed to load cascade {xml}")
+        _cascades.append((clf, neighbors))
+def redact_file(infile, outfile):
     img = cv2.imread(infile)
-    if img is None: raise SystemExit("failed to open image")
+    if img is None: raise ValueError("failed to open image")
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    if face_xml:
-        face_cascade = cv2.CascadeClassifier(face_xml)
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
-        for (x,y,w,h) in faces: mosaic_region(img,x,y,w,h)
-    if plate_xml:
-        plate_cascade = cv2.CascadeClassifier(plate_xml)
-        plates = plate_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4)
-        for (x,y,w,h) in plates: mosaic_region(img,x,y,w,h)
-    cv2.imwrite(outfile, img)
+    for clf, neighbors in _cascades:
+        for (x,y,w,h) in clf.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=neighbors): mosaic_region(img,x,y,w,h)
+    # write next to the target and rename, so an interrupted run never leaves a half-written "done" output
+    root, ext = os.path.splitext(outfile)
+    part = f"{root}.part{ext}"
+    if not cv2.imwrite(part, img): raise ValueError("failed to write image")
+    os.replace(part, outfile)
+def blur_file(infile, outfile, face_xml=None, plate_xml=None):
+    init_cascades(face_xml, plate_xml)
+    try: redact_file(infile, outfile)
+    except ValueError as e: raise SystemExit(str(e))
+def _work(job):
+    infile, outfile = job
+    t = time.perf_counter()
+    try:
+        redact_file(infile, outfile); err = None
+    except Exception as e:
+        err = str(e)
+    return infile, time.perf_counter() - t, err
+def is_batch_input(path):
+    return os.path.isdir(path) or glob.has_magic(path)
+def _within(path, root):
+    return os.path.commonpath([os.path.abspath(path), root]) == root
+def collect_jobs(source, outdir, force=False):
+    """(infile, outfile) pairs keeping paths relative to the input dir; done outputs are skipped"""
+    out = os.path.abspath(outdir)
+    if os.path.isdir(source):
+        base = source
+        # an output dir nested in the input holds our own results; don't walk into it
+        nested = out != os.path.abspath(source)
+        files = []
+        for d, dirs, names in os.walk(source):
+            if nested: dirs[:] = [x for x in dirs if not _within(os.path.join(d, x), out)]
+            files += [os.path.join(d, f) for f in names if f.lower().endswith(IMAGE_EXTS)]
+    else:
+        base = source.split('*')[0].split('?')[0].split('[')[0]
+        base = base if base.endswith(os.sep) else os.path.dirname(base)
+        nested = out != os.path.abspath(base or '.')
+        files = [f for f in glob.glob(source, recursive=True) if os.path.isfile(f) and not (nested and _within(f, out))]
+    jobs, skipped = [], 0
+    for infile in sorted(files):
+        outfile = os.path.join(outdir, os.path.relpath(infile, base or '.'))
+        if not force and os.path.exists(outfile) and os.path.getmtime(outfile) >= os.path.getmtime(infile):
+            skipped += 1; continue
+        os.makedirs(os.path.dirname(outfile) or '.', exist_ok=True)
+        jobs.append((infile, outfile))
+    return jobs, skipped
+def run_batch(source, outdir, face_xml=None, plate_xml=None, workers=None, force=False):
+    jobs, skipped = collect_jobs(source, outdir, force)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    print(f"{len(jobs)} to redact, {skipped} already done, {workers} workers", file=sys.stderr)
+    latencies, failed = [], 0
+    start = time.perf_counter()
+    with Pool(workers, initializer=init_cascades, initargs=(face_xml, plate_xml, 1)) as pool:
+        for i, (infile, secs, err) in enumerate(pool.imap_unordered(_work, jobs, chunksize=4), 1):
+            if err:
+                failed += 1; print(f"FAILED {infile}: {err}", file=sys.stderr)
+            else:
+                latencies.append(secs)
+            if i % 100 == 0: print(f"{i}/{len(jobs)}", file=sys.stderr)
+    wall = time.perf_counter() - start
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies)-1, int(q*len(latencies)))] * 1000 if latencies else 0.0
+    print(f"redacted {len(latencies)}, skipped {skipped}, failed {failed} in {wall:.1f}s")
+    print(f"throughput {len(latencies)/wall if wall else 0.0:.1f} images/s, latency p50 {p(0.5):.0f} ms, p95 {p(0.95):.0f} ms")
+    return failed
 if __name__ == '__main__':
-    p = argparse.ArgumentParser()
-    p.add_argument('infile'); p.add_argument('outfile')
+    p = argparse.ArgumentParser(description="Mosaic faces and plates in one image, or every image in a directory or glob")
+    p.add_argument('infile', help="image, directory or quoted glob such as 'survey/**/*.jpg'")
+    p.add_argument('outfile', help="output image, or output directory in batch mode")
     p.add_argument('--face', default=None); p.add_argument('--plate', default=None)
+    p.add_argument('--workers', type=int, default=None, help="batch mode processes (default: all cores)")
+    p.add_argument('--force', action='store_true', help="batch mode: redo images whose output already exists")
     args = p.parse_args()
+    if is_batch_input(args.infile):
+        sys.exit(1 if run_batch(args.infile, args.outfile, args.face, args.plate, args.workers, args.force) else 0)
     blur_file(args.infile, args.outfile, args.face, args.plate)
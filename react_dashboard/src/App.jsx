@@ -106,10 +106,16 @@ export default function App() {
       if (!IS_GITHUB_PAGES) {
         try {
           console.log('Fetching reports from:', `${API_BASE}/reports`);
-          const response = await fetch(`${API_BASE}/reports`);
+          // The API returns one page at a time; follow X-Next-Cursor until the last page
+          let response = await fetch(`${API_BASE}/reports?limit=500`);
           console.log('Response status:', response.status);
+          while (response.ok) {
+            apiReports = apiReports.concat(await response.json());
+            const nextCursor = response.headers.get('X-Next-Cursor');
+            if (!nextCursor) break;
+            response = await fetch(`${API_BASE}/reports?limit=500&cursor=${encodeURIComponent(nextCursor)}`);
+          }
           if (response.ok) {
-            apiReports = await response.json();
             console.log('Raw API response:', apiReports);
             console.log('Number of reports received:', apiReports.length);
             
@@ -485,7 +491,7 @@ export default function App() {
               >
                 <div className="report-image">
                   <img 
-                    src={`http://localhost:8000${report.image}`} 
+                    src={`http://localhost:8000${report.renditions?.thumb?.webp || report.image}`} 
                     alt="Detection"
                     onError={(e) => {
                       console.log('Image failed to load:', report.image);